@@ -1,8 +1,30 @@
 """ contains basic admin views for MultiToken """
-from django.contrib import admin
-from django_rest_passwordreset.models import ResetPasswordToken
+from django.contrib import admin, messages
+from django.utils.translation import gettext_lazy as _
+
+from django_rest_passwordreset.dispatch import DatabaseDeliveryQueue
+from django_rest_passwordreset.models import ResetPasswordToken, ResetPasswordTokenDelivery
 
 
 @admin.register(ResetPasswordToken)
 class ResetPasswordTokenAdmin(admin.ModelAdmin):
-    list_display = ('user', 'key', 'created_at', 'ip_address', 'user_agent')
+    list_display = ('user', 'key', 'created_at', 'expires_at', 'ip_address', 'user_agent')
+
+
+@admin.register(ResetPasswordTokenDelivery)
+class ResetPasswordTokenDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'sender', 'status', 'attempts', 'created_at', 'next_attempt_at')
+    list_filter = ('status',)
+    actions = ['replay_deliveries']
+
+    # the rows are written by DatabaseDeliveryQueue only; failed deliveries can be inspected, replayed and deleted
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description=_("Replay the selected failed deliveries"))
+    def replay_deliveries(self, request, queryset):
+        count = DatabaseDeliveryQueue.replay(queryset)
+        self.message_user(request, _("%(count)d deliveries were queued again.") % {'count': count}, messages.SUCCESS)
@@ -0,0 +1,13 @@
+""" URL Configuration of the async views, for projects running under ASGI """
+from django.urls import path
+
+from django_rest_passwordreset.async_views import async_reset_password_confirm, async_reset_password_request_token, \
+    async_reset_password_validate_token
+
+app_name = 'password_reset'
+
+urlpatterns = [
+    path("validate_token/", async_reset_password_validate_token, name="reset-password-validate"),
+    path("confirm/", async_reset_password_confirm, name="reset-password-confirm"),
+    path("", async_reset_password_request_token, name="reset-password-request"),
+]
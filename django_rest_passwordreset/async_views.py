@@ -0,0 +1,353 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from rest_framework import exceptions, serializers
+
+from django_rest_passwordreset.dispatch import run_in_background
+from django_rest_passwordreset.models import get_password_reset_token_expiry
+from django_rest_passwordreset.serializers import EmailSerializer, INVALID_TOKEN_ERROR, TokenSerializer
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.signals import pre_password_reset, post_password_reset
+from django_rest_passwordreset.throttling import AsyncScopedRateThrottle, \
+    get_async_password_reset_request_token_throttle_classes, get_password_reset_confirm_throttle_classes, \
+    get_password_reset_validate_token_throttle_classes
+from django_rest_passwordreset.validation_cache import ainvalidate_validation_cache_for_user
+from django_rest_passwordreset.views import get_response_time_budget, get_user_queryset_for_email, \
+    reset_password_with_token, select_user_for_email
+
+__all__ = [
+    'AsyncResetPasswordValidateToken',
+    'AsyncResetPasswordConfirm',
+    'AsyncResetPasswordRequestToken',
+    'async_reset_password_validate_token',
+    'async_reset_password_confirm',
+    'async_reset_password_request_token',
+    'aclear_expired_tokens',
+    'aclear_expired_tokens_if_due',
+    'agenerate_token_for_email',
+    'aget_valid_token',
+]
+
+
+async def aclear_expired_tokens():
+    """
+    Delete all existing expired tokens (async variant of clear_expired_tokens)
+    """
+    # datetime.now minus expiry hours
+    now_minus_expiry_time = timezone.now() - get_password_reset_token_expiry()
+
+    await password_reset_settings.TOKEN_BACKEND.aclear_expired(now_minus_expiry_time)
+
+
+async def aclear_expired_tokens_if_due():
+    """
+    Delete all existing expired tokens if the configured cleanup strategy decides that a cleanup is due (async variant
+    of clear_expired_tokens_if_due)
+    :return: True if expired tokens were cleared
+    """
+    return await password_reset_settings.CLEANUP_STRATEGY.amaybe_clear(aclear_expired_tokens)
+
+
+async def agenerate_token_for_email(email, user_agent='', ip_address=''):
+    """
+    Async variant of generate_token_for_email
+    """
+    backend = password_reset_settings.TOKEN_BACKEND
+
+    users = [user async for user in get_user_queryset_for_email(email, backend)]
+    matching_user = select_user_for_email(users, email)
+    if matching_user is None:
+        return None
+
+    # check if the user already has a token
+    reset_password_token = await backend.aget_token_for_user(matching_user)
+    if reset_password_token is not None:
+        # yes, already has a token, re-use this token
+        return reset_password_token
+
+    # no token exists, generate a new token
+    return await backend.acreate_token(
+        matching_user,
+        user_agent=user_agent,
+        ip_address=ip_address.split(",")[0],
+    )
+
+
+async def aget_valid_token(key, backend=None, request=None):
+    """
+    Async variant of get_valid_token
+    :raises Http404: if there is no such token or it has expired
+    """
+    backend = backend or password_reset_settings.TOKEN_BACKEND
+
+    # find the token, unless it has expired (expired tokens are deleted by the backend)
+    reset_password_token = await backend.aget_valid_token(key, now=timezone.now())
+    if reset_password_token is None:
+        raise Http404(INVALID_TOKEN_ERROR)
+
+    guess_budget = password_reset_settings.GUESS_BUDGET
+    if guess_budget is not None and request is not None and not await sync_to_async(guess_budget.check_token)(
+        reset_password_token.created_at, guess_budget.get_ident(request)
+    ):
+        # the client failed too many guesses while the token was outstanding
+        await backend.adelete_token(reset_password_token)
+        # (not every backend deletes a ResetPasswordToken, which would remove the token from the validation cache)
+        await ainvalidate_validation_cache_for_user(reset_password_token.user_id)
+        raise Http404(INVALID_TOKEN_ERROR)
+    return reset_password_token
+
+
+class PasswordAndTokenSerializer(TokenSerializer):
+    password = serializers.CharField(label=_("Password"), style={'input_type': 'password'})
+
+
+class AsyncPasswordResetView(View):
+    """
+    Base Class of the async views
+
+    The views are plain (async) Django views, as rest_framework does not support async handlers. Like the
+    rest_framework views, they accept JSON and form encoded data, are exempt from CSRF checks (no authentication is
+    used), check their throttles first and render errors like rest_framework's default exception handler.
+    """
+    http_method_names = ['post', 'options']
+    serializer_class = None
+    throttle_scope = None
+    # whether DJANGO_REST_PASSWORDRESET_GUESS_BUDGET applies to the view (see GuessBudgetMixin)
+    uses_guess_budget = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            if isinstance(exc, Http404):
+                await self.record_failed_guess(request)
+            return self.handle_exception(exc)
+
+    async def check_guess_budget(self, request):
+        """
+        :raises Throttled: if the client used up its guess budget (see GuessBudgetMixin)
+        """
+        guess_budget = password_reset_settings.GUESS_BUDGET
+        if self.uses_guess_budget and guess_budget is not None:
+            await sync_to_async(guess_budget.check)(guess_budget.get_ident(request))
+
+    async def record_failed_guess(self, request):
+        guess_budget = password_reset_settings.GUESS_BUDGET
+        if self.uses_guess_budget and guess_budget is not None:
+            await sync_to_async(guess_budget.record_failure)(guess_budget.get_ident(request))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound(*exc.args)
+
+        headers = {}
+        if getattr(exc, 'wait', None):
+            headers['Retry-After'] = '%d' % exc.wait
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+
+        return JsonResponse(data, status=exc.status_code, headers=headers, safe=False)
+
+    def get_throttles(self):
+        return [AsyncScopedRateThrottle()]
+
+    async def check_throttles(self, request):
+        """
+        Checks all throttles (throttles without aallow_request are run in a thread)
+        :raises Throttled: if the request is throttled
+        """
+        durations = []
+        for throttle in self.get_throttles():
+            if hasattr(throttle, 'aallow_request'):
+                allowed = await throttle.aallow_request(request, self)
+            else:
+                allowed = await sync_to_async(throttle.allow_request)(request, self)
+            if not allowed:
+                durations.append(throttle.wait())
+
+        if durations:
+            durations = [duration for duration in durations if duration is not None]
+            raise exceptions.Throttled(max(durations, default=None))
+
+    def get_data(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError as exc:
+                raise exceptions.ParseError('JSON parse error - %s' % exc)
+        return request.POST
+
+    async def get_validated_data(self, request):
+        """
+        Checks the throttles and the guess budget, parses the request body and validates it with serializer_class
+        :return: validated data
+        """
+        await self.check_throttles(request)
+        await self.check_guess_budget(request)
+
+        serializer = self.serializer_class(data=self.get_data(request))
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+
+class AsyncResetPasswordValidateToken(AsyncPasswordResetView):
+    """
+    An async View which provides a method to verify that a token is valid
+    """
+    serializer_class = TokenSerializer
+    throttle_scope = 'django-rest-passwordreset-validate-token'
+    uses_guess_budget = True
+
+    def get_throttles(self):
+        # like ResetPasswordValidateToken, but AsyncScopedRateThrottle replaces DEFAULT_THROTTLE_CLASSES
+        throttle_classes = get_password_reset_validate_token_throttle_classes()
+        if throttle_classes is None:
+            return super().get_throttles()
+        return [throttle_class() for throttle_class in throttle_classes]
+
+    async def post(self, request, *args, **kwargs):
+        validated_data = await self.get_validated_data(request)
+        reset_password_token = await aget_valid_token(validated_data['token'], request=request)
+
+        return_data = {'status': 'OK'}
+
+        if password_reset_settings.USER_DETAILS_ON_VALIDATION:
+            return_data['username'] = reset_password_token.user.username
+            return_data['email'] = reset_password_token.user.email
+
+        return JsonResponse(return_data)
+
+
+class AsyncResetPasswordConfirm(AsyncPasswordResetView):
+    """
+    An async View which provides a method to reset a password based on a unique token
+    """
+    serializer_class = PasswordAndTokenSerializer
+    throttle_scope = 'django-rest-passwordreset-confirm'
+    uses_guess_budget = True
+
+    def get_throttles(self):
+        # like ResetPasswordConfirm, but AsyncScopedRateThrottle replaces DEFAULT_THROTTLE_CLASSES
+        throttle_classes = get_password_reset_confirm_throttle_classes()
+        if throttle_classes is None:
+            return super().get_throttles()
+        return [throttle_class() for throttle_class in throttle_classes]
+
+    async def post(self, request, *args, **kwargs):
+        validated_data = await self.get_validated_data(request)
+        password = validated_data['password']
+
+        backend = password_reset_settings.TOKEN_BACKEND
+
+        # find token
+        reset_password_token = await aget_valid_token(validated_data['token'], backend, request=request)
+        user = reset_password_token.user
+
+        if not user.eligible_for_reset():
+            raise Http404(INVALID_TOKEN_ERROR)
+
+        # change user's password after token and eligibility checks
+        await pre_password_reset.asend(
+            sender=self.__class__,
+            user=user,
+            reset_password_token=reset_password_token,
+        )
+        try:
+            # validate the password against existing validators (which may query the database)
+            await sync_to_async(validate_password)(password, user=user)
+        except ValidationError as e:
+            # raise a validation error for the serializer
+            raise exceptions.ValidationError({
+                'password': e.messages
+            })
+
+        # hashing the password and the transaction that counts the use of the token, claims it and saves the password
+        # (like the sync ORM) need a thread; only one concurrent request with the same token gets past this point
+        await sync_to_async(reset_password_with_token)(reset_password_token, password, backend)
+        await ainvalidate_validation_cache_for_user(user.pk)
+
+        await post_password_reset.asend(
+            sender=self.__class__,
+            user=user,
+            reset_password_token=reset_password_token,
+        )
+
+        return JsonResponse({'status': 'OK'})
+
+
+class AsyncResetPasswordRequestToken(AsyncPasswordResetView):
+    """
+    An async View which provides a method to request a password reset token based on an e-mail address
+
+    Sends a signal reset_password_token_created when a reset token was created
+    """
+    serializer_class = EmailSerializer
+    throttle_scope = 'django-rest-passwordreset-request-token'
+
+    def get_throttles(self):
+        return [
+            throttle_class()
+            for throttle_class in get_async_password_reset_request_token_throttle_classes()
+        ]
+
+    async def post(self, request, *args, **kwargs):
+        started_at = time.monotonic()
+
+        validated_data = await self.get_validated_data(request)
+        email = validated_data['email']
+        user_agent = request.META.get(password_reset_settings.HTTP_USER_AGENT_HEADER, '')
+        ip_address = request.META.get(password_reset_settings.IP_ADDRESS_HEADER, '')
+
+        budget = get_response_time_budget()
+        if budget is None:
+            await self.process_request(email, user_agent, ip_address)
+        else:
+            # constant-time mode (see ResetPasswordRequestToken)
+            run_in_background(async_to_sync(self.process_request), email, user_agent, ip_address)
+            remaining = budget - (time.monotonic() - started_at)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+        return JsonResponse({'status': 'OK'})
+
+    async def process_request(self, email, user_agent, ip_address):
+        """
+        Clears expired tokens (if due), generates a token for the email address and sends the
+        reset_password_token_created signal
+        """
+        await aclear_expired_tokens_if_due()
+        token = await agenerate_token_for_email(
+            email=email,
+            user_agent=user_agent,
+            ip_address=ip_address,
+        )
+
+        if token:
+            # send a signal that the password token was created
+            # let whoever receives this signal handle sending the email for the password reset
+            await password_reset_settings.DISPATCHER.adispatch(
+                sender=self.__class__,
+                instance=self, reset_password_token=token
+            )
+
+
+async_reset_password_validate_token = AsyncResetPasswordValidateToken.as_view()
+async_reset_password_confirm = AsyncResetPasswordConfirm.as_view()
+async_reset_password_request_token = AsyncResetPasswordRequestToken.as_view()
@@ -0,0 +1,723 @@
+import hashlib
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connections, router
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_rest_passwordreset.models import (
+    ResetPasswordToken,
+    clear_expired,
+    get_password_reset_hashed_tokens,
+    get_password_reset_one_token_per_user,
+    get_password_reset_token_expiry,
+    get_password_reset_token_expiry_time,
+)
+from django_rest_passwordreset.partitioning import drop_expired_partitions, truncate
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.tokens import SignedTokenGenerator
+from django_rest_passwordreset.validation_cache import invalidate_validation_cache_for_users
+
+__all__ = [
+    'BaseTokenBackend',
+    'ModelTokenBackend',
+    'PartitionedModelTokenBackend',
+    'CacheTokenBackend',
+    'SignedTokenBackend',
+    'get_token_backend',
+]
+
+
+def get_token_backend():
+    """
+    Returns the token storage backend based on the configuration in DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND.CLASS and
+    DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND.OPTIONS; the views use the instance cached in
+    password_reset_settings.TOKEN_BACKEND
+    :return: token backend instance
+    """
+    # by default, tokens are stored in the ResetPasswordToken model
+    backend_class = ModelTokenBackend
+    options = {}
+
+    backend_config = password_reset_settings.TOKEN_BACKEND_CONFIG
+
+    if backend_config:
+        if "CLASS" in backend_config:
+            backend_class = backend_config["CLASS"]
+            if isinstance(backend_class, str):
+                backend_class = import_string(backend_class)
+
+        if "OPTIONS" in backend_config:
+            options = backend_config["OPTIONS"]
+
+    return backend_class(**options)
+
+
+class BaseTokenBackend:
+    """
+    Base Class for the token storage backends
+
+    Tokens are always represented as ResetPasswordToken instances (which are not necessarily saved to the database),
+    so signal receivers can access ``key``, ``user``, ``created_at``, ``expires_at``, ``ip_address`` and ``user_agent``
+    regardless of the backend.
+
+    - Can take arbitrary args/kwargs and work with those
+    - Needs to implement the "get_token_for_user", "create_token", "get_token", "delete_token",
+      "delete_tokens_for_user" and "clear_expired" Methods
+    - May implement the async variants ("aget_token_for_user", ...) used by the async views natively; by default they
+      run the sync Methods in a thread
+    - Should create tokens as decided by the token policy (see DJANGO_REST_PASSWORDRESET_TOKEN_POLICY)
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def prepare_user_queryset(self, users):
+        """
+        Hook to prepare the user queryset used to look up users by email (e.g., to fetch existing tokens in the
+        same query)
+        """
+        return users
+
+    def get_token_for_user(self, user):
+        """ returns an existing token of the user that is still valid (see get_valid_token) or None """
+        raise NotImplementedError
+
+    def create_token(self, user, user_agent='', ip_address=''):
+        """ creates and returns a new token for the user """
+        raise NotImplementedError
+
+    def get_tokens_for_users(self, users):
+        """
+        returns the existing valid tokens of the users (bulk variant of get_token_for_user)
+        :return: dict mapping the pk of each user that has a valid token to the token
+        """
+        tokens = {}
+        for user in users:
+            token = self.get_token_for_user(user)
+            if token is not None:
+                tokens[user.pk] = token
+        return tokens
+
+    def create_tokens(self, users, user_agent='', ip_address=''):
+        """ creates and returns a new token for each of the users (bulk variant of create_token) """
+        return [self.create_token(user, user_agent=user_agent, ip_address=ip_address) for user in users]
+
+    def get_token_attributes(self, users, user_agent='', ip_address=''):
+        """
+        Decides the key, the expiry date and the number of uses of a new token for each of the users with the token
+        policy (see DJANGO_REST_PASSWORDRESET_TOKEN_POLICY)
+        :return: list of tuples (key, expires_at, remaining_uses), in the order of users
+        """
+        policy = password_reset_settings.TOKEN_POLICY
+        now = timezone.now()
+        keys = policy.generate_keys(users, user_agent=user_agent, ip_address=ip_address)
+        return [
+            (
+                key,
+                now + policy.get_lifetime(user, user_agent=user_agent, ip_address=ip_address),
+                policy.get_max_uses(user, user_agent=user_agent, ip_address=ip_address),
+            )
+            for user, key in zip(users, keys)
+        ]
+
+    def get_token(self, key):
+        """ returns the token with the given key or None """
+        raise NotImplementedError
+
+    def get_valid_token(self, key, now=None):
+        """
+        returns the token with the given key if it has not expired at now (default: the current time) and was not used
+        up, or None; the default implementation looks up the token with get_token and deletes it if it is not valid
+        """
+        token = self.get_token(key)
+        if token is not None and (token.is_expired(now) or token.is_used_up()):
+            self.delete_token(token)
+            return None
+        return token
+
+    def delete_token(self, token):
+        """ deletes a single token """
+        raise NotImplementedError
+
+    def delete_tokens_for_user(self, user):
+        """ deletes all tokens of the user """
+        raise NotImplementedError
+
+    def claim_token(self, token):
+        """
+        Claims the token for resetting the password (called within a transaction). Only one of several concurrent
+        calls for the same token must succeed; the default implementation deletes the token and does not guarantee that
+        :return: True if the token was claimed, False if it was already used
+        """
+        self.delete_token(token)
+        return True
+
+    def use_token(self, token):
+        """
+        Counts a use of the token by the confirm endpoint (see remaining_uses), called by reset_password_with_token
+        within the transaction that claims the token; looking up the token does not count. The default implementation
+        does not limit the uses
+        :return: True if the token could be used, False if it was already used up
+        """
+        return True
+
+    def clear_expired(self, expiry_time):
+        """
+        deletes all tokens created before expiry_time
+        :return: number of deleted tokens
+        """
+        raise NotImplementedError
+
+    async def aget_token_for_user(self, user):
+        return await sync_to_async(self.get_token_for_user)(user)
+
+    async def acreate_token(self, user, user_agent='', ip_address=''):
+        return await sync_to_async(self.create_token)(user, user_agent=user_agent, ip_address=ip_address)
+
+    async def aget_token(self, key):
+        """ returns the token with the given key or None; the user of the token is loaded as well """
+        def get_token():
+            token = self.get_token(key)
+            if token is not None:
+                # load the user within the thread, it can not be loaded lazily in an async context
+                token.user
+            return token
+
+        return await sync_to_async(get_token)()
+
+    async def aget_valid_token(self, key, now=None):
+        """ async variant of get_valid_token; the user of the token is loaded as well """
+        token = await self.aget_token(key)
+        if token is not None and (token.is_expired(now) or token.is_used_up()):
+            await self.adelete_token(token)
+            return None
+        return token
+
+    async def adelete_token(self, token):
+        await sync_to_async(self.delete_token)(token)
+
+    async def adelete_tokens_for_user(self, user):
+        await sync_to_async(self.delete_tokens_for_user)(user)
+
+    async def ause_token(self, token):
+        return await sync_to_async(self.use_token)(token)
+
+    async def aclear_expired(self, expiry_time):
+        return await sync_to_async(self.clear_expired)(expiry_time)
+
+
+class ModelTokenBackend(BaseTokenBackend):
+    """
+    Stores tokens in the ResetPasswordToken model (default)
+
+    Tokens are looked up by the SHA-256 digest of their key. With DJANGO_REST_PASSWORDRESET_HASHED_TOKENS, only the
+    digest is stored; existing tokens can then not be sent again, so every request creates a new token.
+    """
+    user_token_annotation = 'password_reset_token_id'
+
+    def prepare_user_queryset(self, users):
+        if get_password_reset_hashed_tokens():
+            return users
+
+        # fetch the id of an existing valid token of each user in the same query; expired or used up tokens are not
+        # sent again (they are removed by the cleanup strategy)
+        return users.annotate(**{
+            self.user_token_annotation: Subquery(
+                ResetPasswordToken.objects.valid().filter(user=OuterRef('pk')).order_by('pk').values('pk')[:1]
+            )
+        })
+
+    def get_token_for_user(self, user):
+        if get_password_reset_hashed_tokens():
+            return None
+
+        if hasattr(user, self.user_token_annotation):
+            token_id = getattr(user, self.user_token_annotation)
+            if token_id is None:
+                return None
+            # the token might have been deleted (or might have expired) in the meantime
+            token = ResetPasswordToken.objects.valid().filter(pk=token_id).first()
+        else:
+            token = user.password_reset_tokens.valid().order_by('pk').first()
+
+        if token is not None:
+            token.user = user
+        return token
+
+    def create_token(self, user, user_agent='', ip_address=''):
+        if get_password_reset_one_token_per_user():
+            tokens = self.create_tokens([user], user_agent=user_agent, ip_address=ip_address)
+            return tokens[0] if tokens else None
+
+        (key, expires_at, remaining_uses), = self.get_token_attributes([user], user_agent, ip_address)
+        return ResetPasswordToken.objects.create(
+            user=user,
+            key=key,
+            expires_at=expires_at,
+            remaining_uses=remaining_uses,
+            user_agent=user_agent,
+            ip_address=ip_address,
+        )
+
+    def get_tokens_for_users(self, users):
+        if get_password_reset_hashed_tokens():
+            return {}
+
+        if not all(hasattr(user, self.user_token_annotation) for user in users):
+            return super().get_tokens_for_users(users)
+
+        # fetch all existing tokens with one query
+        users_by_token_id = {
+            getattr(user, self.user_token_annotation): user
+            for user in users
+            if getattr(user, self.user_token_annotation) is not None
+        }
+        if not users_by_token_id:
+            return {}
+
+        tokens = {}
+        for token in ResetPasswordToken.objects.valid().filter(pk__in=users_by_token_id):
+            token.user = users_by_token_id[token.pk]
+            tokens[token.user.pk] = token
+        return tokens
+
+    def create_tokens(self, users, user_agent='', ip_address=''):
+        # bulk_create does not call save(), so the keys, their digests and the expiry dates are generated here
+        users = list(users)
+        attributes = self.get_token_attributes(users, user_agent, ip_address)
+        keys = [key for key, expires_at, remaining_uses in attributes]
+        hashed = get_password_reset_hashed_tokens()
+        one_token_per_user = get_password_reset_one_token_per_user()
+
+        tokens = [
+            ResetPasswordToken(
+                user=user,
+                key=None if hashed else key,
+                key_digest=ResetPasswordToken.get_key_digest(key),
+                user_agent=user_agent,
+                ip_address=ip_address,
+                unique_user=user if one_token_per_user else None,
+                expires_at=expires_at,
+                remaining_uses=remaining_uses,
+            )
+            for user, (key, expires_at, remaining_uses) in zip(users, attributes)
+        ]
+
+        if not one_token_per_user:
+            tokens = ResetPasswordToken.objects.bulk_create(tokens)
+        elif hashed:
+            # the key of an existing token is not known, so it is replaced by the new token (INSERT ... ON CONFLICT DO
+            # UPDATE); tokens that were sent before become invalid
+            tokens = ResetPasswordToken.objects.bulk_create(
+                tokens,
+                update_conflicts=True,
+                update_fields=['key_digest', 'created_at', 'expires_at', 'remaining_uses', 'user_agent', 'ip_address'],
+                **self._get_unique_user_conflict_target()
+            )
+            # the replaced tokens are not deleted, so post_delete does not remove them from the validation cache
+            invalidate_validation_cache_for_users([user.pk for user in users])
+        else:
+            # INSERT ... ON CONFLICT DO NOTHING: a token created by a concurrent request in the meantime is re-used
+            ResetPasswordToken.objects.bulk_create(tokens, ignore_conflicts=True)
+            existing_tokens = self._get_tokens_by_unique_user(users)
+
+            # an expired or used up token of a user conflicted with the new one, but must not be re-used: replace it
+            now = timezone.now()
+            invalid_user_pks = {
+                user_pk for user_pk, token in existing_tokens.items() if token.is_expired(now) or token.is_used_up()
+            }
+            if invalid_user_pks:
+                invalid_users = [user for user in users if user.pk in invalid_user_pks]
+                ResetPasswordToken.objects.invalid(now).filter(unique_user__in=invalid_users).delete()
+                ResetPasswordToken.objects.bulk_create(
+                    [token for token in tokens if token.user_id in invalid_user_pks], ignore_conflicts=True
+                )
+                existing_tokens.update(self._get_tokens_by_unique_user(invalid_users))
+
+            # (unless the token was used in the meantime as well)
+            return [
+                existing_tokens[user.pk] for user in users
+                if user.pk in existing_tokens and not existing_tokens[user.pk].is_expired(now)
+                and not existing_tokens[user.pk].is_used_up()
+            ]
+
+        for token, key in zip(tokens, keys):
+            token.key = key
+        return tokens
+
+    def _get_tokens_by_unique_user(self, users):
+        """ returns the tokens of the users (with ONE_TOKEN_PER_USER) by the pk of their user """
+        users_by_pk = {user.pk: user for user in users}
+        tokens = {}
+        for token in ResetPasswordToken.objects.filter(unique_user__in=users):
+            token.user = users_by_pk[token.user_id]
+            tokens[token.user_id] = token
+        return tokens
+
+    def _get_unique_user_conflict_target(self):
+        """ returns the unique_fields argument of bulk_create, if the database supports a conflict target """
+        connection = connections[router.db_for_write(ResetPasswordToken)]
+        if connection.features.supports_update_conflicts_with_target:
+            return {'unique_fields': ['unique_user']}
+        return {}
+
+    def get_token(self, key):
+        try:
+            token = ResetPasswordToken.objects.select_related('user').filter(
+                key_digest=ResetPasswordToken.get_key_digest(key)
+            ).first()
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+        if token is not None:
+            token.key = key
+        return token
+
+    def get_valid_token(self, key, now=None):
+        # the token is looked up by its key alone and checked in python, so an unknown key costs a single SELECT; only
+        # a token that was found but is no longer valid is deleted
+        now = now or timezone.now()
+        token = self.get_token(key)
+        if token is not None and (token.is_expired(now) or token.is_used_up()):
+            ResetPasswordToken.objects.filter(pk=token.pk).delete()
+            return None
+        return token
+
+    def delete_token(self, token):
+        token.delete()
+
+    def delete_tokens_for_user(self, user):
+        ResetPasswordToken.objects.filter(user=user).delete()
+
+    def claim_token(self, token):
+        # conditional delete: a concurrent DELETE of the same row waits for this transaction and then deletes nothing
+        deleted, _rows = ResetPasswordToken.objects.filter(pk=token.pk).delete()
+        return deleted > 0
+
+    def use_token(self, token):
+        if token.remaining_uses is None:
+            return True
+        # conditional update: the token may have been used up by a concurrent request in the meantime
+        if not ResetPasswordToken.objects.filter(pk=token.pk, remaining_uses__gt=0).update(
+            remaining_uses=F('remaining_uses') - 1
+        ):
+            return False
+        token.remaining_uses -= 1
+        return True
+
+    def clear_expired(self, expiry_time):
+        return clear_expired(expiry_time)
+
+    async def aget_token_for_user(self, user):
+        if get_password_reset_hashed_tokens():
+            return None
+
+        if hasattr(user, self.user_token_annotation):
+            token_id = getattr(user, self.user_token_annotation)
+            if token_id is None:
+                return None
+            token = await ResetPasswordToken.objects.valid().filter(pk=token_id).afirst()
+        else:
+            token = await user.password_reset_tokens.valid().order_by('pk').afirst()
+
+        if token is not None:
+            token.user = user
+        return token
+
+    async def acreate_token(self, user, user_agent='', ip_address=''):
+        if get_password_reset_one_token_per_user():
+            return await super().acreate_token(user, user_agent=user_agent, ip_address=ip_address)
+
+        # the token policy may query the database
+        (key, expires_at, remaining_uses), = await sync_to_async(self.get_token_attributes)(
+            [user], user_agent, ip_address
+        )
+        return await ResetPasswordToken.objects.acreate(
+            user=user,
+            key=key,
+            expires_at=expires_at,
+            remaining_uses=remaining_uses,
+            user_agent=user_agent,
+            ip_address=ip_address,
+        )
+
+    async def aget_token(self, key):
+        try:
+            token = await ResetPasswordToken.objects.filter(
+                key_digest=ResetPasswordToken.get_key_digest(key)
+            ).select_related('user').afirst()
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+        if token is not None:
+            token.key = key
+        return token
+
+    async def aget_valid_token(self, key, now=None):
+        now = now or timezone.now()
+        token = await self.aget_token(key)
+        if token is not None and (token.is_expired(now) or token.is_used_up()):
+            await ResetPasswordToken.objects.filter(pk=token.pk).adelete()
+            return None
+        return token
+
+    async def adelete_token(self, token):
+        await token.adelete()
+
+    async def ause_token(self, token):
+        if token.remaining_uses is None:
+            return True
+        if not await ResetPasswordToken.objects.filter(pk=token.pk, remaining_uses__gt=0).aupdate(
+            remaining_uses=F('remaining_uses') - 1
+        ):
+            return False
+        token.remaining_uses -= 1
+        return True
+
+    async def adelete_tokens_for_user(self, user):
+        await ResetPasswordToken.objects.filter(user=user).adelete()
+
+    async def aclear_expired(self, expiry_time):
+        return (await ResetPasswordToken.objects.expired(expiry_time + get_password_reset_token_expiry()).adelete())[0]
+
+
+class PartitionedModelTokenBackend(ModelTokenBackend):
+    """
+    Stores tokens in the ResetPasswordToken model like ModelTokenBackend, in a PostgreSQL table that is partitioned by
+    created_at (see the partitionresetpasswordtokens management command). The clearresetpasswodtokens management
+    command removes expired tokens by dropping the partitions that only contain expired tokens instead of deleting them
+    row by row; clear_expired (e.g., the cleanup of the request-token endpoint) only deletes rows, as dropping a
+    partition locks the whole table.
+
+    Options: ``interval`` of the partitions ("day" or "hour", Default: "day") and the number of partitions the
+    management command creates ``ahead`` (Default: 7)
+    """
+
+    def __init__(self, interval='day', ahead=7, *args, **kwargs):
+        if get_password_reset_one_token_per_user():
+            raise ImproperlyConfigured(
+                "DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER is not supported by the PartitionedModelTokenBackend, "
+                "the unique constraint would have to include created_at"
+            )
+        # raises ImproperlyConfigured for an unknown interval
+        truncate(timezone.now(), interval)
+        self.interval = interval
+        self.ahead = ahead
+
+    def drop_expired_partitions(self, expiry_time):
+        """
+        drops the partitions that only contain tokens created before expiry_time
+        :return: names of the dropped partitions
+        """
+        return drop_expired_partitions(expiry_time, self.interval)
+
+
+class CacheTokenBackend(BaseTokenBackend):
+    """
+    Stores tokens in a Django cache instead of the database
+
+    Each token is stored under a key derived from the SHA-256 digest of the token, with a timeout equal to its lifetime
+    (DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME, unless the token policy decides otherwise), so expired tokens
+    are evicted by the cache itself. The maximum number of uses of the token policy is not supported. Each token is
+    bound to the current generation of its user, a random value that is dropped once the password was reset, which
+    invalidates all of the user's tokens without keeping a list of them (so concurrent requests cannot lose a token).
+
+    Use a cache that is shared between your workers and that does not evict entries early (e.g., Redis). Tokens only
+    exist in memory and are never written to the ResetPasswordToken table.
+    """
+
+    def __init__(self, cache_alias='default', key_prefix='django-rest-passwordreset', *args, **kwargs):
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_timeout(self):
+        """
+        Timeout of the generation of a user, which must not expire before the user's tokens
+        :return: the default lifetime of a token in seconds
+        """
+        return get_password_reset_token_expiry_time() * 60 * 60
+
+    def _get_expires_at(self, data):
+        # tokens cached before their expiry date was stored expire after the expiry time
+        return data.get('expires_at') or data['created_at'] + get_password_reset_token_expiry()
+
+    def _token_cache_key(self, key):
+        return '{prefix}:token:{digest}'.format(
+            prefix=self.key_prefix,
+            digest=hashlib.sha256(str(key).encode()).hexdigest(),
+        )
+
+    def _generation_cache_key(self, user_id):
+        return '{prefix}:generation:{user_id}'.format(prefix=self.key_prefix, user_id=user_id)
+
+    def _latest_cache_key(self, user_id):
+        return '{prefix}:latest:{user_id}'.format(prefix=self.key_prefix, user_id=user_id)
+
+    def _get_generation(self, user_id, timeout):
+        """
+        Returns the generation of the user, starting a new one if there is none
+        cache.add() is atomic, so concurrent requests of the same user agree on the generation.
+        """
+        generation_key = self._generation_cache_key(user_id)
+        new_generation = secrets.token_hex(16)
+        if self.cache.add(generation_key, new_generation, timeout):
+            return new_generation
+
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            # dropped by a concurrent reset of the password, so the new token is invalid as well
+            return new_generation
+        # the generation must not expire before the new token
+        self.cache.touch(generation_key, timeout)
+        return generation
+
+    def _is_valid(self, data, generation, now):
+        # tokens of a previous (or expired) generation were invalidated by delete_tokens_for_user
+        return generation is not None and data.get('generation') == generation and self._get_expires_at(data) > now
+
+    def _build_token(self, key, data, user=None):
+        token = ResetPasswordToken(
+            key=key,
+            user_id=data['user_id'],
+            created_at=data['created_at'],
+            expires_at=self._get_expires_at(data),
+            ip_address=data['ip_address'],
+            user_agent=data['user_agent'],
+        )
+        if user is not None:
+            token.user = user
+        return token
+
+    def get_token_for_user(self, user):
+        key = self.cache.get(self._latest_cache_key(user.pk))
+        if key is None:
+            return None
+
+        token_cache_key = self._token_cache_key(key)
+        generation_key = self._generation_cache_key(user.pk)
+        cached = self.cache.get_many([token_cache_key, generation_key])
+        data = cached.get(token_cache_key)
+        if data is None or not self._is_valid(data, cached.get(generation_key), timezone.now()):
+            return None
+        return self._build_token(key, data, user=user)
+
+    def create_token(self, user, user_agent='', ip_address=''):
+        (key, expires_at, remaining_uses), = self.get_token_attributes([user], user_agent, ip_address)
+        now = timezone.now()
+        timeout = (expires_at - now).total_seconds()
+        data = {
+            'user_id': user.pk,
+            'created_at': now,
+            'expires_at': expires_at,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'generation': self._get_generation(user.pk, max(timeout, self.get_timeout())),
+        }
+
+        self.cache.set_many({
+            self._token_cache_key(key): data,
+            # only used to re-use the most recent token; every token is checked against the generation
+            self._latest_cache_key(user.pk): key,
+        }, timeout)
+
+        return self._build_token(key, data, user=user)
+
+    def get_token(self, key):
+        data = self.cache.get(self._token_cache_key(key))
+        if data is None:
+            return None
+        generation = self.cache.get(self._generation_cache_key(data['user_id']))
+        if not self._is_valid(data, generation, timezone.now()):
+            return None
+        return self._build_token(key, data)
+
+    def delete_token(self, token):
+        self.cache.delete(self._token_cache_key(token.key))
+
+    def delete_tokens_for_user(self, user):
+        # dropping the generation invalidates all tokens of the user, including those created concurrently
+        self.cache.delete_many([self._generation_cache_key(user.pk), self._latest_cache_key(user.pk)])
+
+    def claim_token(self, token):
+        # cache.delete() reports whether the key existed, which is atomic in the cache (not part of the transaction)
+        return self.cache.delete(self._token_cache_key(token.key))
+
+    def clear_expired(self, expiry_time):
+        # expired tokens are evicted by the cache
+        return 0
+
+
+class SignedTokenBackend(BaseTokenBackend):
+    """
+    Does not store tokens at all, but issues stateless tokens signed by SignedTokenGenerator
+
+    Validating a token only needs the user (one SELECT on the user table). A token expires after
+    DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME hours and becomes invalid as soon as the user's password (or
+    last login or email) changed, so it can be used only once. Tokens can not be revoked individually. The token
+    policy does not apply to signed tokens.
+    """
+
+    def __init__(self, secret=None, algorithm='sha256', *args, **kwargs):
+        self.token_generator = SignedTokenGenerator(secret=secret, algorithm=algorithm)
+
+    def get_token_for_user(self, user):
+        # a new token is signed for every request
+        return None
+
+    def create_token(self, user, user_agent='', ip_address=''):
+        created_at = timezone.now()
+        return ResetPasswordToken(
+            user=user,
+            key=self.token_generator.make_token(user),
+            created_at=created_at,
+            expires_at=created_at + get_password_reset_token_expiry(),
+            ip_address=ip_address,
+            user_agent=user_agent,
+        )
+
+    def get_token(self, key):
+        parsed = self.token_generator.parse_token(key)
+        if parsed is None:
+            return None
+        user_id, created_at = parsed
+
+        try:
+            user = get_user_model()._default_manager.filter(pk=user_id).first()
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+        max_age = get_password_reset_token_expiry_time() * 60 * 60
+        if not self.token_generator.check_token(user, key, max_age=max_age):
+            return None
+
+        return ResetPasswordToken(
+            user=user, key=key, created_at=created_at, expires_at=created_at + get_password_reset_token_expiry()
+        )
+
+    def delete_token(self, token):
+        # tokens are not stored
+        pass
+
+    def delete_tokens_for_user(self, user):
+        # tokens are invalidated by the password change
+        pass
+
+    def claim_token(self, token):
+        # lock the user row and check the token again: a concurrent claim waits until the password change of this
+        # transaction was committed, after which the token is no longer valid
+        user = get_user_model()._default_manager.select_for_update().filter(pk=token.user_id).first()
+        max_age = get_password_reset_token_expiry_time() * 60 * 60
+        return self.token_generator.check_token(user, token.key, max_age=max_age)
+
+    def clear_expired(self, expiry_time):
+        # tokens are not stored
+        return 0
@@ -0,0 +1,10 @@
+""" URL Configuration of the bulk request-token endpoint (staff users only), which is not part of urls.py """
+from django.urls import path
+
+from django_rest_passwordreset.views import reset_password_bulk_request_token
+
+app_name = 'password_reset_bulk'
+
+urlpatterns = [
+    path("", reset_password_bulk_request_token, name="reset-password-bulk-request"),
+]
@@ -0,0 +1,137 @@
+import random
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+from django_rest_passwordreset.settings import password_reset_settings
+
+__all__ = [
+    'BaseCleanupStrategy',
+    'InlineCleanupStrategy',
+    'ProbabilisticCleanupStrategy',
+    'IntervalCleanupStrategy',
+    'DisabledCleanupStrategy',
+    'get_cleanup_strategy',
+]
+
+
+def get_cleanup_strategy():
+    """
+    Returns the expired-token cleanup strategy based on the configuration in
+    DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY.CLASS and DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY.OPTIONS; the views
+    use the instance cached in password_reset_settings.CLEANUP_STRATEGY
+    :return: cleanup strategy instance
+    """
+    # by default, expired tokens are cleared on every request (legacy behavior)
+    strategy_class = InlineCleanupStrategy
+    options = {}
+
+    cleanup_config = password_reset_settings.CLEANUP_STRATEGY_CONFIG
+
+    if cleanup_config:
+        if "CLASS" in cleanup_config:
+            strategy_class = cleanup_config["CLASS"]
+            if isinstance(strategy_class, str):
+                strategy_class = import_string(strategy_class)
+
+        if "OPTIONS" in cleanup_config:
+            options = cleanup_config["OPTIONS"]
+
+    return strategy_class(**options)
+
+
+class BaseCleanupStrategy:
+    """
+    Base Class for the expired-token cleanup strategies used by the request-token endpoint
+
+    - Can take arbitrary args/kwargs and work with those
+    - Needs to implement the "should_clear" Method
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def should_clear(self):
+        """ returns True if the caller should clear expired tokens now """
+        raise NotImplementedError
+
+    def maybe_clear(self, clear_func):
+        """
+        Calls clear_func if the strategy decides that a cleanup is due
+        :return: True if clear_func was called
+        """
+        if not self.should_clear():
+            return False
+
+        clear_func()
+        return True
+
+    async def ashould_clear(self):
+        """ async variant of should_clear; strategies whose should_clear does I/O should override it """
+        return self.should_clear()
+
+    async def amaybe_clear(self, clear_func):
+        """
+        Awaits clear_func if the strategy decides that a cleanup is due (async variant of maybe_clear)
+        :return: True if clear_func was awaited
+        """
+        if not await self.ashould_clear():
+            return False
+
+        await clear_func()
+        return True
+
+
+class InlineCleanupStrategy(BaseCleanupStrategy):
+    """
+    Clears expired tokens on every request (default, legacy behavior)
+    """
+
+    def should_clear(self):
+        return True
+
+
+class DisabledCleanupStrategy(BaseCleanupStrategy):
+    """
+    Never clears expired tokens on a request; use this if the clearresetpasswodtokens management command
+    is scheduled (cron, Celery beat, ...)
+    """
+
+    def should_clear(self):
+        return False
+
+
+class ProbabilisticCleanupStrategy(BaseCleanupStrategy):
+    """
+    Clears expired tokens on roughly one in ``one_in`` requests
+    """
+
+    def __init__(self, one_in=100, *args, **kwargs):
+        if one_in < 1:
+            raise ValueError("one_in must be greater or equal to 1")
+        self.one_in = one_in
+        self._random = random.SystemRandom()
+
+    def should_clear(self):
+        return self._random.randrange(self.one_in) == 0
+
+
+class IntervalCleanupStrategy(BaseCleanupStrategy):
+    """
+    Clears expired tokens at most once per ``interval`` seconds across all workers
+
+    A lease is acquired with an atomic ``cache.add``, so only the worker that wins the lease sweeps the table; all
+    other requests within the interval skip the cleanup. Requires a cache that is shared between workers (e.g.
+    Redis or Memcached) for the guarantee to hold across processes.
+    """
+
+    def __init__(self, interval=300, cache_alias='default', key='django-rest-passwordreset-cleanup-lease',
+                 *args, **kwargs):
+        self.interval = interval
+        self.cache_alias = cache_alias
+        self.key = key
+
+    def should_clear(self):
+        return caches[self.cache_alias].add(self.key, 1, timeout=self.interval)
+
+    async def ashould_clear(self):
+        return await caches[self.cache_alias].aadd(self.key, 1, timeout=self.interval)
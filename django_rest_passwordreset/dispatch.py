@@ -0,0 +1,533 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_rest_passwordreset.models import ResetPasswordToken, ResetPasswordTokenDelivery, \
+    get_password_reset_token_expiry
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.signals import reset_password_token_created, reset_password_tokens_created
+
+__all__ = [
+    'BaseDispatcher',
+    'SynchronousDispatcher',
+    'OnCommitDispatcher',
+    'ThreadPoolDispatcher',
+    'QueueDispatcher',
+    'BaseDeliveryQueue',
+    'InProcessDeliveryQueue',
+    'DatabaseDeliveryQueue',
+    'get_dispatcher',
+    'get_executor',
+    'run_in_background',
+    'send_reset_password_token_created',
+]
+
+logger = logging.getLogger(__name__)
+
+
+def _load_configured_class(config, default_class):
+    """
+    Initializes a class configured as {"CLASS": ..., "OPTIONS": {...}} (CLASS may be a dotted path)
+    """
+    klass = default_class
+    options = {}
+
+    if config:
+        if "CLASS" in config:
+            klass = config["CLASS"]
+            if isinstance(klass, str):
+                klass = import_string(klass)
+
+        if "OPTIONS" in config:
+            options = config["OPTIONS"]
+
+    return klass(**options)
+
+
+def get_dispatcher():
+    """
+    Returns the dispatcher for the reset_password_token_created signal based on the configuration in
+    DJANGO_REST_PASSWORDRESET_DISPATCHER.CLASS and DJANGO_REST_PASSWORDRESET_DISPATCHER.OPTIONS; the views use the
+    instance cached in password_reset_settings.DISPATCHER
+    :return: dispatcher instance
+    """
+    # by default, the signal is sent synchronously within the request
+    return _load_configured_class(password_reset_settings.DISPATCHER_CONFIG, SynchronousDispatcher)
+
+
+def get_executor():
+    """
+    Returns the process wide, bounded thread pool used for out of band work (see
+    DJANGO_REST_PASSWORDRESET_EXECUTOR_MAX_WORKERS, default: 4); a new pool is created once the settings changed
+    """
+    return password_reset_settings.EXECUTOR
+
+
+def _close_connections(func):
+    """ wraps func such that the database connections of the (worker) thread are closed afterwards """
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) in the thread pool returned by get_executor(); exceptions are logged, as nobody waits
+    for the result
+    :return: Future
+    """
+    def run():
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logger.exception("Background task %s failed", getattr(func, '__qualname__', repr(func)))
+            raise
+
+    return get_executor().submit(_close_connections(run))
+
+
+def send_reset_password_token_created(sender, instance, reset_password_token, receivers=None):
+    """
+    Sends the reset_password_token_created signal to all receivers (or only to the given receivers). Exceptions raised
+    by receivers are caught, so every receiver is called.
+    :return: list of (receiver, exception) tuples for the receivers that failed
+    """
+    kwargs = {
+        'instance': instance,
+        'reset_password_token': reset_password_token,
+    }
+
+    if receivers is None:
+        responses = reset_password_token_created.send_robust(sender=sender, **kwargs)
+    else:
+        responses = []
+        for receiver in receivers:
+            try:
+                response = reset_password_token_created.call_receiver(receiver, sender, **kwargs)
+            except Exception as err:
+                response = err
+            responses.append((receiver, response))
+
+    return [(receiver, response) for receiver, response in responses if isinstance(response, Exception)]
+
+
+def _describe_failures(failures):
+    return "; ".join(
+        "{receiver}: {error!r}".format(receiver=getattr(receiver, '__qualname__', repr(receiver)), error=error)
+        for receiver, error in failures
+    )
+
+
+class BaseDispatcher:
+    """
+    Base Class for the dispatchers of the reset_password_token_created signal
+
+    - Can take arbitrary args/kwargs and work with those
+    - Needs to implement the "dispatch" Method
+    - May implement "adispatch" (used by the async views) natively; by default it runs "dispatch" in a thread
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def dispatch(self, sender, instance, reset_password_token):
+        raise NotImplementedError
+
+    async def adispatch(self, sender, instance, reset_password_token):
+        await sync_to_async(self.dispatch)(sender, instance, reset_password_token)
+
+    def dispatch_many(self, sender, instance, reset_password_tokens):
+        """
+        Dispatches a batch of tokens: if reset_password_tokens_created has receivers, it is sent once (synchronously)
+        for the whole batch; otherwise reset_password_token_created is dispatched for each token
+        """
+        if reset_password_tokens_created.has_listeners(sender):
+            reset_password_tokens_created.send(
+                sender=sender,
+                instance=instance, reset_password_tokens=reset_password_tokens
+            )
+            return
+
+        for reset_password_token in reset_password_tokens:
+            self.dispatch(sender, instance, reset_password_token)
+
+
+class SynchronousDispatcher(BaseDispatcher):
+    """
+    Sends the signal within the request; exceptions of receivers are propagated (default, legacy behavior)
+    """
+
+    def dispatch(self, sender, instance, reset_password_token):
+        reset_password_token_created.send(
+            sender=sender,
+            instance=instance, reset_password_token=reset_password_token
+        )
+
+    async def adispatch(self, sender, instance, reset_password_token):
+        await reset_password_token_created.asend(
+            sender=sender,
+            instance=instance, reset_password_token=reset_password_token
+        )
+
+
+class OnCommitDispatcher(BaseDispatcher):
+    """
+    Sends the signal once the current database transaction was committed (immediately if there is none)
+
+    Failing receivers are retried up to max_retries times right away, as the signal is sent in the request thread.
+    Receivers that still fail are logged as dead letters.
+    """
+    # seconds to wait between the attempts; only the dispatchers that deliver out of band wait
+    retry_delay = 0
+
+    def __init__(self, max_retries=3, using=None, *args, **kwargs):
+        self.max_retries = max_retries
+        self.using = using
+
+    def dispatch(self, sender, instance, reset_password_token):
+        transaction.on_commit(
+            lambda: self.deliver(sender, instance, reset_password_token),
+            using=self.using,
+        )
+
+    def deliver(self, sender, instance, reset_password_token):
+        """
+        Sends the signal and retries failing receivers
+        :return: list of (receiver, exception) tuples for the receivers that failed on the last attempt
+        """
+        failures = send_reset_password_token_created(sender, instance, reset_password_token)
+
+        attempt = 0
+        while failures and attempt < self.max_retries:
+            attempt += 1
+            if self.retry_delay:
+                time.sleep(self.retry_delay)
+            failures = send_reset_password_token_created(
+                sender, instance, reset_password_token, receivers=[receiver for receiver, _ in failures]
+            )
+
+        if failures:
+            self.dead_letter(sender, instance, reset_password_token, failures)
+        return failures
+
+    def dead_letter(self, sender, instance, reset_password_token, failures):
+        """ called with the receivers that still failed after all retries """
+        logger.error(
+            "Delivery of reset_password_token_created for user %s failed: %s",
+            reset_password_token.user_id, _describe_failures(failures),
+        )
+
+
+class ThreadPoolDispatcher(OnCommitDispatcher):
+    """
+    Sends the signal in the thread pool returned by get_executor() once the current transaction was committed, so the
+    request does not wait for the receivers (e.g., for sending an e-mail)
+
+    Failing receivers are retried up to max_retries times, waiting retry_delay seconds in between (in the worker
+    thread).
+    """
+
+    def __init__(self, max_retries=3, retry_delay=1, using=None, *args, **kwargs):
+        super().__init__(max_retries=max_retries, using=using)
+        self.retry_delay = retry_delay
+
+    def dispatch(self, sender, instance, reset_password_token):
+        transaction.on_commit(
+            lambda: get_executor().submit(
+                _close_connections(self.deliver), sender, instance, reset_password_token
+            ),
+            using=self.using,
+        )
+
+
+class QueueDispatcher(BaseDispatcher):
+    """
+    Puts the signal on a delivery queue once the current transaction was committed; the queue is configured as
+    {"CLASS": ..., "OPTIONS": {...}} (Default: InProcessDeliveryQueue)
+    """
+
+    def __init__(self, queue=None, using=None, *args, **kwargs):
+        self.queue = _load_configured_class(queue, InProcessDeliveryQueue)
+        self.using = using
+
+    def dispatch(self, sender, instance, reset_password_token):
+        transaction.on_commit(
+            lambda: self.queue.enqueue(sender, instance, reset_password_token),
+            using=self.using,
+        )
+
+
+class BaseDeliveryQueue:
+    """
+    Base Class for the delivery queues used by QueueDispatcher
+
+    - Can take arbitrary args/kwargs and work with those
+    - Needs to implement the "enqueue" and "process" Methods
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def enqueue(self, sender, instance, reset_password_token):
+        raise NotImplementedError
+
+    def process(self, limit=None):
+        """
+        Delivers queued signals
+        :return: tuple (number of successful deliveries, number of failed deliveries)
+        """
+        raise NotImplementedError
+
+
+# state of InProcessDeliveryQueue, shared by all of its instances within the process
+_in_process_queue = queue.Queue()
+_in_process_dead_letters = deque(maxlen=1000)
+_in_process_worker = None
+_in_process_worker_lock = threading.Lock()
+
+
+class InProcessDeliveryQueue(BaseDeliveryQueue):
+    """
+    Keeps queued signals in memory and delivers them in a single background thread of the current process
+
+    Failing receivers are retried up to max_retries times, waiting retry_delay seconds in between. Receivers that
+    still fail are logged and kept in dead_letters (the last 1000). Queued signals are lost if the process exits.
+    Set autostart to False to deliver them by calling process() yourself.
+    """
+    dead_letters = _in_process_dead_letters
+
+    def __init__(self, max_retries=3, retry_delay=1, autostart=True, *args, **kwargs):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.autostart = autostart
+
+    def enqueue(self, sender, instance, reset_password_token):
+        _in_process_queue.put((sender, instance, reset_password_token, None, 0))
+        if self.autostart:
+            self._ensure_worker()
+
+    def _ensure_worker(self):
+        global _in_process_worker
+
+        with _in_process_worker_lock:
+            if _in_process_worker is None or not _in_process_worker.is_alive():
+                _in_process_worker = threading.Thread(
+                    target=self._work, name='django-rest-passwordreset-delivery', daemon=True
+                )
+                _in_process_worker.start()
+
+    def _work(self):
+        while True:
+            item = _in_process_queue.get()
+            try:
+                self._deliver(item)
+            finally:
+                connections.close_all()
+                _in_process_queue.task_done()
+
+    def _deliver(self, item):
+        sender, instance, reset_password_token, receivers, attempts = item
+
+        wait = attempts and self.retry_delay
+        if wait:
+            time.sleep(wait)
+
+        failures = send_reset_password_token_created(sender, instance, reset_password_token, receivers=receivers)
+        if not failures:
+            return True
+
+        if attempts < self.max_retries:
+            # retry only the receivers that failed
+            _in_process_queue.put(
+                (sender, instance, reset_password_token, [receiver for receiver, _ in failures], attempts + 1)
+            )
+        else:
+            logger.error(
+                "Delivery of reset_password_token_created for user %s failed: %s",
+                reset_password_token.user_id, _describe_failures(failures),
+            )
+            self.dead_letters.append((sender, reset_password_token, failures))
+        return False
+
+    def process(self, limit=None):
+        delivered = failed = 0
+        while limit is None or delivered + failed < limit:
+            try:
+                item = _in_process_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if self._deliver(item):
+                    delivered += 1
+                else:
+                    failed += 1
+            finally:
+                _in_process_queue.task_done()
+        return delivered, failed
+
+
+class DatabaseDeliveryQueue(BaseDeliveryQueue):
+    """
+    Stores queued signals in the ResetPasswordTokenDelivery table; they are delivered by the
+    processresetpasswordtokendeliveries management command (or by calling process())
+
+    The table only stores the sender and the digest of the token key. The key itself is kept in the cache
+    ``cache_alias`` until the token expires, which has to be shared with the processes delivering the queue (not a
+    local-memory or dummy cache). The token is looked up again via the token backend on delivery (only if it is still
+    valid); signal receivers get ``instance=None``. A failing delivery, or one whose key is missing in the cache before
+    the token expired, is attempted again (for all receivers) after retry_delay seconds, doubling the delay on every
+    attempt. After max_attempts attempts it is logged and the row is kept with status "failed" as dead letter (see
+    replay()). Delivered rows and rows of tokens that were used or expired in the meantime are deleted. Rows are
+    claimed for lease seconds, so concurrent workers do not deliver the same row twice and rows of crashed workers are
+    picked up again.
+    """
+
+    def __init__(self, max_attempts=5, retry_delay=60, lease=300, cache_alias='default',
+                 key_prefix='django-rest-passwordreset-delivery', *args, **kwargs):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+
+        if isinstance(self.cache, (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                "DatabaseDeliveryQueue keeps the keys of the tokens in the cache {alias!r} until they are delivered by "
+                "another process, so it requires a cache shared by all processes; {backend} is not".format(
+                    alias=cache_alias, backend=type(self.cache).__name__,
+                )
+            )
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key_cache_key(self, token_digest):
+        return '{prefix}:{digest}'.format(prefix=self.key_prefix, digest=token_digest)
+
+    def enqueue(self, sender, instance, reset_password_token):
+        token_digest = ResetPasswordToken.get_key_digest(reset_password_token.key)
+
+        expires_at = reset_password_token.expires_at or timezone.now() + get_password_reset_token_expiry()
+        timeout = (expires_at - timezone.now()).total_seconds()
+        if timeout <= 0:
+            return
+        self.cache.set(self._key_cache_key(token_digest), reset_password_token.key, timeout)
+
+        ResetPasswordTokenDelivery.objects.create(
+            sender='{}.{}'.format(sender.__module__, sender.__qualname__),
+            token_digest=token_digest,
+            expires_at=expires_at,
+        )
+
+    def _claim(self, limit):
+        now = timezone.now()
+        with transaction.atomic():
+            deliveries = list(
+                ResetPasswordTokenDelivery.objects.select_for_update(skip_locked=True).filter(
+                    status=ResetPasswordTokenDelivery.STATUS_PENDING,
+                    next_attempt_at__lte=now,
+                ).order_by('next_attempt_at', 'pk')[:limit]
+            )
+            ResetPasswordTokenDelivery.objects.filter(pk__in=[delivery.pk for delivery in deliveries]).update(
+                next_attempt_at=now + timedelta(seconds=self.lease),
+            )
+        return deliveries
+
+    def _delete(self, delivery):
+        delivery.delete()
+        self.cache.delete(self._key_cache_key(delivery.token_digest))
+
+    def _deliver(self, delivery):
+        key = self.cache.get(self._key_cache_key(delivery.token_digest))
+        if key is None and delivery.expires_at > timezone.now():
+            # the key was evicted from (or never reached) the cache; the token can not be delivered
+            self._record_failure(delivery, "The key of the token is missing in the cache {alias!r}".format(
+                alias=self.cache_alias,
+            ))
+            return False
+
+        reset_password_token = None
+        if key is not None:
+            reset_password_token = password_reset_settings.TOKEN_BACKEND.get_valid_token(key)
+        if reset_password_token is None:
+            # the token was used or expired in the meantime, there is nothing to deliver anymore
+            self._delete(delivery)
+            return True
+
+        try:
+            sender = import_string(delivery.sender)
+        except ImportError as err:
+            self._record_failure(delivery, repr(err))
+            return False
+
+        failures = send_reset_password_token_created(sender, None, reset_password_token)
+        if failures:
+            self._record_failure(delivery, _describe_failures(failures))
+            return False
+
+        self._delete(delivery)
+        return True
+
+    def _record_failure(self, delivery, error):
+        delivery.attempts += 1
+        delivery.last_error = error
+        if delivery.attempts >= self.max_attempts:
+            logger.error(
+                "Delivery %s of reset_password_token_created failed for good: %s", delivery.pk, delivery.last_error
+            )
+            # the row is kept as dead letter; the key stays in the cache, so it can be replayed until the token expires
+            delivery.status = delivery.STATUS_FAILED
+        else:
+            delivery.next_attempt_at = timezone.now() + timedelta(
+                seconds=self.retry_delay * 2 ** (delivery.attempts - 1)
+            )
+        delivery.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+    @classmethod
+    def replay(cls, deliveries=None):
+        """
+        Queues failed deliveries (dead letters) again, e.g. once the failing receiver was fixed; they are delivered by
+        the next run of process(), with max_attempts attempts. Deliveries of tokens that are no longer valid are
+        dropped then.
+        :param deliveries: QuerySet of ResetPasswordTokenDelivery (Default: all deliveries)
+        :return: number of deliveries queued again
+        """
+        if deliveries is None:
+            deliveries = ResetPasswordTokenDelivery.objects.all()
+        return deliveries.filter(status=ResetPasswordTokenDelivery.STATUS_FAILED).update(
+            status=ResetPasswordTokenDelivery.STATUS_PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+
+    def process(self, limit=None):
+        delivered = failed = 0
+        batch_size = 100
+
+        while limit is None or delivered + failed < limit:
+            claim = batch_size if limit is None else min(batch_size, limit - delivered - failed)
+            deliveries = self._claim(claim)
+            if not deliveries:
+                break
+
+            for delivery in deliveries:
+                if self._deliver(delivery):
+                    delivered += 1
+                else:
+                    failed += 1
+
+        return delivered, failed
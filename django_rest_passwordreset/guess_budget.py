@@ -0,0 +1,161 @@
+import time
+
+from django.core.cache import caches
+from django.http import Http404
+from django.utils.module_loading import import_string
+from rest_framework import exceptions
+from rest_framework.throttling import BaseThrottle
+
+from django_rest_passwordreset.models import get_password_reset_token_expiry_time
+from django_rest_passwordreset.settings import password_reset_settings
+
+__all__ = [
+    'GuessBudget',
+    'GuessBudgetMixin',
+    'get_guess_budget',
+]
+
+
+def get_guess_budget():
+    """
+    Returns the guess budget of the validate-token and confirm endpoints based on the configuration in
+    DJANGO_REST_PASSWORDRESET_GUESS_BUDGET.CLASS and DJANGO_REST_PASSWORDRESET_GUESS_BUDGET.OPTIONS
+    :return: guess budget instance, or None if the setting is not set (Default)
+    """
+    budget_config = password_reset_settings.GUESS_BUDGET_CONFIG
+    if budget_config is None:
+        return None
+
+    budget_class = GuessBudget
+    options = {}
+
+    if "CLASS" in budget_config:
+        budget_class = budget_config["CLASS"]
+        if isinstance(budget_class, str):
+            budget_class = import_string(budget_class)
+
+    if "OPTIONS" in budget_config:
+        options = budget_config["OPTIONS"]
+
+    return budget_class(**options)
+
+
+class GuessBudget:
+    """
+    Limits the number of failed token guesses (requests to the validate-token and confirm endpoints that end with
+    HTTP 404)
+
+    * Per client IP address: after ``max_failures`` failed guesses, the client is locked out for ``lockout`` seconds,
+      doubled with every further lockout up to ``max_lockout`` seconds. Checking a lockout costs one cache read, so
+      the guesses of a locked out client do not reach the token backend.
+    * Per outstanding token (optional): the failed guesses of each client are counted per hour as well. A token that
+      is presented by a client which failed more than ``token_max_failures`` guesses since the token was created is
+      deleted, so the user has to request a new one. This bounds the chance of a client guessing a token from a small
+      key space (e.g., RandomNumberTokenGenerator) across several lockouts. Failed guesses of other clients do not
+      affect the token, so an attacker can not invalidate the tokens of other users.
+
+    Counters are incremented with the atomic cache.incr; use a cache that is shared between your workers.
+    """
+    timer = time.time
+
+    def __init__(self, cache_alias='default', max_failures=5, lockout=60, max_lockout=24 * 60 * 60,
+                 token_max_failures=None, key_prefix='django-rest-passwordreset-guesses', *args, **kwargs):
+        self.cache_alias = cache_alias
+        self.max_failures = max_failures
+        self.lockout = lockout
+        self.max_lockout = max_lockout
+        self.token_max_failures = token_max_failures
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def get_ident(self, request):
+        """ identifies the client by its IP address (see BaseThrottle.get_ident, which honors NUM_PROXIES) """
+        return BaseThrottle().get_ident(request)
+
+    def _cache_key(self, kind, value):
+        return '{prefix}:{kind}:{value}'.format(prefix=self.key_prefix, kind=kind, value=value)
+
+    def _hour(self, timestamp):
+        return int(timestamp // 3600)
+
+    def _incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # the counter expired between add and incr
+            self.cache.add(key, 0, timeout)
+            return self.cache.incr(key)
+
+    def check(self, ident):
+        """
+        :raises Throttled: if the client is locked out
+        """
+        locked_until = self.cache.get(self._cache_key('locked', ident))
+        if locked_until is not None:
+            wait = locked_until - self.timer()
+            if wait > 0:
+                raise exceptions.Throttled(wait)
+
+    def _hour_cache_key(self, ident, hour):
+        return self._cache_key('hour', '{ident}:{hour}'.format(ident=ident, hour=hour))
+
+    def record_failure(self, ident):
+        """
+        Counts a failed guess of the client; locks the client out once it used up its budget
+        """
+        now = self.timer()
+
+        if self.token_max_failures is not None:
+            # failed guesses of the client per hour (see check_token)
+            self._incr(
+                self._hour_cache_key(ident, self._hour(now)),
+                get_password_reset_token_expiry_time() * 60 * 60 + 60 * 60,
+            )
+
+        failures_key = self._cache_key('failures', ident)
+        if self._incr(failures_key, self.max_lockout) < self.max_failures:
+            return
+
+        # the budget is used up: lock the client out (exponential backoff) and start a new budget
+        lockouts = self._incr(self._cache_key('lockouts', ident), self.max_lockout * 2)
+        lockout = min(self.lockout * 2 ** (lockouts - 1), self.max_lockout)
+        self.cache.set(self._cache_key('locked', ident), now + lockout, lockout)
+        self.cache.delete(failures_key)
+
+    def check_token(self, created_at, ident):
+        """
+        Checks that the client presenting a token created at created_at did not fail more than token_max_failures
+        guesses since then (counted per hour, including the hour the token was created in)
+        :return: False if the token must not be used anymore
+        """
+        if self.token_max_failures is None:
+            return True
+
+        hours = range(self._hour(created_at.timestamp()), self._hour(self.timer()) + 1)
+        failures = self.cache.get_many([self._hour_cache_key(ident, hour) for hour in hours])
+        return sum(failures.values()) <= self.token_max_failures
+
+
+class GuessBudgetMixin:
+    """
+    Enforces DJANGO_REST_PASSWORDRESET_GUESS_BUDGET for a rest_framework view: locked out clients are rejected before
+    the view runs (HTTP 429), and every HTTP 404 response counts as a failed guess
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        guess_budget = password_reset_settings.GUESS_BUDGET
+        if guess_budget is not None:
+            guess_budget.check(guess_budget.get_ident(request))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Http404):
+            guess_budget = password_reset_settings.GUESS_BUDGET
+            if guess_budget is not None:
+                guess_budget.record_failure(guess_budget.get_ident(self.request))
+        return super().handle_exception(exc)
@@ -0,0 +1,31 @@
+from django.contrib.auth.hashers import make_password
+
+from django_rest_passwordreset.settings import password_reset_settings
+
+__all__ = [
+    'get_password_hashing_executor',
+    'hash_password',
+]
+
+
+def get_password_hashing_executor():
+    """
+    Returns the process wide thread pool that hashes new passwords, bounded by
+    DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS
+    :return: ThreadPoolExecutor, or None if the setting is not set (Default: passwords are hashed in the request thread)
+    """
+    return password_reset_settings.PASSWORD_HASHING_EXECUTOR
+
+
+def hash_password(password):
+    """
+    Hashes the password with make_password, in the password hashing thread pool if it is enabled. Hashing is CPU bound
+    (and releases the GIL for the built-in hashers), so the pool limits the number of passwords hashed at the same time
+    in this process; further requests wait for a free worker. Call it outside of transactions, so waiting for a worker
+    does not hold locks or a database connection
+    :return: the encoded password, as stored in user.password
+    """
+    executor = get_password_hashing_executor()
+    if executor is None:
+        return make_password(password)
+    return executor.submit(make_password, password).result()
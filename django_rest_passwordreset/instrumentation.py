@@ -0,0 +1,329 @@
+import contextvars
+import logging
+import threading
+import time
+import weakref
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+from django.utils.inspect import func_accepts_kwargs
+from django.utils.module_loading import import_string
+
+from django_rest_passwordreset.settings import password_reset_settings
+
+__all__ = [
+    'BaseMetricsSink',
+    'LoggingMetricsSink',
+    'InMemoryMetricsSink',
+    'InstrumentedSignal',
+    'get_metrics_sink',
+    'measure',
+]
+
+
+def get_metrics_sink():
+    """
+    Returns the sink that receives the duration and the number of queries of every phase of the reset operations
+    based on the configuration in DJANGO_REST_PASSWORDRESET_METRICS_SINK.CLASS and
+    DJANGO_REST_PASSWORDRESET_METRICS_SINK.OPTIONS
+    :return: metrics sink instance, or None if the setting is not set (Default: nothing is measured)
+    """
+    sink_config = password_reset_settings.METRICS_SINK_CONFIG
+    if sink_config is None:
+        return None
+
+    sink_class = LoggingMetricsSink
+    options = {}
+
+    if "CLASS" in sink_config:
+        sink_class = sink_config["CLASS"]
+        if isinstance(sink_class, str):
+            sink_class = import_string(sink_class)
+
+    if "OPTIONS" in sink_config:
+        options = sink_config["OPTIONS"]
+
+    return sink_class(**options)
+
+
+class _Measurement:
+    """ the queries and the duration of the nested phases of a phase that is being measured """
+
+    def __init__(self):
+        self.queries = 0
+        self.nested_duration = 0.0
+
+
+# the innermost phase that is being measured
+_current_measurement = contextvars.ContextVar('django_rest_passwordreset_measurement', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    """ execute wrapper (see django.db.backends.base.base.BaseDatabaseWrapper.execute_wrapper) counting queries """
+    measurement = _current_measurement.get()
+    if measurement is not None:
+        measurement.queries += 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def measure(operation, phase, **labels):
+    """
+    Measures the duration and the number of database queries (of all database aliases, in the current thread) of the
+    block and records them in the configured metrics sink; does nothing if no sink is configured. The time and the
+    queries of nested phases are only recorded for the nested phase, so the totals of all phases add up.
+    """
+    sink = password_reset_settings.METRICS_SINK
+    if sink is None:
+        yield
+        return
+
+    parent = _current_measurement.get()
+    measurement = _Measurement()
+    token = _current_measurement.set(measurement)
+    with ExitStack() as stack:
+        if parent is None:
+            # the queries are counted for the innermost phase
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(_count_query))
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started_at
+            _current_measurement.reset(token)
+            if parent is not None:
+                parent.nested_duration += duration
+            sink.record(operation, phase, duration - measurement.nested_duration, measurement.queries, **labels)
+
+
+def _get_receiver_name(receiver):
+    return '{}.{}'.format(getattr(receiver, '__module__', None), getattr(receiver, '__qualname__', repr(receiver)))
+
+
+def _get_receiver_uid(receiver):
+    # like the lookup key of django.dispatch for receivers connected without dispatch_uid
+    if hasattr(receiver, '__self__') and hasattr(receiver, '__func__'):
+        return ('django_rest_passwordreset.timed_receiver', id(receiver.__self__), id(receiver.__func__))
+    return ('django_rest_passwordreset.timed_receiver', id(receiver))
+
+
+# the wrappers of weakly connected receivers, by the id of the receiver (or of the instance of a bound method), so
+# unhashable instances (e.g., unsaved model instances) and instances that compare equal each keep their own wrappers;
+# a finalizer removes the wrappers when their owner is garbage collected, so a wrapper lives exactly as long as its
+# receiver
+_timed_receivers = {}
+_timed_receivers_lock = threading.Lock()
+
+
+def _keep_timed_receiver(owner, key, timed_receiver):
+    owner_id = id(owner)
+    with _timed_receivers_lock:
+        if owner_id not in _timed_receivers:
+            _timed_receivers[owner_id] = {}
+            weakref.finalize(owner, _timed_receivers.pop, owner_id, None)
+        _timed_receivers[owner_id][key] = timed_receiver
+
+
+class _TimedReceiver:
+    """ calls a signal receiver within measure(), so its time is attributed to the receiver """
+
+    def __init__(self, receiver, signal_name, weak=False):
+        self.name = _get_receiver_name(receiver)
+        self.signal_name = signal_name
+        # django.dispatch logs the failures of send_robust() with the name of the receiver
+        self.__qualname__ = getattr(receiver, '__qualname__', repr(receiver))
+        self.__module__ = getattr(receiver, '__module__', None)
+        self.weak = weak
+        if not weak:
+            self._receiver = receiver
+        elif hasattr(receiver, '__self__') and hasattr(receiver, '__func__'):
+            self._receiver = weakref.WeakMethod(receiver)
+        else:
+            self._receiver = weakref.ref(receiver)
+
+    @property
+    def receiver(self):
+        return self._receiver() if self.weak else self._receiver
+
+    def __call__(self, *args, **kwargs):
+        receiver = self.receiver
+        if password_reset_settings.METRICS_SINK is None:
+            return receiver(*args, **kwargs)
+        with measure('signal', self.signal_name, receiver=self.name):
+            return receiver(*args, **kwargs)
+
+
+class _AsyncTimedReceiver(_TimedReceiver):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # send() and asend() tell async receivers apart with asgiref's iscoroutinefunction
+        markcoroutinefunction(self)
+
+    async def __call__(self, *args, **kwargs):
+        receiver = self.receiver
+        if password_reset_settings.METRICS_SINK is None:
+            return await receiver(*args, **kwargs)
+        # queries of async receivers run in other threads and may not be counted
+        with measure('signal', self.signal_name, receiver=self.name):
+            return await receiver(*args, **kwargs)
+
+
+def _unwrap_responses(responses):
+    return [
+        (receiver.receiver if isinstance(receiver, _TimedReceiver) else receiver, response)
+        for receiver, response in responses
+    ]
+
+
+class InstrumentedSignal(Signal):
+    """
+    Signal that measures every receiver separately (see measure()) if a metrics sink is configured; the measurements
+    are recorded as operation "signal", with the name of the signal as phase and the receiver as label
+
+    Receivers are connected wrapped by _TimedReceiver, so the public send(), send_robust(), asend() and asend_robust()
+    of django.dispatch call the wrappers; the responses contain the receivers that were connected.
+    """
+
+    def __init__(self, name=None, use_caching=False):
+        super().__init__(use_caching=use_caching)
+        self.name = name
+
+    def connect(self, receiver, sender=None, weak=True, dispatch_uid=None):
+        if settings.configured and settings.DEBUG and not func_accepts_kwargs(receiver):
+            raise ValueError("Signal receivers must accept keyword arguments (**kwargs).")
+
+        timed_receiver_class = _AsyncTimedReceiver if iscoroutinefunction(receiver) else _TimedReceiver
+        timed_receiver = timed_receiver_class(receiver, self.name, weak=weak)
+        if dispatch_uid is None:
+            dispatch_uid = _get_receiver_uid(receiver)
+
+        if weak:
+            owner = getattr(receiver, '__self__', receiver) if hasattr(receiver, '__func__') else receiver
+            _keep_timed_receiver(owner, (id(self), dispatch_uid, id(sender)), timed_receiver)
+
+        super().connect(timed_receiver, sender=sender, weak=weak, dispatch_uid=dispatch_uid)
+
+    def disconnect(self, receiver=None, sender=None, dispatch_uid=None):
+        if dispatch_uid is None:
+            dispatch_uid = _get_receiver_uid(receiver)
+        return super().disconnect(sender=sender, dispatch_uid=dispatch_uid)
+
+    def call_receiver(self, receiver, sender, **named):
+        """ calls a single receiver of the signal (measured like the receivers called by send()) """
+        return _TimedReceiver(receiver, self.name)(signal=self, sender=sender, **named)
+
+    def send(self, sender, **named):
+        return _unwrap_responses(super().send(sender, **named))
+
+    def send_robust(self, sender, **named):
+        return _unwrap_responses(super().send_robust(sender, **named))
+
+    async def asend(self, sender, **named):
+        return _unwrap_responses(await super().asend(sender, **named))
+
+    async def asend_robust(self, sender, **named):
+        return _unwrap_responses(await super().asend_robust(sender, **named))
+
+
+class BaseMetricsSink:
+    """
+    Base Class for the sinks of the measurements of the reset operations
+
+    - Can take arbitrary args/kwargs and work with those
+    - Needs to implement the "record" Method, which is called with the operation (e.g., "request_token"), the phase
+      (e.g., "create_token"), the duration in seconds, the number of queries and further labels (e.g., the receiver
+      of a signal)
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def record(self, operation, phase, duration, queries, **labels):
+        raise NotImplementedError
+
+
+class LoggingMetricsSink(BaseMetricsSink):
+    """
+    Logs every measurement to the given logger (Default: django_rest_passwordreset.metrics, on level DEBUG)
+    """
+
+    def __init__(self, logger='django_rest_passwordreset.metrics', level=logging.DEBUG, *args, **kwargs):
+        self.logger = logging.getLogger(logger)
+        self.level = level
+
+    def record(self, operation, phase, duration, queries, **labels):
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        self.logger.log(
+            self.level, "%s %s took %.2fms and %d queries%s",
+            operation, phase, duration * 1000, queries,
+            "".join(" {}={}".format(key, value) for key, value in sorted(labels.items())),
+        )
+
+
+# state of InMemoryMetricsSink, shared by all of its instances within the process
+_in_memory_samples = {}
+_in_memory_lock = threading.Lock()
+
+
+class InMemoryMetricsSink(BaseMetricsSink):
+    """
+    Counts the calls, the total duration and the total number of queries of every phase in memory, like Prometheus
+    counters. The counters are shared by all instances within the process; render() returns them in the Prometheus
+    text exposition format, e.g. to be served by a metrics view of the project.
+    """
+    prefix = 'django_rest_passwordreset_phase'
+
+    def __init__(self, prefix=None, *args, **kwargs):
+        if prefix is not None:
+            self.prefix = prefix
+
+    def record(self, operation, phase, duration, queries, **labels):
+        key = (operation, phase, tuple(sorted(labels.items())))
+        with _in_memory_lock:
+            calls, seconds, total_queries = _in_memory_samples.get(key, (0, 0.0, 0))
+            _in_memory_samples[key] = (calls + 1, seconds + duration, total_queries + queries)
+
+    def get(self, operation, phase, **labels):
+        """
+        :return: tuple (calls, total duration in seconds, total number of queries) of the phase
+        """
+        with _in_memory_lock:
+            return _in_memory_samples.get((operation, phase, tuple(sorted(labels.items()))), (0, 0.0, 0))
+
+    def reset(self):
+        with _in_memory_lock:
+            _in_memory_samples.clear()
+
+    def render(self):
+        """
+        :return: the counters in the Prometheus text exposition format
+        """
+        with _in_memory_lock:
+            samples = sorted(_in_memory_samples.items())
+
+        lines = []
+        for suffix, index, description in (
+            ('calls_total', 0, "Number of measured phases of the password reset operations"),
+            ('seconds_total', 1, "Time spent in the phases of the password reset operations"),
+            ('queries_total', 2, "Database queries of the phases of the password reset operations"),
+        ):
+            name = '{}_{}'.format(self.prefix, suffix)
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} counter'.format(name))
+            for (operation, phase, labels), values in samples:
+                lines.append('{}{{{}}} {}'.format(name, ','.join(
+                    '{}="{}"'.format(key, _escape_label_value(value))
+                    for key, value in (('operation', operation), ('phase', phase)) + labels
+                ), values[index]))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
@@ -0,0 +1,93 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+import sys
+
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.views import clear_expired_tokens_if_due, generate_tokens_for_emails
+
+
+class Command(BaseCommand):
+    help = "Requests password reset tokens for the e-mail addresses in a file (one per line, '-' reads from stdin) " \
+           "and sends the reset_password_tokens_created (or reset_password_token_created) signal"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            help="File with one e-mail address per line, or '-' to read from stdin",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Number of e-mail addresses that are looked up and issued tokens at once",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be greater or equal to 1")
+
+        if options['file'] == '-':
+            self.process(sys.stdin, batch_size)
+            return
+
+        try:
+            with open(options['file'], encoding='utf-8') as lines:
+                self.process(lines, batch_size)
+        except OSError as e:
+            raise CommandError(e)
+
+    def process(self, lines, batch_size):
+        clear_expired_tokens_if_due()
+
+        issued = not_found = invalid = 0
+        batch = []
+
+        for line in lines:
+            email = line.strip()
+            if not email:
+                continue
+
+            try:
+                validate_email(email)
+            except ValidationError:
+                invalid += 1
+                self.stderr.write("Skipping invalid e-mail address {email!r}".format(email=email))
+                continue
+
+            batch.append(email)
+            if len(batch) >= batch_size:
+                batch_issued, batch_not_found = self.process_batch(batch)
+                issued += batch_issued
+                not_found += batch_not_found
+                batch = []
+
+        if batch:
+            batch_issued, batch_not_found = self.process_batch(batch)
+            issued += batch_issued
+            not_found += batch_not_found
+
+        self.stdout.write("Issued {issued} tokens, {not_found} e-mail addresses not found, {invalid} invalid".format(
+            issued=issued, not_found=not_found, invalid=invalid,
+        ))
+
+    def process_batch(self, emails):
+        """
+        Issues the tokens for a batch of e-mail addresses and dispatches them
+        :return: tuple of the number of issued tokens and the number of e-mail addresses without a user
+        """
+        tokens = generate_tokens_for_emails(emails)
+
+        unique_tokens = list({token.key: token for token in tokens.values()}.values())
+        if unique_tokens:
+            password_reset_settings.DISPATCHER.dispatch_many(
+                sender=self.__class__,
+                instance=None, reset_password_tokens=unique_tokens
+            )
+
+        missing = [email for email in dict.fromkeys(emails) if email not in tokens]
+        if self.verbosity > 1:
+            for email in missing:
+                self.stdout.write("No user found for {email}".format(email=email))
+
+        return len(unique_tokens), len(missing)
@@ -1,14 +1,74 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-import datetime
+import time
 
-from django_rest_passwordreset.models import clear_expired, get_password_reset_token_expiry_time
+from django_rest_passwordreset.backends import PartitionedModelTokenBackend
+from django_rest_passwordreset.models import ResetPasswordToken, clear_expired, get_password_reset_token_expiry
+from django_rest_passwordreset.partitioning import get_expired_partitions
+from django_rest_passwordreset.settings import password_reset_settings
 
 
 class Command(BaseCommand):
     help = "Can be run as a cronjob or directly to clean out expired tokens"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Delete expired tokens in batches of this many rows instead of a single DELETE",
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help="Seconds to sleep between two batches (requires --batch-size)",
+        )
+        parser.add_argument(
+            '--max-runtime', type=float, default=None,
+            help="Stop after the batch that exceeded this many seconds (requires --batch-size); "
+                 "run the command again to continue",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report how many expired tokens would be deleted",
+        )
+
     def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size is not None and batch_size < 1:
+            raise CommandError("--batch-size must be greater or equal to 1")
+        if not batch_size and (options['sleep'] or options['max_runtime'] is not None):
+            raise CommandError("--sleep and --max-runtime require --batch-size")
+
         # datetime.now minus expiry hours
-        now_minus_expiry_time = timezone.now() - datetime.timedelta(hours=get_password_reset_token_expiry_time())
-        clear_expired(now_minus_expiry_time)
+        now = timezone.now()
+        now_minus_expiry_time = now - get_password_reset_token_expiry()
+
+        backend = password_reset_settings.TOKEN_BACKEND
+        partitioned = isinstance(backend, PartitionedModelTokenBackend)
+
+        if options['dry_run']:
+            if partitioned:
+                self.stdout.write("{count} expired partitions would be dropped".format(
+                    count=len(get_expired_partitions(now_minus_expiry_time, backend.interval)),
+                ))
+            count = ResetPasswordToken.objects.expired(now).count()
+            self.stdout.write("{count} expired tokens would be deleted".format(count=count))
+            return
+
+        if partitioned:
+            # dropping a partition is cheaper than deleting its rows, the remaining rows are deleted below
+            dropped = backend.drop_expired_partitions(now_minus_expiry_time)
+            self.stdout.write("Dropped {count} expired partitions".format(count=len(dropped)))
+
+        started = time.monotonic()
+        deleted = clear_expired(
+            now_minus_expiry_time,
+            batch_size=batch_size,
+            sleep=options['sleep'],
+            max_runtime=options['max_runtime'],
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write("Deleted {deleted} expired tokens in {elapsed:.2f}s ({rate:.0f} rows/s)".format(
+            deleted=deleted,
+            elapsed=elapsed,
+            rate=deleted / elapsed if elapsed else deleted,
+        ))
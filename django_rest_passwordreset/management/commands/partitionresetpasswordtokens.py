@@ -0,0 +1,45 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from django_rest_passwordreset.backends import PartitionedModelTokenBackend
+from django_rest_passwordreset.partitioning import convert_to_partitioned_table, create_partitions, is_partitioned
+from django_rest_passwordreset.settings import password_reset_settings
+
+
+class Command(BaseCommand):
+    help = "Creates the partitions of the (PostgreSQL) token table for the next intervals, can be run as a cronjob; " \
+           "requires the PartitionedModelTokenBackend"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead', type=int, default=None,
+            help="Number of partitions to create ahead of the current one (Default: the ahead option of the backend)",
+        )
+        parser.add_argument(
+            '--convert', action='store_true',
+            help="Convert the token table to a partitioned table first (locks the table while the tokens are copied)",
+        )
+
+    def handle(self, *args, **options):
+        backend = password_reset_settings.TOKEN_BACKEND
+        if not isinstance(backend, PartitionedModelTokenBackend):
+            raise CommandError("DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND must be the PartitionedModelTokenBackend")
+
+        ahead = backend.ahead if options['ahead'] is None else options['ahead']
+        if ahead < 0:
+            raise CommandError("--ahead must be greater or equal to 0")
+
+        try:
+            if options['convert']:
+                created = convert_to_partitioned_table(interval=backend.interval, ahead=ahead)
+                self.stdout.write("Converted the token table to a partitioned table")
+            elif not is_partitioned():
+                raise CommandError("The token table is not partitioned, run the command with --convert first")
+            else:
+                created = create_partitions(interval=backend.interval, ahead=ahead)
+        except ImproperlyConfigured as err:
+            raise CommandError(str(err))
+
+        self.stdout.write("Created {count} partitions".format(count=len(created)))
+        for name in created:
+            self.stdout.write("  {name}".format(name=name))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+import time
+
+from django_rest_passwordreset.dispatch import DatabaseDeliveryQueue
+from django_rest_passwordreset.settings import password_reset_settings
+
+
+class Command(BaseCommand):
+    help = "Delivers the reset_password_token_created signals queued by DatabaseDeliveryQueue; can be run as a " \
+           "cronjob or as a long running worker with --interval"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help="Deliver at most this many queued signals per run",
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help="Keep running and poll the queue every this many seconds",
+        )
+        parser.add_argument(
+            '--replay-failed', action='store_true',
+            help="Queue the deliveries that failed for good (dead letters) again before delivering",
+        )
+
+    def handle(self, *args, **options):
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError("--limit must be greater or equal to 1")
+
+        delivery_queue = DatabaseDeliveryQueue(**self.get_queue_options())
+
+        if options['replay_failed']:
+            self.stdout.write("Replaying {count} failed deliveries".format(count=delivery_queue.replay()))
+
+        while True:
+            delivered, failed = delivery_queue.process(limit=options['limit'])
+            if delivered or failed or options['interval'] is None:
+                self.stdout.write("Delivered {delivered}, failed {failed}".format(delivered=delivered, failed=failed))
+
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def get_queue_options(self):
+        """ returns the options of the DatabaseDeliveryQueue configured in DJANGO_REST_PASSWORDRESET_DISPATCHER """
+        dispatcher_config = password_reset_settings.DISPATCHER_CONFIG or {}
+        queue_config = dispatcher_config.get("OPTIONS", {}).get("queue") or {}
+        return queue_config.get("OPTIONS", {})
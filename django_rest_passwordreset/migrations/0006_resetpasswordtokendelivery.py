@@ -0,0 +1,33 @@
+# Generated for django-rest-passwordreset: queue table for DatabaseDeliveryQueue
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rest_passwordreset', '0005_resetpasswordtoken_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResetPasswordTokenDelivery',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('sender', models.CharField(max_length=255, verbose_name='Dotted path of the class that sent the signal')),
+                ('token_digest', models.CharField(max_length=64, verbose_name='SHA-256 digest of the key of the password reset token')),
+                ('expires_at', models.DateTimeField(verbose_name='When does the token expire')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=16, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Number of delivery attempts')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Last delivery error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='When was this delivery queued')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='When should the next delivery attempt be made')),
+            ],
+            options={
+                'verbose_name': 'Password Reset Token Delivery',
+                'verbose_name_plural': 'Password Reset Token Deliveries',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='drpr_delivery_next_attempt_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated for django-rest-passwordreset: look up tokens by the fixed-width SHA-256 digest of their key instead of
+# the (variable-length) key, so the key itself does not have to be stored (see DJANGO_REST_PASSWORDRESET_HASHED_TOKENS).
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def populate_key_digest(apps, schema_editor):
+    ResetPasswordToken = apps.get_model('django_rest_passwordreset', 'ResetPasswordToken')
+
+    batch = []
+    for token in ResetPasswordToken.objects.only('pk', 'key').order_by('pk').iterator(chunk_size=1000):
+        token.key_digest = hashlib.sha256(str(token.key).encode()).hexdigest()
+        batch.append(token)
+        if len(batch) >= 1000:
+            ResetPasswordToken.objects.bulk_update(batch, ['key_digest'])
+            batch = []
+
+    if batch:
+        ResetPasswordToken.objects.bulk_update(batch, ['key_digest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rest_passwordreset', '0006_resetpasswordtokendelivery'),
+    ]
+
+    operations = [
+        # add the digest column (without the unique constraint) and fill it
+        migrations.AddField(
+            model_name='resetpasswordtoken',
+            name='key_digest',
+            field=models.CharField(max_length=64, null=True, editable=False, verbose_name='SHA-256 digest of the key'),
+        ),
+        migrations.RunPython(
+            populate_key_digest,
+            migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name='resetpasswordtoken',
+            name='key_digest',
+            field=models.CharField(max_length=64, unique=True, editable=False, verbose_name='SHA-256 digest of the key'),
+        ),
+        # the key is not used for lookups anymore
+        migrations.AlterField(
+            model_name='resetpasswordtoken',
+            name='key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Key'),
+        ),
+    ]
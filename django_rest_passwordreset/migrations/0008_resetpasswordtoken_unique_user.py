@@ -0,0 +1,22 @@
+# Generated for django-rest-passwordreset: optional database constraint allowing only one token per user
+# (see DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER)
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rest_passwordreset', '0007_resetpasswordtoken_key_digest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resetpasswordtoken',
+            name='unique_user',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='The User if this must be the only password reset token of the user'),
+        ),
+    ]
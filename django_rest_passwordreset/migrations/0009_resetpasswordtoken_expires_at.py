@@ -0,0 +1,40 @@
+# Generated for django-rest-passwordreset: store the expiry date of every token, so expired tokens can be filtered in
+# SQL (see ResetPasswordTokenQuerySet)
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_expires_at(apps, schema_editor):
+    ResetPasswordToken = apps.get_model('django_rest_passwordreset', 'ResetPasswordToken')
+    expiry_time = getattr(settings, 'DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME', 24)
+    ResetPasswordToken.objects.using(schema_editor.connection.alias).update(
+        expires_at=models.F('created_at') + timedelta(hours=expiry_time)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rest_passwordreset', '0008_resetpasswordtoken_unique_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resetpasswordtoken',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='When does this token expire'),
+        ),
+        migrations.RunPython(set_expires_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='resetpasswordtoken',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, verbose_name='When does this token expire'),
+        ),
+        migrations.AddIndex(
+            model_name='resetpasswordtoken',
+            index=models.Index(fields=['expires_at'], name='drpr_token_expires_at_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated for django-rest-passwordreset: optional maximum number of uses of a token (see
+# DJANGO_REST_PASSWORDRESET_TOKEN_POLICY)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rest_passwordreset', '0009_resetpasswordtoken_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resetpasswordtoken',
+            name='remaining_uses',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='How often can this token still be used'),
+        ),
+    ]
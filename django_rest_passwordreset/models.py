@@ -1,9 +1,18 @@
+import hashlib
+import time
+
 from django.conf import settings
+from django.core.signals import setting_changed
 from django.db import models
+from django.db.models.deletion import Collector
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
 
-from django_rest_passwordreset.tokens import get_token_generator
+from django_rest_passwordreset.settings import password_reset_settings
 
 # Prior to Django 1.5, the AUTH_USER_MODEL setting does not exist.
 # Note that we don't perform this code in the compat module due to
@@ -12,31 +21,64 @@ from django_rest_passwordreset.tokens import get_token_generator
 
 AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
-# get the token generator class
-TOKEN_GENERATOR_CLASS = get_token_generator()
-
 __all__ = [
     'ResetPasswordToken',
+    'ResetPasswordTokenQuerySet',
+    'ResetPasswordTokenDelivery',
     'get_password_reset_token_expiry_time',
+    'get_password_reset_token_expiry',
+    'get_password_reset_hashed_tokens',
+    'get_password_reset_one_token_per_user',
     'get_password_reset_lookup_field',
     'clear_expired',
+    'filter_eligible_for_reset',
 ]
 
 
+class ResetPasswordTokenQuerySet(models.QuerySet):
+    """ QuerySet of ResetPasswordToken that filters tokens by their (stored) expiry date in SQL """
+
+    def valid(self, now=None):
+        """ tokens that have not expired at now (default: the current time) and were not used up """
+        return self.filter(expires_at__gt=now or timezone.now()).exclude(remaining_uses=0)
+
+    def expired(self, now=None):
+        """ tokens that have expired at now (default: the current time) """
+        return self.filter(expires_at__lte=now or timezone.now())
+
+    def invalid(self, now=None):
+        """ tokens that have expired at now (default: the current time) or were used up """
+        return self.filter(models.Q(expires_at__lte=now or timezone.now()) | models.Q(remaining_uses=0))
+
+
 class ResetPasswordToken(models.Model):
     class Meta:
         verbose_name = _("Password Reset Token")
         verbose_name_plural = _("Password Reset Tokens")
-        # Speeds up `clear_expired` (a `created_at__lte` range scan + bulk delete) used by the
-        # `clearresetpasswodtokens` management command and the request-token endpoint cleanup.
         indexes = [
+            # created_at is the partition key of the partitioned token table (see partitioning.py)
             models.Index(fields=["created_at"], name="drpr_token_created_at_idx"),
+            # Speeds up `clear_expired` (an `expires_at__lte` range scan + bulk delete) used by the
+            # `clearresetpasswodtokens` management command and the request-token endpoint cleanup.
+            models.Index(fields=["expires_at"], name="drpr_token_expires_at_idx"),
         ]
 
+    objects = ResetPasswordTokenQuerySet.as_manager()
+
     @staticmethod
     def generate_key():
-        """ generates a pseudo random code using os.urandom and binascii.hexlify """
-        return TOKEN_GENERATOR_CLASS.generate_token()
+        """ generates a random key using the configured token generator """
+        return password_reset_settings.TOKEN_GENERATOR.generate_token()
+
+    @staticmethod
+    def generate_keys(n):
+        """ generates n random keys at once using the configured token generator """
+        return password_reset_settings.TOKEN_GENERATOR.generate_tokens(n)
+
+    @staticmethod
+    def get_key_digest(key):
+        """ returns the SHA-256 digest of the key (64 hex characters), used to look up tokens """
+        return hashlib.sha256(str(key).encode()).hexdigest()
 
     id = models.AutoField(
         primary_key=True
@@ -54,12 +96,47 @@ class ResetPasswordToken(models.Model):
         verbose_name=_("When was this token generated")
     )
 
-    # Key field, though it is not the primary key of the model
+    # computed when the token is created (see save()), so lookups and the cleanup can filter expired tokens in SQL
+    expires_at = models.DateTimeField(
+        editable=False,
+        verbose_name=_("When does this token expire")
+    )
+
+    # how often the token can still be presented to the confirm endpoint (see
+    # DJANGO_REST_PASSWORDRESET_TOKEN_POLICY), NULL if it can be used any number of times
+    remaining_uses = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("How often can this token still be used")
+    )
+
+    # set to the user if DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER is set, so the database allows only one such
+    # token per user (NULL values do not conflict)
+    unique_user = models.OneToOneField(
+        AUTH_USER_MODEL,
+        related_name='+',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("The User if this must be the only password reset token of the user")
+    )
+
+    # Key field, though it is not the primary key of the model; empty if DJANGO_REST_PASSWORDRESET_HASHED_TOKENS is set
     key = models.CharField(
         _("Key"),
         max_length=64,
-        db_index=True,
-        unique=True
+        null=True,
+        blank=True,
+    )
+
+    # fixed-width digest of the key, tokens are looked up by it
+    key_digest = models.CharField(
+        _("SHA-256 digest of the key"),
+        max_length=64,
+        unique=True,
+        editable=False,
     )
 
     ip_address = models.GenericIPAddressField(
@@ -76,15 +153,110 @@ class ResetPasswordToken(models.Model):
         blank=True,
     )
 
+    def is_expired(self, now=None):
+        """ returns whether the token has expired at now (default: the current time) """
+        return self.expires_at <= (now or timezone.now())
+
+    def is_used_up(self):
+        """ returns whether the token can not be used anymore (see remaining_uses) """
+        return self.remaining_uses == 0
+
     def save(self, *args, **kwargs):
-        if not self.key:
+        if self.expires_at is None:
+            self.expires_at = timezone.now() + get_password_reset_token_expiry()
+        if self._state.adding and self.unique_user_id is None and get_password_reset_one_token_per_user():
+            self.unique_user_id = self.user_id
+        if not self.key and not self.key_digest:
             self.key = self.generate_key()
-        return super(ResetPasswordToken, self).save(*args, **kwargs)
+        if self.key:
+            self.key_digest = self.get_key_digest(self.key)
+
+        if not get_password_reset_hashed_tokens():
+            return super(ResetPasswordToken, self).save(*args, **kwargs)
+
+        # only store the digest, but keep the key on the instance (e.g., for the reset_password_token_created signal)
+        key, self.key = self.key, None
+        try:
+            return super(ResetPasswordToken, self).save(*args, **kwargs)
+        finally:
+            self.key = key
 
     def __str__(self):
         return "Password reset token for user {user}".format(user=self.user)
 
 
+class ResetPasswordTokenDelivery(models.Model):
+    """
+    A pending (or failed) delivery of the reset_password_token_created signal, used by DatabaseDeliveryQueue
+
+    Only the digest of the token key is stored; the key itself is kept in the cache until the token expires. Rows are
+    deleted once the signal was delivered; rows of deliveries that failed for good are kept with status "failed" as
+    dead letters, which can be replayed with DatabaseDeliveryQueue.replay() while the token is valid.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _("Pending")),
+        (STATUS_FAILED, _("Failed")),
+    )
+
+    class Meta:
+        verbose_name = _("Password Reset Token Delivery")
+        verbose_name_plural = _("Password Reset Token Deliveries")
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="drpr_delivery_next_attempt_idx"),
+        ]
+
+    id = models.AutoField(
+        primary_key=True
+    )
+
+    sender = models.CharField(
+        _("Dotted path of the class that sent the signal"),
+        max_length=255,
+    )
+
+    token_digest = models.CharField(
+        _("SHA-256 digest of the key of the password reset token"),
+        max_length=64,
+    )
+
+    expires_at = models.DateTimeField(
+        _("When does the token expire"),
+    )
+
+    status = models.CharField(
+        _("Status"),
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING,
+    )
+
+    attempts = models.PositiveIntegerField(
+        _("Number of delivery attempts"),
+        default=0,
+    )
+
+    last_error = models.TextField(
+        _("Last delivery error"),
+        default="",
+        blank=True,
+    )
+
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("When was this delivery queued"),
+    )
+
+    next_attempt_at = models.DateTimeField(
+        _("When should the next delivery attempt be made"),
+        default=timezone.now,
+    )
+
+    def __str__(self):
+        return "Password reset token delivery {pk} ({status})".format(pk=self.pk, status=self.status)
+
+
 def get_password_reset_token_expiry_time():
     """
     Returns the password reset token expirty time in hours (default: 24)
@@ -92,7 +264,33 @@ def get_password_reset_token_expiry_time():
     :return: expiry time
     """
     # get token validation time
-    return getattr(settings, 'DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME', 24)
+    return password_reset_settings.TOKEN_EXPIRY_TIME
+
+
+def get_password_reset_token_expiry():
+    """
+    Returns the password reset token expiry time as timedelta (see get_password_reset_token_expiry_time)
+    :return: expiry time
+    """
+    return password_reset_settings.TOKEN_EXPIRY
+
+
+def get_password_reset_hashed_tokens():
+    """
+    Returns whether only the SHA-256 digest of the tokens is stored in the ResetPasswordToken model (default: False)
+    Set Django SETTINGS.DJANGO_REST_PASSWORDRESET_HASHED_TOKENS to overwrite this
+    :return: True if the keys of the tokens are not stored
+    """
+    return password_reset_settings.HASHED_TOKENS
+
+
+def get_password_reset_one_token_per_user():
+    """
+    Returns whether the database ensures that a user has only one password reset token (default: False)
+    Set Django SETTINGS.DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER to overwrite this
+    :return: True if only one token per user is allowed
+    """
+    return password_reset_settings.ONE_TOKEN_PER_USER
 
 
 def get_password_reset_lookup_field():
@@ -101,28 +299,137 @@ def get_password_reset_lookup_field():
     Set Django SETTINGS.DJANGO_REST_LOOKUP_FIELD to overwrite this time
     :return: lookup field
     """
-    return getattr(settings, 'DJANGO_REST_LOOKUP_FIELD', 'email')
+    return password_reset_settings.LOOKUP_FIELD
 
 
-def clear_expired(expiry_time):
+def clear_expired(expiry_time, batch_size=None, sleep=0, max_runtime=None):
     """
     Remove all expired tokens
-    :param expiry_time: Token expiration time
+
+    Tokens are removed by their expires_at: for compatibility, expiry_time is the creation time before which tokens
+    with the default lifetime have expired, so all tokens that expired until expiry_time plus
+    DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME (i.e., usually now) are removed.
+
+    By default, all expired tokens are removed with a single DELETE. If batch_size is set, the tokens are removed in
+    primary-key ordered batches of at most batch_size rows, each batch in its own statement (and, in autocommit mode,
+    its own transaction). An interrupted run can therefore simply be started again and continues where it stopped.
+    :param expiry_time: Token expiration time (the current time minus the expiry time)
+    :param batch_size: Maximum number of tokens removed per batch (default: None, remove all at once)
+    :param sleep: Seconds to sleep between two batches
+    :param max_runtime: Stop after the batch that exceeded max_runtime seconds (only used with batch_size)
+    :return: number of removed tokens
     """
-    ResetPasswordToken.objects.filter(created_at__lte=expiry_time).delete()
+    queryset = ResetPasswordToken.objects.expired(expiry_time + get_password_reset_token_expiry())
+
+    if not batch_size:
+        return queryset.delete()[0]
+
+    # without signal receivers or cascades we do not need to collect the rows in python before deleting them
+    collector = Collector(using=queryset.db, origin=queryset)
+    fast_delete = collector.can_fast_delete(queryset)
+
+    deleted = 0
+    last_pk = None
+    started = time.monotonic()
+
+    while True:
+        batch_queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            batch_queryset = batch_queryset.filter(pk__gt=last_pk)
+
+        pks = list(batch_queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+
+        first_pk, last_pk = pks[0], pks[-1]
+        batch = queryset.filter(pk__gte=first_pk, pk__lte=last_pk)
+        if fast_delete:
+            deleted += batch._raw_delete(batch.db)
+        else:
+            deleted += batch.delete()[0]
+
+        if len(pks) < batch_size:
+            break
+        if max_runtime is not None and time.monotonic() - started >= max_runtime:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    return deleted
 
 def eligible_for_reset(self):
     if not self.is_active:
         # if the user is active we dont bother checking
         return False
 
-    if getattr(settings, 'DJANGO_REST_MULTITOKENAUTH_REQUIRE_USABLE_PASSWORD', True):
+    if password_reset_settings.REQUIRE_USABLE_PASSWORD:
         # if we require a usable password then return the result of has_usable_password()
         return self.has_usable_password()
     else:
         # otherwise return True because we dont care about the result of has_usable_password()
         return True
 
+
+def filter_eligible_for_reset(users):
+    """
+    Restricts a user queryset to the users that are eligible for a password reset (see eligible_for_reset), so the
+    filtering happens in SQL instead of python. Conditions on fields that do not exist on the user model (e.g.,
+    custom user models without an is_active field) are skipped; callers still have to check eligible_for_reset().
+    :param users: user queryset
+    :return: filtered user queryset
+    """
+    field_names = {field.name for field in users.model._meta.concrete_fields}
+
+    if 'is_active' in field_names:
+        users = users.filter(is_active=True)
+
+    if 'password' in field_names and password_reset_settings.REQUIRE_USABLE_PASSWORD:
+        users = users.exclude(password__startswith=UNUSABLE_PASSWORD_PREFIX)
+
+    return users
+
+
+def invalidate_validation_cache(sender, instance, **kwargs):
+    """
+    post_delete receiver: removes the cached validation results of the user of a deleted token, including tokens that
+    are deleted by a CASCADE of the user (see DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE)
+    """
+    if instance.is_expired():
+        # expired tokens are never served from the validation cache
+        return
+
+    from django_rest_passwordreset.validation_cache import invalidate_validation_cache_for_user
+    invalidate_validation_cache_for_user(instance.user_id)
+
+
+def connect_validation_cache_receiver(validation_cache_config):
+    """
+    Connects invalidate_validation_cache while the validation cache is enabled; without a receiver of post_delete,
+    tokens are deleted without loading them first (e.g., by clear_expired)
+    """
+    dispatch_uid = 'django_rest_passwordreset.invalidate_validation_cache'
+    if validation_cache_config is None:
+        post_delete.disconnect(sender=ResetPasswordToken, dispatch_uid=dispatch_uid)
+    else:
+        post_delete.connect(invalidate_validation_cache, sender=ResetPasswordToken, dispatch_uid=dispatch_uid)
+
+
+connect_validation_cache_receiver(password_reset_settings.VALIDATION_CACHE_CONFIG)
+
+
+@receiver(setting_changed)
+def reconnect_validation_cache_receiver(*args, setting, value, **kwargs):
+    if setting == 'DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE':
+        connect_validation_cache_receiver(value)
+
+
 # add eligible_for_reset to the user class
 UserModel = get_user_model()
 UserModel.add_to_class("eligible_for_reset", eligible_for_reset)
+
+
+def __getattr__(name):
+    # TOKEN_GENERATOR_CLASS used to be constructed when this module was imported
+    if name == 'TOKEN_GENERATOR_CLASS':
+        return password_reset_settings.TOKEN_GENERATOR
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
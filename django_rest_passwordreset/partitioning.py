@@ -0,0 +1,288 @@
+"""
+Range partitioning of the ResetPasswordToken table by created_at on PostgreSQL (see PartitionedModelTokenBackend and
+the partitionresetpasswordtokens management command)
+
+Partitions are named ``<table>_p<start>``, with start formatted as YYYYMMDD (interval "day") or YYYYMMDDHH (interval
+"hour") in UTC. Rows outside of all partitions end up in the default partition ``<table>_default``.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from django_rest_passwordreset.models import ResetPasswordToken, get_password_reset_token_expiry
+
+__all__ = [
+    'INTERVALS',
+    'convert_to_partitioned_table',
+    'create_partitions',
+    'drop_expired_partitions',
+    'get_expired_partitions',
+    'get_partition_name',
+    'get_partitions',
+    'is_partitioned',
+    'parse_partition_name',
+    'truncate',
+]
+
+# interval -> (length of a partition, format of the partition name suffix)
+INTERVALS = {
+    'day': (timedelta(days=1), '%Y%m%d'),
+    'hour': (timedelta(hours=1), '%Y%m%d%H'),
+}
+
+
+def _get_interval(interval):
+    try:
+        return INTERVALS[interval]
+    except KeyError:
+        raise ImproperlyConfigured("The partition interval must be one of {intervals}, not {interval!r}".format(
+            intervals=", ".join(INTERVALS), interval=interval,
+        ))
+
+
+def _get_table_name():
+    return ResetPasswordToken._meta.db_table
+
+
+def _get_connection(using=None):
+    return connections[using or router.db_for_write(ResetPasswordToken)]
+
+
+def truncate(moment, interval):
+    """ returns the start of the partition that contains moment (in UTC if time zone support is enabled) """
+    _get_interval(interval)
+    if timezone.is_aware(moment):
+        moment = moment.astimezone(dt_timezone.utc)
+
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if interval == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def get_partition_name(start, interval):
+    """ returns the name of the partition starting at start """
+    suffix_format = _get_interval(interval)[1]
+    return '{table}_p{suffix}'.format(table=_get_table_name(), suffix=start.strftime(suffix_format))
+
+
+def parse_partition_name(name, interval):
+    """
+    :return: the start of the partition with the given name, or None if it is not named like the partitions of the
+        interval (e.g., the default partition)
+    """
+    suffix_format = _get_interval(interval)[1]
+    prefix = '{table}_p'.format(table=_get_table_name())
+    if not name.startswith(prefix):
+        return None
+
+    suffix = name[len(prefix):]
+    try:
+        start = datetime.strptime(suffix, suffix_format)
+    except ValueError:
+        return None
+    # e.g., "2024010112" can be parsed as a day, but is not named like one
+    if start.strftime(suffix_format) != suffix:
+        return None
+
+    if settings.USE_TZ:
+        start = start.replace(tzinfo=dt_timezone.utc)
+    return start
+
+
+def is_partitioned(using=None):
+    """ returns whether the ResetPasswordToken table is a partitioned PostgreSQL table """
+    connection = _get_connection(using)
+    if connection.vendor != 'postgresql':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [_get_table_name()])
+        return cursor.fetchone() is not None
+
+
+def get_partitions(using=None):
+    """ returns the names of all partitions of the ResetPasswordToken table (an empty list if it is not partitioned) """
+    connection = _get_connection(using)
+    if connection.vendor != 'postgresql':
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [_get_table_name()],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _create_partitions(cursor, connection, table, start, end, interval):
+    """ creates the missing partitions of table from the partition containing start up to the one containing end """
+    length = _get_interval(interval)[0]
+    partition_start = truncate(start, interval)
+    created = []
+
+    while partition_start <= end:
+        partition_end = partition_start + length
+        name = get_partition_name(partition_start, interval)
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            cursor.execute(
+                "CREATE TABLE {partition} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')".format(
+                    partition=connection.ops.quote_name(name),
+                    table=connection.ops.quote_name(table),
+                    start=partition_start.isoformat(sep=' '),
+                    end=partition_end.isoformat(sep=' '),
+                )
+            )
+            created.append(name)
+        partition_start = partition_end
+
+    return created
+
+
+def create_partitions(interval='day', ahead=7, now=None, using=None):
+    """
+    Creates the partitions of the current and the next ahead intervals that do not exist yet. Run this regularly
+    (e.g., daily via the partitionresetpasswordtokens command), so new tokens do not end up in the default partition.
+    :return: names of the created partitions
+    """
+    connection = _get_connection(using)
+    now = now or timezone.now()
+    length = _get_interval(interval)[0]
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        return _create_partitions(cursor, connection, _get_table_name(), now, now + length * ahead, interval)
+
+
+def _check_pending_constraints(connection):
+    """ checks deferred foreign keys of the current transaction, PostgreSQL can not drop tables with pending checks """
+    if connection.in_atomic_block:
+        connection.check_constraints()
+
+
+def get_expired_partitions(expiry_time, interval='day', using=None):
+    """
+    returns the names of the partitions that only contain tokens created before expiry_time, none of which is still
+    valid (tokens may be valid for longer than the expiry time, see DJANGO_REST_PASSWORDRESET_TOKEN_POLICY)
+    """
+    length = _get_interval(interval)[0]
+    connection = _get_connection(using)
+    now = expiry_time + get_password_reset_token_expiry()
+    expired = []
+
+    with connection.cursor() as cursor:
+        for name in get_partitions(using=connection.alias):
+            start = parse_partition_name(name, interval)
+            if start is None or start + length > expiry_time:
+                continue
+
+            cursor.execute("SELECT 1 FROM {partition} WHERE expires_at > %s LIMIT 1".format(
+                partition=connection.ops.quote_name(name),
+            ), [now])
+            if cursor.fetchone() is None:
+                expired.append(name)
+
+    return expired
+
+
+def drop_expired_partitions(expiry_time, interval='day', using=None):
+    """
+    Drops the partitions that only contain expired tokens created before expiry_time. Tokens in the remaining partitions
+    (including the default partition) still have to be deleted row by row (see clear_expired).
+    :return: names of the dropped partitions
+    """
+    connection = _get_connection(using)
+    dropped = get_expired_partitions(expiry_time, interval, using=connection.alias)
+
+    if dropped:
+        _check_pending_constraints(connection)
+
+    with connection.cursor() as cursor:
+        for name in dropped:
+            cursor.execute("DROP TABLE IF EXISTS {partition}".format(partition=connection.ops.quote_name(name)))
+
+    return dropped
+
+
+def convert_to_partitioned_table(interval='day', ahead=7, now=None, using=None):
+    """
+    Replaces the ResetPasswordToken table by a table partitioned by created_at, with a default partition and the
+    partitions of the token expiry time up to ahead intervals ahead, and copies all tokens. The table is locked while
+    it is converted.
+
+    PostgreSQL requires the partition key in all unique constraints, so the primary key becomes (id, created_at) and
+    key_digest is only unique together with created_at.
+    :return: names of the created partitions
+    """
+    connection = _get_connection(using)
+    if connection.vendor != 'postgresql':
+        raise ImproperlyConfigured("Partitioning the token table requires PostgreSQL")
+
+    now = now or timezone.now()
+    length = _get_interval(interval)[0]
+    qn = connection.ops.quote_name
+
+    table = _get_table_name()
+    new_table = '{table}_partitioned'.format(table=table)
+    sequence = '{table}_id_seq'.format(table=table)
+    new_sequence = '{table}_partitioned_id_seq'.format(table=table)
+    user_field = ResetPasswordToken._meta.get_field('user')
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if is_partitioned(using=connection.alias):
+            raise ImproperlyConfigured("The token table {table} is already partitioned".format(table=table))
+
+        cursor.execute("LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE".format(table=qn(table)))
+        _check_pending_constraints(connection)
+
+        cursor.execute("CREATE SEQUENCE {sequence}".format(sequence=qn(new_sequence)))
+        cursor.execute("CREATE TABLE {new_table} (LIKE {table}) PARTITION BY RANGE (created_at)".format(
+            new_table=qn(new_table), table=qn(table),
+        ))
+        cursor.execute("ALTER TABLE {new_table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')".format(
+            new_table=qn(new_table), sequence=new_sequence,
+        ))
+        cursor.execute("CREATE TABLE {default} PARTITION OF {new_table} DEFAULT".format(
+            default=qn('{table}_default'.format(table=table)), new_table=qn(new_table),
+        ))
+        # older tokens end up in the default partition and are deleted row by row once they expired
+        created = _create_partitions(
+            cursor, connection, new_table,
+            now - get_password_reset_token_expiry(), now + length * ahead, interval,
+        )
+
+        cursor.execute("INSERT INTO {new_table} SELECT * FROM {table}".format(new_table=qn(new_table), table=qn(table)))
+        cursor.execute("SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) FROM {new_table}".format(
+            sequence=new_sequence, new_table=qn(new_table),
+        ))
+
+        # swap the tables, then create the constraints and indexes (with the names of the old table)
+        cursor.execute("DROP TABLE {table}".format(table=qn(table)))
+        cursor.execute("ALTER TABLE {new_table} RENAME TO {table}".format(new_table=qn(new_table), table=qn(table)))
+        cursor.execute("ALTER SEQUENCE {new_sequence} RENAME TO {sequence}".format(
+            new_sequence=qn(new_sequence), sequence=qn(sequence),
+        ))
+        cursor.execute("ALTER SEQUENCE {sequence} OWNED BY {table}.id".format(sequence=qn(sequence), table=qn(table)))
+
+        for statement in (
+            "ALTER TABLE {table} ADD CONSTRAINT {pkey} PRIMARY KEY (id, created_at)",
+            "ALTER TABLE {table} ADD CONSTRAINT drpr_token_key_digest_uniq UNIQUE (key_digest, created_at)",
+            "CREATE INDEX drpr_token_created_at_idx ON {table} (created_at)",
+            "CREATE INDEX drpr_token_expires_at_idx ON {table} (expires_at)",
+            "CREATE INDEX drpr_token_user_id_idx ON {table} ({user_column})",
+            "ALTER TABLE {table} ADD CONSTRAINT drpr_token_user_id_fk FOREIGN KEY ({user_column}) "
+            "REFERENCES {user_table} ({user_pk}) DEFERRABLE INITIALLY DEFERRED",
+        ):
+            cursor.execute(statement.format(
+                table=qn(table),
+                pkey=qn('{table}_pkey'.format(table=table)),
+                user_column=qn(user_field.column),
+                user_table=qn(user_field.target_field.model._meta.db_table),
+                user_pk=qn(user_field.target_field.column),
+            ))
+
+    return created
@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.utils.module_loading import import_string
+
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.tokens import get_token_generator
+
+__all__ = [
+    'BaseTokenPolicy',
+    'TokenPolicy',
+    'get_token_policy',
+]
+
+
+def get_token_policy():
+    """
+    Returns the token policy based on the configuration in DJANGO_REST_PASSWORDRESET_TOKEN_POLICY.CLASS and
+    DJANGO_REST_PASSWORDRESET_TOKEN_POLICY.OPTIONS
+    :return: token policy instance (Default: BaseTokenPolicy, which applies the global settings to all tokens)
+    """
+    policy_config = password_reset_settings.TOKEN_POLICY_CONFIG or {}
+
+    policy_class = BaseTokenPolicy
+    options = {}
+
+    if "CLASS" in policy_config:
+        policy_class = policy_config["CLASS"]
+        if isinstance(policy_class, str):
+            policy_class = import_string(policy_class)
+
+    if "OPTIONS" in policy_config:
+        options = policy_config["OPTIONS"]
+
+    return policy_class(**options)
+
+
+class BaseTokenPolicy:
+    """
+    Base Class for the token policies, which decide for every new token which token generator creates its key, how
+    long it is valid and how often it can be used. By default, the global settings apply to all tokens.
+
+    - Can take arbitrary args/kwargs and work with those
+    - May implement "get_token_generator", "get_lifetime" and "get_max_uses"; they are called with the user the token
+      is created for and the context of the request (``user_agent`` and ``ip_address``)
+    """
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_token_generator(self, user, user_agent='', ip_address=''):
+        """
+        :return: the token generator of the token (Default: the one of DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG)
+        """
+        return password_reset_settings.TOKEN_GENERATOR
+
+    def get_lifetime(self, user, user_agent='', ip_address=''):
+        """
+        :return: how long the token is valid, as timedelta (Default: DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME)
+        """
+        return password_reset_settings.TOKEN_EXPIRY
+
+    def get_max_uses(self, user, user_agent='', ip_address=''):
+        """
+        :return: how often the token can be presented to the confirm endpoint, or None
+            (Default: unlimited)
+        """
+        return None
+
+    def generate_keys(self, users, user_agent='', ip_address=''):
+        """
+        Generates the key of a new token for each of the users with the token generator of the user; the keys of all
+        users with the same token generator are generated at once (see generate_tokens)
+        :return: list of keys, in the order of users
+        """
+        indexes_by_generator = {}
+        for index, user in enumerate(users):
+            generator = self.get_token_generator(user, user_agent=user_agent, ip_address=ip_address)
+            indexes_by_generator.setdefault(generator, []).append(index)
+
+        keys = [None] * len(users)
+        for generator, indexes in indexes_by_generator.items():
+            for index, key in zip(indexes, generator.generate_tokens(len(indexes))):
+                keys[index] = key
+        return keys
+
+
+class TokenPolicy(BaseTokenPolicy):
+    """
+    Applies the same token generator, lifetime and maximum number of uses to all tokens
+
+    Options: ``token_config`` (like DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG, Default: that setting), ``lifetime`` in
+    seconds (Default: DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME) and ``max_uses`` (Default: unlimited).
+    Subclass it to decide per user or request, e.g.::
+
+        class StaffTokenPolicy(TokenPolicy):
+            def get_lifetime(self, user, user_agent='', ip_address=''):
+                if user.is_staff:
+                    return timedelta(minutes=10)
+                return super().get_lifetime(user, user_agent, ip_address)
+    """
+
+    def __init__(self, token_config=None, lifetime=None, max_uses=None, *args, **kwargs):
+        self.token_generator = get_token_generator(token_config) if token_config is not None else None
+        self.lifetime = timedelta(seconds=lifetime) if lifetime is not None else None
+        self.max_uses = max_uses
+
+    def get_token_generator(self, user, user_agent='', ip_address=''):
+        if self.token_generator is None:
+            return super().get_token_generator(user, user_agent, ip_address)
+        return self.token_generator
+
+    def get_lifetime(self, user, user_agent='', ip_address=''):
+        if self.lifetime is None:
+            return super().get_lifetime(user, user_agent, ip_address)
+        return self.lifetime
+
+    def get_max_uses(self, user, user_agent='', ip_address=''):
+        return self.max_uses
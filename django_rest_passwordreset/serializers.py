@@ -1,19 +1,19 @@
-from datetime import timedelta
-
-from django.core.exceptions import ValidationError
 from django.http import Http404
-from django.shortcuts import get_object_or_404 as _get_object_or_404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from django_rest_passwordreset.models import get_password_reset_token_expiry_time
-from . import models
+from django_rest_passwordreset.instrumentation import measure
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.validation_cache import invalidate_validation_cache_for_user
 
 __all__ = [
     'EmailSerializer',
+    'BulkEmailSerializer',
     'PasswordTokenSerializer',
     'ResetTokenSerializer',
+    'TokenSerializer',
+    'get_valid_token',
 ]
 
 INVALID_TOKEN_ERROR = _("The OTP password entered is not valid. Please check and try again.")
@@ -23,31 +23,55 @@ class EmailSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
 
+class BulkEmailSerializer(serializers.Serializer):
+    emails = serializers.ListField(child=serializers.EmailField(), allow_empty=False)
+
+    def validate_emails(self, emails):
+        max_emails = password_reset_settings.BULK_REQUEST_MAX_EMAILS
+        if len(emails) > max_emails:
+            raise serializers.ValidationError(
+                _("Ensure this field has no more than {max_emails} elements.").format(max_emails=max_emails)
+            )
+        return emails
+
+
+def get_valid_token(key, backend=None, request=None):
+    """
+    Returns the (not expired) token with the given key; expired tokens are deleted. If the request is passed, the
+    guess budget of the client is checked for the token (see GuessBudget.check_token)
+    :raises Http404: if there is no such token or it has expired
+    """
+    backend = backend or password_reset_settings.TOKEN_BACKEND
+
+    # find the token, unless it has expired (expired tokens are deleted by the backend)
+    reset_password_token = backend.get_valid_token(key, now=timezone.now())
+    if reset_password_token is None:
+        raise Http404(INVALID_TOKEN_ERROR)
+
+    guess_budget = password_reset_settings.GUESS_BUDGET
+    if (guess_budget is not None and request is not None
+            and not guess_budget.check_token(reset_password_token.created_at, guess_budget.get_ident(request))):
+        # the client failed too many guesses while the token was outstanding
+        backend.delete_token(reset_password_token)
+        # (not every backend deletes a ResetPasswordToken, which would remove the token from the validation cache)
+        invalidate_validation_cache_for_user(reset_password_token.user_id)
+        raise Http404(INVALID_TOKEN_ERROR)
+    return reset_password_token
+
+
 class PasswordValidateMixin:
     def validate(self, data):
-        token = data.get('token')
-
-        # get token validation time
-        password_reset_token_validation_time = get_password_reset_token_expiry_time()
-
-        # find token
-        try:
-            reset_password_token = _get_object_or_404(models.ResetPasswordToken, key=token)
-        except (TypeError, ValueError, ValidationError, Http404,
-                models.ResetPasswordToken.DoesNotExist):
-            raise Http404(INVALID_TOKEN_ERROR)
-
-        # check expiry date
-        expiry_date = reset_password_token.created_at + timedelta(
-            hours=password_reset_token_validation_time)
-
-        if timezone.now() > expiry_date:
-            # delete expired token
-            reset_password_token.delete()
-            raise Http404(INVALID_TOKEN_ERROR)
+        # hand the resolved token (with its user) to the view, so it does not need to look it up again
+        with measure('validate_token', 'get_valid_token'):
+            data['reset_password_token'] = get_valid_token(data.get('token'), request=self.context.get('request'))
         return data
 
 
+class TokenSerializer(serializers.Serializer):
+    """ validates the token field only, without looking up the token """
+    token = serializers.CharField()
+
+
 class PasswordTokenSerializer(PasswordValidateMixin, serializers.Serializer):
     password = serializers.CharField(label=_("Password"), style={'input_type': 'password'})
     token = serializers.CharField()
@@ -0,0 +1,249 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+__all__ = [
+    'PasswordResetSettings',
+    'password_reset_settings',
+]
+
+# attribute of password_reset_settings: (name of the django setting, default value)
+SETTINGS = {
+    'TOKEN_CONFIG': ('DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG', None),
+    'TOKEN_POLICY_CONFIG': ('DJANGO_REST_PASSWORDRESET_TOKEN_POLICY', None),
+    'TOKEN_BACKEND_CONFIG': ('DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND', None),
+    'CLEANUP_STRATEGY_CONFIG': ('DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY', None),
+    'DISPATCHER_CONFIG': ('DJANGO_REST_PASSWORDRESET_DISPATCHER', None),
+    'VALIDATION_CACHE_CONFIG': ('DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE', None),
+    'GUESS_BUDGET_CONFIG': ('DJANGO_REST_PASSWORDRESET_GUESS_BUDGET', None),
+    'METRICS_SINK_CONFIG': ('DJANGO_REST_PASSWORDRESET_METRICS_SINK', None),
+    'EXECUTOR_MAX_WORKERS': ('DJANGO_REST_PASSWORDRESET_EXECUTOR_MAX_WORKERS', 4),
+    'PASSWORD_HASHING_MAX_WORKERS': ('DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS', None),
+    'TOKEN_EXPIRY_TIME': ('DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME', 24),
+    'REQUIRE_USABLE_PASSWORD': ('DJANGO_REST_MULTITOKENAUTH_REQUIRE_USABLE_PASSWORD', True),
+    'LOOKUP_FIELD': ('DJANGO_REST_LOOKUP_FIELD', 'email'),
+    'HASHED_TOKENS': ('DJANGO_REST_PASSWORDRESET_HASHED_TOKENS', False),
+    'ONE_TOKEN_PER_USER': ('DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER', False),
+    'NO_INFORMATION_LEAKAGE': ('DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE', True),
+    'USER_DETAILS_ON_VALIDATION': ('DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION', False),
+    'RESPONSE_TIME_BUDGET': ('DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET', None),
+    'HTTP_USER_AGENT_HEADER': ('DJANGO_REST_PASSWORDRESET_HTTP_USER_AGENT_HEADER', 'HTTP_USER_AGENT'),
+    'IP_ADDRESS_HEADER': ('DJANGO_REST_PASSWORDRESET_IP_ADDRESS_HEADER', 'REMOTE_ADDR'),
+    'THROTTLE_CLASSES': ('DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES', None),
+    'VALIDATE_TOKEN_THROTTLE_CLASSES': ('DJANGO_REST_PASSWORDRESET_VALIDATE_TOKEN_THROTTLE_CLASSES', None),
+    'CONFIRM_THROTTLE_CLASSES': ('DJANGO_REST_PASSWORDRESET_CONFIRM_THROTTLE_CLASSES', None),
+    'ASYNC_THROTTLE_CLASSES': ('DJANGO_REST_PASSWORDRESET_ASYNC_THROTTLE_CLASSES', None),
+    'BULK_REQUEST_MAX_EMAILS': ('DJANGO_REST_PASSWORDRESET_BULK_REQUEST_MAX_EMAILS', 1000),
+}
+
+# the cache is cleared if one of these settings is changed; the resolved throttle classes may depend on DRF's
+# DEFAULT_THROTTLE_CLASSES
+SETTING_NAMES = {setting_name for setting_name, default in SETTINGS.values()} | {'REST_FRAMEWORK'}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_number(setting_name, value):
+    if not _is_number(value):
+        raise ImproperlyConfigured("{} must be a number, not {!r}".format(setting_name, value))
+    return value
+
+
+def _check_string(setting_name, value):
+    if not isinstance(value, str) or not value:
+        raise ImproperlyConfigured("{} must be a non-empty string, not {!r}".format(setting_name, value))
+    return value
+
+
+def _check_response_time_budget(setting_name, value):
+    if value is not None and (not _is_number(value) or value < 0):
+        raise ImproperlyConfigured("{} must not be negative".format(setting_name))
+    return value
+
+
+def _check_positive_integer(setting_name, value):
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ImproperlyConfigured("{} must be a positive integer, not {!r}".format(setting_name, value))
+    return value
+
+
+def _check_optional_positive_integer(setting_name, value):
+    if value is not None:
+        _check_positive_integer(setting_name, value)
+    return value
+
+
+def _check_class_config(setting_name, value):
+    if value is not None and not isinstance(value, dict):
+        raise ImproperlyConfigured(
+            "{} must be a dict with the keys CLASS and OPTIONS, not {!r}".format(setting_name, value)
+        )
+    return value
+
+
+def _check_throttle_classes(setting_name, value):
+    if value is not None and not isinstance(value, (str, list, tuple)):
+        raise ImproperlyConfigured(
+            "{} must be a dotted path or a list of throttle classes, not {!r}".format(setting_name, value)
+        )
+    return value
+
+
+class PasswordResetSettings:
+    """
+    Reads the settings of the package lazily: every setting (see SETTINGS) is read from the django settings on first
+    access, validated and cached, like DRF's api_settings. Derived values (the configured token generator, policy,
+    backend, dispatcher, ... instances, the thread pools, the expiry as timedelta, the resolved throttle classes, ...)
+    are computed on first use. The cache is cleared whenever one of the settings is changed (e.g., by
+    override_settings); the thread pools of the previous settings finish their work and are then discarded.
+    """
+    # attribute: function(setting name, value) that returns the validated value or raises ImproperlyConfigured
+    validators = {
+        'TOKEN_EXPIRY_TIME': _check_number,
+        'LOOKUP_FIELD': _check_string,
+        'HTTP_USER_AGENT_HEADER': _check_string,
+        'IP_ADDRESS_HEADER': _check_string,
+        'RESPONSE_TIME_BUDGET': _check_response_time_budget,
+        'BULK_REQUEST_MAX_EMAILS': _check_positive_integer,
+        'EXECUTOR_MAX_WORKERS': _check_positive_integer,
+        'PASSWORD_HASHING_MAX_WORKERS': _check_optional_positive_integer,
+        'TOKEN_BACKEND_CONFIG': _check_class_config,
+        'CLEANUP_STRATEGY_CONFIG': _check_class_config,
+        'DISPATCHER_CONFIG': _check_class_config,
+        'VALIDATION_CACHE_CONFIG': _check_class_config,
+        'GUESS_BUDGET_CONFIG': _check_class_config,
+        'METRICS_SINK_CONFIG': _check_class_config,
+        'THROTTLE_CLASSES': _check_throttle_classes,
+        'VALIDATE_TOKEN_THROTTLE_CLASSES': _check_throttle_classes,
+        'CONFIRM_THROTTLE_CLASSES': _check_throttle_classes,
+        'ASYNC_THROTTLE_CLASSES': _check_throttle_classes,
+    }
+
+    def __getattr__(self, attr):
+        try:
+            setting_name, default = SETTINGS[attr]
+        except KeyError:
+            raise AttributeError("Invalid password reset setting: '{}'".format(attr))
+
+        value = getattr(settings, setting_name, default)
+        if attr in self.validators:
+            value = self.validators[attr](setting_name, value)
+        # cache the value, so __getattr__ is not called again
+        setattr(self, attr, value)
+        return value
+
+    @cached_property
+    def TOKEN_GENERATOR(self):
+        """ the token generator configured in DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG (see get_token_generator) """
+        from django_rest_passwordreset.tokens import get_token_generator
+        return get_token_generator()
+
+    @cached_property
+    def TOKEN_POLICY(self):
+        """ the token policy configured in DJANGO_REST_PASSWORDRESET_TOKEN_POLICY (see get_token_policy) """
+        from django_rest_passwordreset.policies import get_token_policy
+        return get_token_policy()
+
+    @cached_property
+    def TOKEN_BACKEND(self):
+        """ the token backend configured in DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND (see get_token_backend) """
+        from django_rest_passwordreset.backends import get_token_backend
+        return get_token_backend()
+
+    @cached_property
+    def CLEANUP_STRATEGY(self):
+        """ the cleanup strategy configured in DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY (see get_cleanup_strategy) """
+        from django_rest_passwordreset.cleanup import get_cleanup_strategy
+        return get_cleanup_strategy()
+
+    @cached_property
+    def DISPATCHER(self):
+        """ the dispatcher configured in DJANGO_REST_PASSWORDRESET_DISPATCHER (see get_dispatcher) """
+        from django_rest_passwordreset.dispatch import get_dispatcher
+        return get_dispatcher()
+
+    @cached_property
+    def VALIDATION_CACHE(self):
+        """ the validation cache configured in DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE, or None """
+        from django_rest_passwordreset.validation_cache import get_validation_cache
+        return get_validation_cache()
+
+    @cached_property
+    def GUESS_BUDGET(self):
+        """ the guess budget configured in DJANGO_REST_PASSWORDRESET_GUESS_BUDGET, or None """
+        from django_rest_passwordreset.guess_budget import get_guess_budget
+        return get_guess_budget()
+
+    @cached_property
+    def METRICS_SINK(self):
+        """ the metrics sink configured in DJANGO_REST_PASSWORDRESET_METRICS_SINK, or None """
+        from django_rest_passwordreset.instrumentation import get_metrics_sink
+        return get_metrics_sink()
+
+    @cached_property
+    def EXECUTOR(self):
+        """ the thread pool for out of band work, with DJANGO_REST_PASSWORDRESET_EXECUTOR_MAX_WORKERS threads """
+        return ThreadPoolExecutor(max_workers=self.EXECUTOR_MAX_WORKERS, thread_name_prefix='django-rest-passwordreset')
+
+    @cached_property
+    def PASSWORD_HASHING_EXECUTOR(self):
+        """ the thread pool that hashes new passwords (see DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS) """
+        if self.PASSWORD_HASHING_MAX_WORKERS is None:
+            return None
+        return ThreadPoolExecutor(
+            max_workers=self.PASSWORD_HASHING_MAX_WORKERS, thread_name_prefix='django-rest-passwordreset-hashing'
+        )
+
+    @cached_property
+    def TOKEN_EXPIRY(self):
+        """ DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME as timedelta """
+        return timedelta(hours=self.TOKEN_EXPIRY_TIME)
+
+    @cached_property
+    def LOOKUP_FIELD_IEXACT(self):
+        """ the keyword argument of filter() that looks up users case-insensitively by LOOKUP_FIELD """
+        return '{}__iexact'.format(self.LOOKUP_FIELD)
+
+    @cached_property
+    def REQUEST_TOKEN_THROTTLES(self):
+        """ the resolved throttle classes of the request-token endpoint """
+        from django_rest_passwordreset.throttling import resolve_request_token_throttle_classes
+        return resolve_request_token_throttle_classes(self.THROTTLE_CLASSES)
+
+    @cached_property
+    def VALIDATE_TOKEN_THROTTLES(self):
+        """ the resolved throttle classes of the validate-token endpoint, or None """
+        from django_rest_passwordreset.throttling import resolve_endpoint_throttle_classes
+        return resolve_endpoint_throttle_classes(self.VALIDATE_TOKEN_THROTTLE_CLASSES)
+
+    @cached_property
+    def CONFIRM_THROTTLES(self):
+        """ the resolved throttle classes of the confirm endpoint, or None """
+        from django_rest_passwordreset.throttling import resolve_endpoint_throttle_classes
+        return resolve_endpoint_throttle_classes(self.CONFIRM_THROTTLE_CLASSES)
+
+    @cached_property
+    def ASYNC_REQUEST_TOKEN_THROTTLES(self):
+        """ the resolved throttle classes of the async request-token view """
+        from django_rest_passwordreset.throttling import resolve_async_request_token_throttle_classes
+        return resolve_async_request_token_throttle_classes(self.ASYNC_THROTTLE_CLASSES)
+
+    def reload(self):
+        """ clears the cached settings, they are read again on the next access """
+        self.__dict__.clear()
+
+
+password_reset_settings = PasswordResetSettings()
+
+
+@receiver(setting_changed)
+def reload_password_reset_settings(*args, setting, **kwargs):
+    if setting in SETTING_NAMES:
+        password_reset_settings.reload()
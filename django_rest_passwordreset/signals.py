@@ -1,7 +1,8 @@
-from django.dispatch import Signal
+from django_rest_passwordreset.instrumentation import InstrumentedSignal
 
 __all__ = [
     'reset_password_token_created',
+    'reset_password_tokens_created',
     'pre_password_reset',
     'post_password_reset',
 ]
@@ -9,14 +10,20 @@ __all__ = [
 """
 Signal arguments: instance, reset_password_token
 """
-reset_password_token_created = Signal()
+reset_password_token_created = InstrumentedSignal('reset_password_token_created')
+
+"""
+Signal arguments: instance, reset_password_tokens
+Sent once for a batch of tokens (see ResetPasswordBulkRequestToken and the bulkrequestresetpasswordtokens command)
+"""
+reset_password_tokens_created = InstrumentedSignal('reset_password_tokens_created')
 
 """
 Signal arguments: user, reset_password_token
 """
-pre_password_reset = Signal()
+pre_password_reset = InstrumentedSignal('pre_password_reset')
 
 """
 Signal arguments: user, reset_password_token
 """
-post_password_reset = Signal()
+post_password_reset = InstrumentedSignal('post_password_reset')
@@ -1,11 +1,29 @@
-from django.conf import settings
+import hashlib
+import json
+from collections.abc import Mapping
+
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.module_loading import import_string
 from rest_framework.settings import api_settings
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.throttling import ScopedRateThrottle, SimpleRateThrottle, UserRateThrottle
+
+from django_rest_passwordreset.settings import password_reset_settings
 
 
-__all__ = ("ResetPasswordRequestTokenThrottle", "get_password_reset_request_token_throttle_classes")
+__all__ = (
+    "ResetPasswordRequestTokenThrottle",
+    "AsyncThrottleMixin",
+    "AsyncResetPasswordRequestTokenThrottle",
+    "AsyncScopedRateThrottle",
+    "SlidingWindowRateThrottle",
+    "SlidingWindowIPRateThrottle",
+    "SlidingWindowEmailRateThrottle",
+    "SlidingWindowTokenPrefixRateThrottle",
+    "get_password_reset_request_token_throttle_classes",
+    "get_password_reset_validate_token_throttle_classes",
+    "get_password_reset_confirm_throttle_classes",
+    "get_async_password_reset_request_token_throttle_classes",
+)
 
 
 class ResetPasswordRequestTokenThrottle(UserRateThrottle):
@@ -19,15 +37,231 @@ class ResetPasswordRequestTokenThrottle(UserRateThrottle):
             return self.default_rate
 
 
+class AsyncThrottleMixin:
+    """
+    Adds aallow_request to a SimpleRateThrottle, which reads and writes the request history with the async cache API
+
+    Used by the async views, whose requests are plain Django requests: the throttles identify clients by their IP
+    address (see SimpleRateThrottle.get_ident), as the user can not be loaded lazily in an async context.
+    """
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+    async def aallow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.history = await self.cache.aget(self.key, [])
+        self.now = self.timer()
+
+        # drop any requests from the history which have now passed the throttle duration
+        while self.history and self.history[-1] <= self.now - self.duration:
+            self.history.pop()
+        if len(self.history) >= self.num_requests:
+            return self.throttle_failure()
+
+        self.history.insert(0, self.now)
+        await self.cache.aset(self.key, self.history, self.duration)
+        return True
+
+
+class AsyncResetPasswordRequestTokenThrottle(AsyncThrottleMixin, ResetPasswordRequestTokenThrottle):
+    """
+    Async variant of ResetPasswordRequestTokenThrottle (default throttle of the async request-token view)
+    """
+
+
+class AsyncScopedRateThrottle(AsyncThrottleMixin, ScopedRateThrottle):
+    """
+    Async variant of ScopedRateThrottle; views whose throttle_scope has no rate in DEFAULT_THROTTLE_RATES are not
+    throttled
+    """
+
+    async def aallow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope or self.scope not in self.THROTTLE_RATES:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return await super().aallow_request(request, view)
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Base class of the sliding-window throttles, which limit the requests per client, email address or token prefix
+    (see get_ident_value) with a fixed amount of memory
+
+    Instead of a history of timestamps, two counters are kept in the cache for each ident: the number of allowed
+    requests in the current and in the previous window (of the duration of the rate). The number of requests within the
+    last duration is estimated by weighting the previous counter with the part of the previous window that is still
+    within the sliding window. Counters are incremented with the atomic cache.incr before the check, so concurrent
+    requests (also of other workers) can not exceed the limit; throttled requests are not counted.
+
+    The rate is looked up in REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] by the throttle_scope of the view and the
+    ident_kind, e.g., "django-rest-passwordreset-confirm.ip"; without a rate, requests are not throttled.
+    """
+    ident_kind = None
+    cache_format = 'throttle_sliding_%(scope)s_%(ident)s_%(window)d'
+
+    def __init__(self):
+        # the rate depends on the view (see allow_request)
+        pass
+
+    def get_scope(self, view):
+        throttle_scope = getattr(view, 'throttle_scope', None)
+        if not throttle_scope:
+            return None
+        return '{throttle_scope}.{ident_kind}'.format(throttle_scope=throttle_scope, ident_kind=self.ident_kind)
+
+    def get_ident_value(self, request, view):
+        """
+        Returns the value requests are counted by, or None if the request should not be throttled
+        """
+        raise NotImplementedError
+
+    def get_request_data(self, request):
+        """
+        Returns the parsed body of the request: rest_framework requests are parsed already, the plain Django requests
+        of the async views are parsed here (JSON or form data, like AsyncPasswordResetView.get_data)
+        """
+        data = getattr(request, 'data', None)
+        if data is None:
+            if request.content_type == 'application/json':
+                try:
+                    data = json.loads(request.body or b'{}')
+                except ValueError:
+                    # rejected by the view
+                    data = None
+            else:
+                data = request.POST
+        return data if isinstance(data, Mapping) else {}
+
+    def get_window_cache_key(self, window):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.ident,
+            'window': window,
+        }
+
+    def incr(self, key):
+        self.cache.add(key, 0, self.duration * 2)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # the counter expired (or was evicted) between add and incr
+            self.cache.add(key, 0, self.duration * 2)
+            return self.cache.incr(key)
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(view)
+        if not self.scope or self.scope not in self.THROTTLE_RATES:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        ident = self.get_ident_value(request, view)
+        if ident is None:
+            return True
+        self.ident = ident
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.elapsed = self.now - window * self.duration
+
+        key = self.get_window_cache_key(window)
+        self.count = self.incr(key)
+        self.previous_count = self.cache.get(self.get_window_cache_key(window - 1), 0)
+
+        weight = (self.duration - self.elapsed) / self.duration
+        if self.previous_count * weight + self.count > self.num_requests:
+            # do not count the throttled request
+            try:
+                self.cache.decr(key)
+            except ValueError:
+                pass
+            return self.throttle_failure()
+        return self.throttle_success()
+
+    def throttle_success(self):
+        return True
+
+    def wait(self):
+        """
+        Returns the recommended number of seconds to wait before the next request
+        """
+        # the throttled request was not counted
+        count = self.count - 1
+        if count + 1 > self.num_requests or not self.previous_count:
+            # wait for the next window
+            return self.duration - self.elapsed
+
+        # wait until enough requests of the previous window have left the sliding window
+        weight = (self.num_requests - count - 1) / self.previous_count
+        return max(self.duration * (1 - weight) - self.elapsed, 0)
+
+
+class SlidingWindowIPRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limits the requests per client IP address (see SimpleRateThrottle.get_ident), e.g. with the rate
+    "django-rest-passwordreset-request-token.ip"
+    """
+    ident_kind = 'ip'
+
+    def get_ident_value(self, request, view):
+        return self.get_ident(request)
+
+
+class SlidingWindowEmailRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limits the requests per (case-insensitive) email address of the request-token endpoint, e.g. with the rate
+    "django-rest-passwordreset-request-token.email"; the cache key contains the SHA-256 digest of the address
+    """
+    ident_kind = 'email'
+
+    def get_ident_value(self, request, view):
+        email = self.get_request_data(request).get('email')
+        if not email or not isinstance(email, str):
+            return None
+        return hashlib.sha256(email.strip().lower().encode()).hexdigest()
+
+
+class SlidingWindowTokenPrefixRateThrottle(SlidingWindowRateThrottle):
+    """
+    Limits the requests per token prefix (the first token_prefix_length characters of the token) of the validate-token
+    and confirm endpoints, e.g. with the rate "django-rest-passwordreset-confirm.token"
+    """
+    ident_kind = 'token'
+    token_prefix_length = 8
+
+    def get_ident_value(self, request, view):
+        token = self.get_request_data(request).get('token')
+        if not token or not isinstance(token, str):
+            return None
+        return hashlib.sha256(token[:self.token_prefix_length].encode()).hexdigest()
+
+
 def _resolve_throttle_class(throttle_class):
     if isinstance(throttle_class, str):
         return import_string(throttle_class)
     return throttle_class
 
 
-def get_password_reset_request_token_throttle_classes():
-    throttle_classes = getattr(settings, 'DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES', None)
-
+def resolve_request_token_throttle_classes(throttle_classes):
+    """
+    Resolves DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES (see get_password_reset_request_token_throttle_classes)
+    """
     if throttle_classes is None:
         return (ResetPasswordRequestTokenThrottle,)
 
@@ -38,3 +272,66 @@ def get_password_reset_request_token_throttle_classes():
         return tuple(api_settings.DEFAULT_THROTTLE_CLASSES)
 
     return tuple(_resolve_throttle_class(throttle_class) for throttle_class in throttle_classes)
+
+
+def resolve_endpoint_throttle_classes(throttle_classes):
+    """
+    Resolves the throttle classes of the validate-token or confirm endpoint (None if the setting is not set)
+    """
+    if throttle_classes is None:
+        return None
+
+    if isinstance(throttle_classes, str):
+        throttle_classes = (throttle_classes,)
+
+    return tuple(_resolve_throttle_class(throttle_class) for throttle_class in throttle_classes)
+
+
+def resolve_async_request_token_throttle_classes(throttle_classes):
+    """
+    Resolves DJANGO_REST_PASSWORDRESET_ASYNC_THROTTLE_CLASSES (see
+    get_async_password_reset_request_token_throttle_classes)
+    """
+    if throttle_classes is None:
+        return (AsyncResetPasswordRequestTokenThrottle,)
+
+    if isinstance(throttle_classes, str):
+        throttle_classes = (throttle_classes,)
+
+    return tuple(_resolve_throttle_class(throttle_class) for throttle_class in throttle_classes)
+
+
+def get_password_reset_request_token_throttle_classes():
+    """
+    Returns the throttle classes of the request-token endpoint, configured in
+    DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES (Default: ResetPasswordRequestTokenThrottle; an empty list selects
+    DEFAULT_THROTTLE_CLASSES). The classes are imported once and cached until the settings change.
+    :return: tuple of throttle classes
+    """
+    return password_reset_settings.REQUEST_TOKEN_THROTTLES
+
+
+def get_password_reset_validate_token_throttle_classes():
+    """
+    Returns the throttle classes of the validate-token endpoint, configured in
+    DJANGO_REST_PASSWORDRESET_VALIDATE_TOKEN_THROTTLE_CLASSES
+    :return: tuple of throttle classes, or None if the setting is not set (Default: DEFAULT_THROTTLE_CLASSES are used)
+    """
+    return password_reset_settings.VALIDATE_TOKEN_THROTTLES
+
+
+def get_password_reset_confirm_throttle_classes():
+    """
+    Returns the throttle classes of the confirm endpoint, configured in
+    DJANGO_REST_PASSWORDRESET_CONFIRM_THROTTLE_CLASSES
+    :return: tuple of throttle classes, or None if the setting is not set (Default: DEFAULT_THROTTLE_CLASSES are used)
+    """
+    return password_reset_settings.CONFIRM_THROTTLES
+
+
+def get_async_password_reset_request_token_throttle_classes():
+    """
+    Returns the throttle classes of the async request-token view, configured in
+    DJANGO_REST_PASSWORDRESET_ASYNC_THROTTLE_CLASSES (Default: AsyncResetPasswordRequestTokenThrottle)
+    """
+    return password_reset_settings.ASYNC_REQUEST_TOKEN_THROTTLES
@@ -1,15 +1,19 @@
 import os
-import binascii
-import random
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
 from importlib import import_module
 
 from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import base36_to_int, int_to_base36, urlsafe_base64_decode, urlsafe_base64_encode
 
 
-def get_token_generator():
+def get_token_generator(token_config=None):
     """
     Returns the token generator class based on the configuration in DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG.CLASS and
     DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG.OPTIONS
+    :param token_config: configuration to use instead of the setting (e.g., of a token policy)
     :return:
     """
     # by default, we are using the String Token Generator
@@ -17,7 +21,9 @@ def get_token_generator():
     options = {}
 
     # get the settings object
-    DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG = getattr(settings, 'DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG', None)
+    DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG = token_config
+    if DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG is None:
+        DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG = getattr(settings, 'DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG', None)
 
     # check if something is in the settings object, and work with it
     if DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG:
@@ -35,12 +41,37 @@ def get_token_generator():
     return token_class(**options)
 
 
+def _random_below_many(count, upper):
+    """
+    Returns count uniformly distributed random integers in [0, upper). The random bytes of all of them are drawn with a
+    single os.urandom call; samples outside of the range are rejected (less than half of them) and drawn again.
+    """
+    if upper <= 1:
+        return [0] * count
+
+    bits = (upper - 1).bit_length()
+    size = (bits + 7) // 8
+    mask = (1 << bits) - 1
+    numbers = []
+
+    while len(numbers) < count:
+        buffer = os.urandom(size * (count - len(numbers)))
+        for offset in range(0, len(buffer), size):
+            number = int.from_bytes(buffer[offset:offset + size], 'big') & mask
+            if number < upper:
+                numbers.append(number)
+
+    return numbers
+
+
 class BaseTokenGenerator:
     """
     Base Class for the Token Generators
 
     - Can take arbitrary args/kwargs and work with those
     - Needs to implement the "generate_token" Method
+    - May implement "generate_tokens" (used when tokens are created in bulk) natively; by default it calls
+      "generate_token" for each token
     """
     def __init__(self, *args, **kwargs):
         pass
@@ -48,10 +79,14 @@ class BaseTokenGenerator:
     def generate_token(self, *args, **kwargs):
         raise NotImplementedError
 
+    def generate_tokens(self, n, *args, **kwargs):
+        """ generates a list of n tokens """
+        return [self.generate_token(*args, **kwargs) for _ in range(n)]
+
 
 class RandomStringTokenGenerator(BaseTokenGenerator):
     """
-    Generates a random string with min and max length using os.urandom and binascii.hexlify
+    Generates a random hex string with min and max length using the secrets module
     """
 
     def __init__(self, min_length=10, max_length=50, *args, **kwargs):
@@ -59,19 +94,32 @@ class RandomStringTokenGenerator(BaseTokenGenerator):
         self.max_length = max_length
 
     def generate_token(self, *args, **kwargs):
-        """ generates a pseudo random code using os.urandom and binascii.hexlify """
+        """ generates a random hex string using secrets.token_hex """
         # determine the length based on min_length and max_length
-        length = random.randint(self.min_length, self.max_length)
+        length = self.min_length + secrets.randbelow(self.max_length - self.min_length + 1)
 
-        # generate the token using os.urandom and hexlify
-        return binascii.hexlify(
-            os.urandom(self.max_length)
-        ).decode()[0:length]
+        # every random byte gives two hex characters
+        return secrets.token_hex((length + 1) // 2)[:length]
+
+    def generate_tokens(self, n, *args, **kwargs):
+        """ generates n random hex strings from a single os.urandom buffer """
+        lengths = [
+            self.min_length + offset
+            for offset in _random_below_many(n, self.max_length - self.min_length + 1)
+        ]
+        hex_string = os.urandom(sum((length + 1) // 2 for length in lengths)).hex()
+
+        tokens = []
+        start = 0
+        for length in lengths:
+            tokens.append(hex_string[start:start + length])
+            start += (length + 1) // 2 * 2
+        return tokens
 
 
 class RandomNumberTokenGenerator(BaseTokenGenerator):
     """
-    Generates a random number using random.SystemRandom() (which uses urandom in the background)
+    Generates a random number using the secrets module (which uses urandom in the background)
 
     .. warning::
         Numeric tokens have a much smaller search space than the default string tokens. The default
@@ -86,7 +134,109 @@ class RandomNumberTokenGenerator(BaseTokenGenerator):
         self.max_number = max_number
 
     def generate_token(self, *args, **kwargs):
-        r = random.SystemRandom()
+        # generate a random number between min_number and max_number (inclusive)
+        return str(self.min_number + secrets.randbelow(self.max_number - self.min_number + 1))
+
+    def generate_tokens(self, n, *args, **kwargs):
+        """ generates n random numbers from a single os.urandom buffer """
+        return [
+            str(self.min_number + number)
+            for number in _random_below_many(n, self.max_number - self.min_number + 1)
+        ]
+
 
-        # generate a random number between min_number and max_number
-        return str(r.randint(self.min_number, self.max_number))
+class SignedTokenGenerator(BaseTokenGenerator):
+    """
+    Generates stateless tokens that embed the user id and a timestamp and are signed with an HMAC, in the style of
+    Django's PasswordResetTokenGenerator
+
+    The signature covers the user's password hash, last login and email, so a token becomes invalid as soon as the
+    password was changed. No token needs to be stored; use it via
+    ``django_rest_passwordreset.backends.SignedTokenBackend``.
+    """
+    key_salt = "django_rest_passwordreset.tokens.SignedTokenGenerator"
+    # tokens embed the number of seconds since this date
+    epoch = datetime(2001, 1, 1, tzinfo=dt_timezone.utc)
+
+    def __init__(self, secret=None, algorithm='sha256', *args, **kwargs):
+        self.secret = secret
+        self.algorithm = algorithm
+
+    def _get_secrets(self):
+        if self.secret is not None:
+            return [self.secret]
+        return [settings.SECRET_KEY] + list(getattr(settings, 'SECRET_KEY_FALLBACKS', []))
+
+    def _now(self):
+        return datetime.now(tz=dt_timezone.utc)
+
+    def _make_hash_value(self, user, timestamp):
+        login_timestamp = '' if user.last_login is None else user.last_login.replace(microsecond=0, tzinfo=None)
+        email = getattr(user, user.get_email_field_name(), '') or ''
+        return '{}{}{}{}{}'.format(user.pk, user.password, login_timestamp, timestamp, email)
+
+    def _make_signature(self, user, timestamp, secret):
+        return salted_hmac(
+            self.key_salt,
+            self._make_hash_value(user, timestamp),
+            secret=secret,
+            algorithm=self.algorithm,
+        ).hexdigest()[::2]
+
+    def generate_token(self, user=None, *args, **kwargs):
+        if user is None:
+            raise ValueError(
+                "SignedTokenGenerator needs a user, use it via django_rest_passwordreset.backends.SignedTokenBackend"
+            )
+        return self.make_token(user)
+
+    def make_token(self, user):
+        """ returns a signed token for the user """
+        timestamp = int((self._now() - self.epoch).total_seconds())
+        return '{}-{}-{}'.format(
+            urlsafe_base64_encode(force_bytes(user.pk)),
+            int_to_base36(timestamp),
+            self._make_signature(user, timestamp, self._get_secrets()[0]),
+        )
+
+    def parse_token(self, token):
+        """
+        Returns the user id and the creation time embedded in the token, without checking the signature
+        :return: tuple (user_id, created_at) or None if the token is malformed
+        """
+        try:
+            uidb64, timestamp_b36, signature = str(token).rsplit('-', 2)
+            user_id = force_str(urlsafe_base64_decode(uidb64))
+            timestamp = base36_to_int(timestamp_b36)
+        except (TypeError, ValueError, UnicodeDecodeError, OverflowError):
+            return None
+        return user_id, self.epoch + timedelta(seconds=timestamp)
+
+    def check_token(self, user, token, max_age=None):
+        """
+        Checks that the token was generated for the user with the user's current password and is at most max_age
+        seconds old
+        """
+        if not user or not token:
+            return False
+
+        try:
+            uidb64, timestamp_b36, signature = str(token).rsplit('-', 2)
+            timestamp = base36_to_int(timestamp_b36)
+        except ValueError:
+            return False
+
+        if uidb64 != urlsafe_base64_encode(force_bytes(user.pk)):
+            return False
+
+        if not any(
+            constant_time_compare(self._make_signature(user, timestamp, secret), signature)
+            for secret in self._get_secrets()
+        ):
+            return False
+
+        age = (self._now() - self.epoch).total_seconds() - timestamp
+        if max_age is not None and age > max_age:
+            return False
+
+        return True
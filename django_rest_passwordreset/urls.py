@@ -1,14 +1,18 @@
 """ URL Configuration for core auth """
 from django.urls import path
 
-from django_rest_passwordreset.views import ResetPasswordConfirmViewSet, ResetPasswordRequestTokenViewSet, \
-    ResetPasswordValidateTokenViewSet, reset_password_confirm, reset_password_request_token, \
-    reset_password_validate_token
+from django_rest_passwordreset.views import ResetPasswordBulkRequestTokenViewSet, ResetPasswordConfirmViewSet, \
+    ResetPasswordRequestTokenViewSet, ResetPasswordValidateTokenViewSet, reset_password_confirm, \
+    reset_password_request_token, reset_password_validate_token
 
 app_name = 'password_reset'
 
 
-def add_reset_password_urls_to_router(router, base_path=''):
+def add_reset_password_urls_to_router(router, base_path='', bulk=False):
+    """
+    Registers the ViewSets of the endpoints; the bulk request-token endpoint (staff users only) is only registered
+    (as base_path + "/bulk") if bulk is set
+    """
     router.register(
         base_path + "/validate_token",
         ResetPasswordValidateTokenViewSet,
@@ -19,6 +23,12 @@ def add_reset_password_urls_to_router(router, base_path=''):
         ResetPasswordConfirmViewSet,
         basename='reset-password-confirm'
     )
+    if bulk:
+        router.register(
+            base_path + "/bulk",
+            ResetPasswordBulkRequestTokenViewSet,
+            basename='reset-password-bulk-request'
+        )
     router.register(
         base_path,
         ResetPasswordRequestTokenViewSet,
@@ -0,0 +1,169 @@
+import hashlib
+import secrets
+
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from django_rest_passwordreset.settings import password_reset_settings
+
+
+__all__ = [
+    'TokenValidationCache',
+    'get_validation_cache',
+    'invalidate_validation_cache_for_user',
+    'invalidate_validation_cache_for_users',
+    'ainvalidate_validation_cache_for_user',
+]
+
+
+def get_validation_cache():
+    """
+    Returns the cache for the results of the validate-token endpoint based on the configuration in
+    DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE.CLASS and DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE.OPTIONS
+    :return: validation cache instance, or None if the setting is not set (Default)
+    """
+    cache_config = password_reset_settings.VALIDATION_CACHE_CONFIG
+    if cache_config is None:
+        return None
+
+    cache_class = TokenValidationCache
+    options = {}
+
+    if "CLASS" in cache_config:
+        cache_class = cache_config["CLASS"]
+        if isinstance(cache_class, str):
+            cache_class = import_string(cache_class)
+
+    if "OPTIONS" in cache_config:
+        options = cache_config["OPTIONS"]
+
+    return cache_class(**options)
+
+
+def invalidate_validation_cache_for_user(user_id):
+    """
+    Removes the cached validation results of all tokens of the user (if the validation cache is enabled)
+    """
+    validation_cache = password_reset_settings.VALIDATION_CACHE
+    if validation_cache is not None:
+        validation_cache.invalidate_user(user_id)
+
+
+def invalidate_validation_cache_for_users(user_ids):
+    """
+    Removes the cached validation results of all tokens of the users (if the validation cache is enabled)
+    """
+    validation_cache = password_reset_settings.VALIDATION_CACHE
+    if validation_cache is not None:
+        validation_cache.invalidate_users(user_ids)
+
+
+async def ainvalidate_validation_cache_for_user(user_id):
+    """
+    Async variant of invalidate_validation_cache_for_user
+    """
+    validation_cache = password_reset_settings.VALIDATION_CACHE
+    if validation_cache is not None:
+        await validation_cache.ainvalidate_user(user_id)
+
+
+class TokenValidationCache:
+    """
+    Caches the result of validating a token, keyed by the SHA-256 digest of the token
+
+    A valid token is cached with its expiry time, user id and (optionally) user details for at most ``timeout`` seconds
+    and never beyond the expiry of the token, so expired tokens do not need to be invalidated. An invalid token is
+    cached for ``negative_timeout`` seconds, so repeated lookups of the same invalid token do not reach the token
+    backend. Valid tokens are bound to the current generation of their user, a random value that is dropped once the
+    password was reset or a token of the user was deleted, which invalidates all cached tokens of the user at once.
+    """
+
+    def __init__(self, cache_alias='default', timeout=60, negative_timeout=10,
+                 key_prefix='django-rest-passwordreset-validation', *args, **kwargs):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _token_cache_key(self, key):
+        return '{prefix}:token:{digest}'.format(
+            prefix=self.key_prefix,
+            digest=hashlib.sha256(str(key).encode()).hexdigest(),
+        )
+
+    def _generation_cache_key(self, user_id):
+        return '{prefix}:generation:{user_id}'.format(prefix=self.key_prefix, user_id=user_id)
+
+    def _get_generation(self, user_id):
+        # cache.add() is atomic, so concurrent requests of the same user agree on the generation
+        generation_key = self._generation_cache_key(user_id)
+        new_generation = secrets.token_hex(16)
+        if self.cache.add(generation_key, new_generation, self.timeout):
+            return new_generation
+
+        generation = self.cache.get(generation_key)
+        if generation is None:
+            # invalidated in the meantime, so the new entry is invalid as well
+            return new_generation
+        # the generation must not expire before the new entry
+        self.cache.touch(generation_key, self.timeout)
+        return generation
+
+    def get(self, key):
+        """
+        Returns the cached validation result of the token
+        :return: {'valid': True, 'user_id': ..., 'created_at': ..., 'expires_at': ..., 'user_details': ...} for a
+            valid token, {'valid': False} for an invalid token, or None if nothing is cached
+        """
+        entry = self.cache.get(self._token_cache_key(key))
+        if entry is None or not entry['valid']:
+            return entry
+        if entry['expires_at'] <= timezone.now():
+            return None
+        if entry.get('generation') != self.cache.get(self._generation_cache_key(entry['user_id'])):
+            # the cached tokens of the user were invalidated
+            return None
+        return entry
+
+    def set_valid(self, reset_password_token, user_details=None):
+        """
+        Caches a valid token
+        :return: the cached entry
+        """
+        expires_at = reset_password_token.expires_at
+        entry = {
+            'valid': True,
+            'user_id': reset_password_token.user_id,
+            'created_at': reset_password_token.created_at,
+            'expires_at': expires_at,
+            'user_details': user_details,
+        }
+
+        timeout = min(self.timeout, (expires_at - timezone.now()).total_seconds())
+        if timeout <= 0 or reset_password_token.remaining_uses is not None:
+            # every use of a token with a maximum number of uses has to be counted by the backend
+            return entry
+
+        entry['generation'] = self._get_generation(reset_password_token.user_id)
+        self.cache.set(self._token_cache_key(reset_password_token.key), entry, timeout)
+        return entry
+
+    def set_invalid(self, key):
+        """ caches an invalid token """
+        self.cache.set(self._token_cache_key(key), {'valid': False}, self.negative_timeout)
+
+    def invalidate_user(self, user_id):
+        """ removes the cached validation results of all tokens of the user """
+        self.cache.delete(self._generation_cache_key(user_id))
+
+    def invalidate_users(self, user_ids):
+        """ removes the cached validation results of all tokens of the users """
+        self.cache.delete_many([self._generation_cache_key(user_id) for user_id in user_ids])
+
+    async def ainvalidate_user(self, user_id):
+        await self.cache.adelete(self._generation_cache_key(user_id))
@@ -1,24 +1,34 @@
+import time
 import unicodedata
-from datetime import timedelta
+from collections import defaultdict
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.auth.password_validation import validate_password, get_password_validators
-from django.core.exceptions import ValidationError
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from django.db.models.functions import Lower
 from django.http import Http404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions
 from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from django_rest_passwordreset.models import ResetPasswordToken, clear_expired, get_password_reset_token_expiry_time, \
-    get_password_reset_lookup_field
-from django_rest_passwordreset.serializers import EmailSerializer, INVALID_TOKEN_ERROR, PasswordTokenSerializer, \
-    ResetTokenSerializer
-from django_rest_passwordreset.signals import reset_password_token_created, pre_password_reset, post_password_reset
-from django_rest_passwordreset.throttling import get_password_reset_request_token_throttle_classes
+from django_rest_passwordreset.dispatch import run_in_background
+from django_rest_passwordreset.guess_budget import GuessBudgetMixin
+from django_rest_passwordreset.hashing import hash_password
+from django_rest_passwordreset.instrumentation import measure
+from django_rest_passwordreset.models import filter_eligible_for_reset, get_password_reset_lookup_field, \
+    get_password_reset_token_expiry
+from django_rest_passwordreset.serializers import BulkEmailSerializer, EmailSerializer, INVALID_TOKEN_ERROR, \
+    PasswordTokenSerializer, ResetTokenSerializer, TokenSerializer, get_valid_token
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.signals import pre_password_reset, post_password_reset
+from django_rest_passwordreset.throttling import get_password_reset_confirm_throttle_classes, \
+    get_password_reset_request_token_throttle_classes, get_password_reset_validate_token_throttle_classes
+from django_rest_passwordreset.validation_cache import invalidate_validation_cache_for_user
 
 User = get_user_model()
 
@@ -26,17 +36,20 @@ __all__ = [
     'ResetPasswordValidateToken',
     'ResetPasswordConfirm',
     'ResetPasswordRequestToken',
+    'ResetPasswordBulkRequestToken',
     'reset_password_validate_token',
     'reset_password_confirm',
     'reset_password_request_token',
+    'reset_password_bulk_request_token',
     'ResetPasswordValidateTokenViewSet',
     'ResetPasswordConfirmViewSet',
-    'ResetPasswordRequestTokenViewSet'
+    'ResetPasswordRequestTokenViewSet',
+    'ResetPasswordBulkRequestTokenViewSet',
+    'generate_token_for_email',
+    'generate_tokens_for_emails',
+    'reset_password_with_token',
 ]
 
-HTTP_USER_AGENT_HEADER = getattr(settings, 'DJANGO_REST_PASSWORDRESET_HTTP_USER_AGENT_HEADER', 'HTTP_USER_AGENT')
-HTTP_IP_ADDRESS_HEADER = getattr(settings, 'DJANGO_REST_PASSWORDRESET_IP_ADDRESS_HEADER', 'REMOTE_ADDR')
-
 
 def _unicode_ci_compare(s1, s2):
     """
@@ -54,28 +67,72 @@ def clear_expired_tokens():
     """
     Delete all existing expired tokens
     """
-    password_reset_token_validation_time = get_password_reset_token_expiry_time()
-
     # datetime.now minus expiry hours
-    now_minus_expiry_time = timezone.now() - timedelta(hours=password_reset_token_validation_time)
+    now_minus_expiry_time = timezone.now() - get_password_reset_token_expiry()
 
     # delete all tokens where created_at < now - 24 hours
-    clear_expired(now_minus_expiry_time)
+    password_reset_settings.TOKEN_BACKEND.clear_expired(now_minus_expiry_time)
 
 
-def generate_token_for_email(email, user_agent='', ip_address=''):
-    # find a user by email address (case-insensitive search)
-    users = User.objects.filter(**{'{}__iexact'.format(get_password_reset_lookup_field()): email})
+def clear_expired_tokens_if_due():
+    """
+    Delete all existing expired tokens if the configured cleanup strategy decides that a cleanup is due
+    (see DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY)
+    :return: True if expired tokens were cleared
+    """
+    return password_reset_settings.CLEANUP_STRATEGY.maybe_clear(clear_expired_tokens)
+
+
+def get_response_time_budget():
+    """
+    Returns the fixed response time (in seconds) of the request-token endpoint, or None if the constant-time mode is
+    disabled (Default)
+    Set Django SETTINGS.DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET to enable it
+    :return: response time budget in seconds or None
+    """
+    # validated by password_reset_settings (must not be negative)
+    budget = password_reset_settings.RESPONSE_TIME_BUDGET
+    if budget is None:
+        return None
+
+    if not password_reset_settings.NO_INFORMATION_LEAKAGE:
+        raise ImproperlyConfigured(
+            "DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET requires DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE"
+        )
+    return budget
+
+
+def get_user_queryset_for_email(email, backend):
+    """
+    Returns the users whose lookup field matches the email address (case-insensitive search)
+    Users that are not active or whose password can not be changed (is not usable, e.g., LDAP users) are filtered in
+    SQL, and the backend may fetch an existing token of each user in the same query
+    """
+    return backend.prepare_user_queryset(filter_eligible_for_reset(
+        User.objects.filter(**{password_reset_settings.LOOKUP_FIELD_IEXACT: email})
+    ))
+
 
+def select_user_for_email(users, email):
+    """
+    Picks the user a token is generated for from the users returned by get_user_queryset_for_email
+    :return: the first user that is eligible for a reset and whose lookup field matches the email address (unicode
+        case-insensitive), or None
+    :raises ValidationError: if no user is eligible for a reset and DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE
+        is disabled
+    """
+    lookup_field = get_password_reset_lookup_field()
     active_user_found = False
 
-    # iterate over all users and check if there is any user that is active
-    # also check whether the password can be changed (is usable), as there could be users that are not allowed
-    # to change their password (e.g., LDAP user)
+    # iterate once over all users: check if there is any user that is active and can change the password, and pick
+    # the first of those users whose lookup field matches the email address (unicode case-insensitive)
     for user in users:
-        if user.eligible_for_reset():
-            active_user_found = True
-            break
+        if not user.eligible_for_reset():
+            continue
+
+        active_user_found = True
+        if _unicode_ci_compare(email, getattr(user, lookup_field)):
+            return user
 
     # No active user found.
     #
@@ -88,34 +145,120 @@ def generate_token_for_email(email, user_agent='', ip_address=''):
     # That behavior is retained only as an explicit opt-in and is deprecated; it will be removed in a
     # future major release.
     if not active_user_found:
-        no_information_leakage = getattr(settings, 'DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE', True)
-        if no_information_leakage:
-            return None
-        raise exceptions.ValidationError({
-            'email': [_(
-                "We couldn't find an account associated with that email. Please try a different e-mail address.")],
-        })
+        if not password_reset_settings.NO_INFORMATION_LEAKAGE:
+            raise exceptions.ValidationError({
+                'email': [_(
+                    "We couldn't find an account associated with that email. Please try a different e-mail address.")],
+            })
+
+    return None
 
-    # last but not least: iterate over all users that are active and can change their password
-    # and create a Reset Password Token and send a signal with the created token
+
+def generate_token_for_email(email, user_agent='', ip_address=''):
+    backend = password_reset_settings.TOKEN_BACKEND
+
+    with measure('request_token', 'lookup_user'):
+        matching_user = select_user_for_email(get_user_queryset_for_email(email, backend), email)
+    if matching_user is None:
+        return None
+
+    # check if the user already has a token
+    with measure('request_token', 'get_existing_token'):
+        reset_password_token = backend.get_token_for_user(matching_user)
+    if reset_password_token is not None:
+        # yes, already has a token, re-use this token
+        return reset_password_token
+
+    # no token exists, generate a new token
+    with measure('request_token', 'create_token'):
+        return backend.create_token(
+            matching_user,
+            user_agent=user_agent,
+            ip_address=ip_address.split(",")[0],
+        )
+
+
+def generate_tokens_for_emails(emails, user_agent='', ip_address=''):
+    """
+    Bulk variant of generate_token_for_email: the users of all email addresses are looked up with one query (together
+    with their existing tokens, depending on the backend), existing tokens are re-used and the missing tokens are
+    created in bulk. Unknown email addresses are skipped (no ValidationError is raised).
+    :return: dict mapping each email address a token was generated (or re-used) for to the token; email addresses of
+        the same user map to the same token
+    """
+    backend = password_reset_settings.TOKEN_BACKEND
+    lookup_field = get_password_reset_lookup_field()
+
+    # remove duplicates, keeping the order
+    emails = list(dict.fromkeys(emails))
+    if not emails:
+        return {}
+
+    # find the users of all email addresses with a single (case-insensitive) IN query
+    users = backend.prepare_user_queryset(filter_eligible_for_reset(
+        User.objects.annotate(password_reset_lookup=Lower(lookup_field)).filter(
+            password_reset_lookup__in={email.lower() for email in emails}
+        )
+    ))
+
+    users_by_lookup = defaultdict(list)
     for user in users:
-        if user.eligible_for_reset() and _unicode_ci_compare(email, getattr(user, get_password_reset_lookup_field())):
-            password_reset_tokens = user.password_reset_tokens.all()
-
-            # check if the user already has a token
-            if password_reset_tokens.count():
-                # yes, already has a token, re-use this token
-                return password_reset_tokens.first()
-
-            # no token exists, generate a new token
-            return ResetPasswordToken.objects.create(
-                user=user,
-                user_agent=user_agent,
-                ip_address=ip_address.split(",")[0],
-            )
+        if user.eligible_for_reset():
+            users_by_lookup[getattr(user, lookup_field).lower()].append(user)
+
+    # pick the first user whose lookup field matches the email address (unicode case-insensitive)
+    users_by_email = {}
+    for email in emails:
+        for user in users_by_lookup.get(email.lower(), ()):
+            if _unicode_ci_compare(email, getattr(user, lookup_field)):
+                users_by_email[email] = user
+                break
+
+    matching_users = list({user.pk: user for user in users_by_email.values()}.values())
+    tokens = backend.get_tokens_for_users(matching_users)
 
+    users_without_token = [user for user in matching_users if user.pk not in tokens]
+    if users_without_token:
+        for token in backend.create_tokens(
+            users_without_token,
+            user_agent=user_agent,
+            ip_address=ip_address.split(",")[0],
+        ):
+            tokens[token.user.pk] = token
 
-class ResetPasswordValidateToken(GenericAPIView):
+    return {email: tokens[user.pk] for email, user in users_by_email.items()}
+
+
+def reset_password_with_token(reset_password_token, password, backend=None):
+    """
+    Hashes the new password, then counts a use of the token (see remaining_uses), claims it, sets the hashed password of
+    its user and deletes all tokens of the user within one transaction; call it once the password passed the password
+    validators, so a rejected password does not use up the token.
+    The password is hashed before the transaction, so waiting for the password hashing thread pool does not hold the
+    lock of the claimed token and a database connection. Of several concurrent calls with the same token, only one
+    succeeds; the hashes of the others are discarded.
+    :raises Http404: if the token was already used (up)
+    """
+    backend = backend or password_reset_settings.TOKEN_BACKEND
+    user = reset_password_token.user
+
+    with measure('confirm', 'hash_password'):
+        encoded_password = hash_password(password)
+
+    with transaction.atomic():
+        if not backend.use_token(reset_password_token) or not backend.claim_token(reset_password_token):
+            raise Http404(INVALID_TOKEN_ERROR)
+
+        # like user.set_password(password): the password validators are notified (password_changed) on save
+        user.password = encoded_password
+        user._password = password
+        user.save()
+
+        # Delete all password reset tokens for this user
+        backend.delete_tokens_for_user(user)
+
+
+class ResetPasswordValidateToken(GuessBudgetMixin, GenericAPIView):
     """
     An Api View which provides a method to verify that a token is valid
     """
@@ -124,22 +267,72 @@ class ResetPasswordValidateToken(GenericAPIView):
     authentication_classes = ()
     throttle_scope = 'django-rest-passwordreset-validate-token'
 
+    def get_throttles(self):
+        throttle_classes = get_password_reset_validate_token_throttle_classes()
+        if throttle_classes is None:
+            return super().get_throttles()
+        return [throttle_class() for throttle_class in throttle_classes]
+
     def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(data=request.data)
+        validation_cache = password_reset_settings.VALIDATION_CACHE
+        if validation_cache is not None:
+            return self.post_cached(request, validation_cache)
+
+        serializer = self.serializer_class(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
 
         return_data = {'status': 'OK'}
 
-        if getattr(settings, 'DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION', False):
-            token = ResetPasswordToken.objects.get(key=serializer.validated_data['token'])
+        if password_reset_settings.USER_DETAILS_ON_VALIDATION:
+            token = serializer.validated_data['reset_password_token']
 
             return_data['username'] = token.user.username
             return_data['email'] = token.user.email
 
         return Response(return_data)
 
+    def post_cached(self, request, validation_cache):
+        """
+        Validates the token using the validation cache (see DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE)
+        """
+        serializer = TokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        key = serializer.validated_data['token']
+
+        user_details_on_validation = password_reset_settings.USER_DETAILS_ON_VALIDATION
 
-class ResetPasswordConfirm(GenericAPIView):
+        entry = validation_cache.get(key)
+        if entry is not None and not entry['valid']:
+            raise Http404(INVALID_TOKEN_ERROR)
+
+        guess_budget = password_reset_settings.GUESS_BUDGET
+        if entry is not None and guess_budget is not None and not guess_budget.check_token(
+            entry['created_at'], guess_budget.get_ident(request)
+        ):
+            # the client failed too many guesses while the token was outstanding; get_valid_token deletes the token
+            entry = None
+
+        if entry is None or (user_details_on_validation and entry['user_details'] is None):
+            try:
+                token = get_valid_token(key, request=request)
+            except Http404:
+                validation_cache.set_invalid(key)
+                raise
+
+            user_details = None
+            if user_details_on_validation:
+                user_details = {'username': token.user.username, 'email': token.user.email}
+            entry = validation_cache.set_valid(token, user_details)
+
+        return_data = {'status': 'OK'}
+
+        if user_details_on_validation:
+            return_data.update(entry['user_details'])
+
+        return Response(return_data)
+
+
+class ResetPasswordConfirm(GuessBudgetMixin, GenericAPIView):
     """
     An Api View which provides a method to reset a password based on a unique token
     """
@@ -148,47 +341,58 @@ class ResetPasswordConfirm(GenericAPIView):
     authentication_classes = ()
     throttle_scope = 'django-rest-passwordreset-confirm'
 
+    def get_throttles(self):
+        throttle_classes = get_password_reset_confirm_throttle_classes()
+        if throttle_classes is None:
+            return super().get_throttles()
+        return [throttle_class() for throttle_class in throttle_classes]
+
     def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        serializer = self.serializer_class(data=request.data, context={'request': request})
+        with measure('confirm', 'validate_token'):
+            serializer.is_valid(raise_exception=True)
         password = serializer.validated_data['password']
-        token = serializer.validated_data['token']
+        # the token (and its user) was already looked up by the serializer
+        reset_password_token = serializer.validated_data['reset_password_token']
 
-        # find token
-        reset_password_token = ResetPasswordToken.objects.filter(key=token).first()
+        backend = password_reset_settings.TOKEN_BACKEND
 
-        if reset_password_token is None or not reset_password_token.user.eligible_for_reset():
+        with measure('confirm', 'check_eligibility'):
+            eligible = reset_password_token.user.eligible_for_reset()
+        if not eligible:
             raise Http404(INVALID_TOKEN_ERROR)
 
         # change user's password after token and eligibility checks
-        pre_password_reset.send(
-            sender=self.__class__,
-            user=reset_password_token.user,
-            reset_password_token=reset_password_token,
-        )
-        try:
-            # validate the password against existing validators
-            validate_password(
-                password,
+        with measure('confirm', 'pre_password_reset'):
+            pre_password_reset.send(
+                sender=self.__class__,
                 user=reset_password_token.user,
-                password_validators=get_password_validators(settings.AUTH_PASSWORD_VALIDATORS)
+                reset_password_token=reset_password_token,
             )
+        try:
+            # validate the password against existing validators (AUTH_PASSWORD_VALIDATORS are instantiated only once by
+            # django, so e.g. CommonPasswordValidator does not load its password list on every request)
+            with measure('confirm', 'validate_password'):
+                validate_password(password, user=reset_password_token.user)
         except ValidationError as e:
             # raise a validation error for the serializer
             raise exceptions.ValidationError({
                 'password': e.messages
             })
 
-        reset_password_token.user.set_password(password)
-        reset_password_token.user.save()
-        post_password_reset.send(
-            sender=self.__class__,
-            user=reset_password_token.user,
-            reset_password_token=reset_password_token,
-        )
+        # the use of the token is counted here (a rejected password does not use it up); only one concurrent request
+        # with the same token gets past this point
+        with measure('confirm', 'reset_password'):
+            reset_password_with_token(reset_password_token, password, backend)
+        with measure('confirm', 'invalidate_validation_cache'):
+            invalidate_validation_cache_for_user(reset_password_token.user.pk)
 
-        # Delete all password reset tokens for this user
-        ResetPasswordToken.objects.filter(user=reset_password_token.user).delete()
+        with measure('confirm', 'post_password_reset'):
+            post_password_reset.send(
+                sender=self.__class__,
+                user=reset_password_token.user,
+                reset_password_token=reset_password_token,
+            )
 
         return Response({'status': 'OK'})
 
@@ -212,25 +416,89 @@ class ResetPasswordRequestToken(GenericAPIView):
         ]
 
     def post(self, request, *args, **kwargs):
+        started_at = time.monotonic()
+
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        clear_expired_tokens()
+        email = serializer.validated_data['email']
+        user_agent = request.META.get(password_reset_settings.HTTP_USER_AGENT_HEADER, '')
+        ip_address = request.META.get(password_reset_settings.IP_ADDRESS_HEADER, '')
+
+        budget = get_response_time_budget()
+        if budget is None:
+            self.process_request(email, user_agent, ip_address)
+        else:
+            # constant-time mode: the response neither depends on nor waits for the work done for known emails (token
+            # creation and signal dispatch), and is sent once the fixed budget has elapsed
+            run_in_background(self.process_request, email, user_agent, ip_address)
+            remaining = budget - (time.monotonic() - started_at)
+            if remaining > 0:
+                time.sleep(remaining)
+
+        return Response({'status': 'OK'})
+
+    def process_request(self, email, user_agent, ip_address):
+        """
+        Clears expired tokens (if due), generates a token for the email address and sends the
+        reset_password_token_created signal
+        """
+        with measure('request_token', 'clear_expired'):
+            clear_expired_tokens_if_due()
         token = generate_token_for_email(
-            email=serializer.validated_data['email'],
-            user_agent=request.META.get(HTTP_USER_AGENT_HEADER, ''),
-            ip_address=request.META.get(HTTP_IP_ADDRESS_HEADER, ''),
+            email=email,
+            user_agent=user_agent,
+            ip_address=ip_address,
         )
 
         if token:
             # send a signal that the password token was created
             # let whoever receives this signal handle sending the email for the password reset
-            reset_password_token_created.send(
+            # (see DJANGO_REST_PASSWORDRESET_DISPATCHER for sending it out of band)
+            with measure('request_token', 'dispatch'):
+                password_reset_settings.DISPATCHER.dispatch(
+                    sender=self.__class__,
+                    instance=self, reset_password_token=token
+                )
+
+
+class ResetPasswordBulkRequestToken(GenericAPIView):
+    """
+    An Api View which provides a method for staff users to request password reset tokens for a list of e-mail
+    addresses (e.g., to reset the passwords of a whole tenant)
+
+    Sends the signal reset_password_tokens_created once for all tokens if it has receivers, otherwise the signal
+    reset_password_token_created for each token
+    """
+    permission_classes = (IsAdminUser,)
+    serializer_class = BulkEmailSerializer
+    throttle_scope = 'django-rest-passwordreset-bulk-request-token'
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        emails = serializer.validated_data['emails']
+
+        clear_expired_tokens_if_due()
+        tokens = generate_tokens_for_emails(
+            emails,
+            user_agent=request.META.get(password_reset_settings.HTTP_USER_AGENT_HEADER, ''),
+            ip_address=request.META.get(password_reset_settings.IP_ADDRESS_HEADER, ''),
+        )
+
+        # email addresses of the same user share a token
+        unique_tokens = list({token.key: token for token in tokens.values()}.values())
+        if unique_tokens:
+            password_reset_settings.DISPATCHER.dispatch_many(
                 sender=self.__class__,
-                instance=self, reset_password_token=token
+                instance=self, reset_password_tokens=unique_tokens
             )
 
-        return Response({'status': 'OK'})
+        return Response({
+            'status': 'OK',
+            'count': len(unique_tokens),
+            'not_found': [email for email in dict.fromkeys(emails) if email not in tokens],
+        })
 
 
 class ResetPasswordValidateTokenViewSet(ResetPasswordValidateToken, GenericViewSet):
@@ -262,6 +530,26 @@ class ResetPasswordRequestTokenViewSet(ResetPasswordRequestToken, GenericViewSet
         return super(ResetPasswordRequestTokenViewSet, self).post(request, *args, **kwargs)
 
 
+class ResetPasswordBulkRequestTokenViewSet(ResetPasswordBulkRequestToken, GenericViewSet):
+    """
+    An Api ViewSet which provides a method for staff users to request password reset tokens for a list of e-mail
+    addresses
+    """
+
+    def create(self, request, *args, **kwargs):
+        return super(ResetPasswordBulkRequestTokenViewSet, self).post(request, *args, **kwargs)
+
+
 reset_password_validate_token = ResetPasswordValidateToken.as_view()
 reset_password_confirm = ResetPasswordConfirm.as_view()
 reset_password_request_token = ResetPasswordRequestToken.as_view()
+reset_password_bulk_request_token = ResetPasswordBulkRequestToken.as_view()
+
+
+def __getattr__(name):
+    # HTTP_USER_AGENT_HEADER and HTTP_IP_ADDRESS_HEADER used to be read from the settings when this module was imported
+    if name == 'HTTP_USER_AGENT_HEADER':
+        return password_reset_settings.HTTP_USER_AGENT_HEADER
+    if name == 'HTTP_IP_ADDRESS_HEADER':
+        return password_reset_settings.IP_ADDRESS_HEADER
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
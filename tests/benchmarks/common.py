@@ -0,0 +1,97 @@
+"""
+Shared setup of the benchmarks: django with the settings of the test suite (tests/settings.py, or e.g.
+DJANGO_SETTINGS_MODULE=settings_postgres) and a temporary test database
+"""
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    # like tests/manage.py
+    sys.path.insert(0, TESTS_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Creates a test database for the duration of the benchmark. SQLite uses a temporary database file (with IMMEDIATE
+    transactions), so requests can be sent from several threads.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    database_dir = None
+    if connection.vendor == 'sqlite':
+        database_dir = tempfile.mkdtemp()
+        connection.settings_dict['TEST']['NAME'] = os.path.join(database_dir, 'benchmark.sqlite3')
+        # concurrent writers wait for each other instead of failing with "database is locked"
+        connection.settings_dict['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=60)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if database_dir is not None:
+            shutil.rmtree(database_dir)
+        teardown_test_environment()
+
+
+def seed_users(count, batch_size=10000):
+    """
+    Creates count users (bench0 ... bench<count - 1>, with the email address bench<i>@mail.com) with bulk inserts
+    :return: list of the email addresses
+    """
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    User = get_user_model()
+    # hashing the password of every user would take longer than inserting them
+    password = make_password('secret')
+    emails = []
+
+    for start in range(0, count, batch_size):
+        users = [
+            User(username='bench{}'.format(i), email='bench{}@mail.com'.format(i), password=password)
+            for i in range(start, min(count, start + batch_size))
+        ]
+        User.objects.bulk_create(users)
+        emails.extend(user.email for user in users)
+
+    return emails
+
+
+def get_environment():
+    """ returns the versions and the commit the benchmark ran with """
+    import django
+    import rest_framework
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=TESTS_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'djangorestframework': rest_framework.VERSION,
+        'database': connection.vendor,
+    }
@@ -0,0 +1,92 @@
+"""
+Compares two JSON results of endpoints.py, e.g. of the main branch and of a pull request
+
+    python tests/benchmarks/endpoints.py --json baseline.json   # on the main branch
+    python tests/benchmarks/endpoints.py --json current.json    # on the pull request
+    python tests/benchmarks/compare.py baseline.json current.json [--threshold 10]
+
+A metric regressed if a latency percentile or the peak allocation grew by more than --threshold percent, if the mean
+number of queries grew at all, or if clear_expired deleted more than --threshold percent fewer rows per second. Exits
+with status 1 if any metric regressed.
+"""
+import argparse
+import json
+import sys
+
+# (metric, statistic) of every endpoint that are compared
+ENDPOINT_METRICS = [
+    ('latency_ms', 'p50'),
+    ('latency_ms', 'p90'),
+    ('latency_ms', 'p99'),
+    ('queries', 'mean'),
+    ('peak_alloc_kib', 'mean'),
+]
+
+
+def relative_change(baseline, current):
+    if not baseline:
+        return 0.0 if not current else float('inf')
+    return (current - baseline) / baseline * 100
+
+
+def compare(baseline, current, threshold):
+    """
+    :return: list of (name, baseline value, current value, change in percent, regressed) of the metrics of both results
+    """
+    rows = []
+
+    for endpoint, current_result in current['endpoints'].items():
+        baseline_result = baseline['endpoints'].get(endpoint)
+        if baseline_result is None:
+            continue
+
+        for metric, statistic in ENDPOINT_METRICS:
+            if metric not in baseline_result or metric not in current_result:
+                continue
+            old, new = baseline_result[metric][statistic], current_result[metric][statistic]
+            change = relative_change(old, new)
+            regressed = new > old if metric == 'queries' else change > threshold
+            rows.append(('{} {} {}'.format(endpoint, metric, statistic), old, new, change, regressed))
+
+    baseline_clear_expired = {(result['tokens'], result['mode']): result for result in baseline['clear_expired']}
+    for result in current['clear_expired']:
+        old_result = baseline_clear_expired.get((result['tokens'], result['mode']))
+        if old_result is None or not old_result['rows_per_second'] or not result['rows_per_second']:
+            continue
+        old, new = old_result['rows_per_second'], result['rows_per_second']
+        change = relative_change(old, new)
+        rows.append(('clear_expired {} {} rows/s'.format(result['tokens'], result['mode']), old, new, change,
+                     -change > threshold))
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline', help="JSON results of the baseline")
+    parser.add_argument('current', help="JSON results to compare with the baseline")
+    parser.add_argument('--threshold', type=float, default=10, help="Allowed change in percent (Default: 10)")
+    options = parser.parse_args()
+
+    with open(options.baseline) as baseline_file, open(options.current) as current_file:
+        baseline, current = json.load(baseline_file), json.load(current_file)
+
+    for label, results in (('baseline', baseline), ('current', current)):
+        environment = results['environment']
+        print("{:<8} {} ({}, django {}, python {})".format(
+            label, environment['commit'], environment['database'], environment['django'], environment['python'],
+        ))
+    if baseline['options'] != current['options']:
+        print("warning: the results were measured with different options")
+
+    rows = compare(baseline, current, options.threshold)
+    for name, old, new, change, regressed in rows:
+        print("{:<55} {:>12} {:>12} {:>+8.1f}% {}".format(name, old, new, change, "REGRESSED" if regressed else ""))
+
+    regressions = [row for row in rows if row[-1]]
+    print("{} of {} metrics regressed".format(len(regressions), len(rows)))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmarks the confirm endpoint (requests per second) with the validators of tests/settings.py (the default
+AUTH_PASSWORD_VALIDATORS of a new django project, including CommonPasswordValidator)
+
+    python tests/benchmarks/confirm.py [--requests 20] [--concurrency 1] [--hashing-workers 2] [--fast-hasher]
+
+Runs the same confirm requests
+ * with AUTH_PASSWORD_VALIDATORS instantiated on every request (the behaviour before django's cached validators were
+   used),
+ * with django's cached validators,
+ * with django's cached validators and DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS.
+
+The benchmark uses a temporary test database (see common.py), so requests can be sent from several threads.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from common import benchmark_database, setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.auth.password_validation import get_password_validators  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from django_rest_passwordreset.models import ResetPasswordToken  # noqa: E402
+
+User = get_user_model()
+
+
+def uncached_validators():
+    return get_password_validators(settings.AUTH_PASSWORD_VALIDATORS)
+
+
+def run_confirms(count, concurrency):
+    """
+    Creates count users with a token each and confirms all tokens
+    :return: requests per second
+    """
+    users = [
+        User.objects.create(username="bench-{}-{}".format(time.monotonic_ns(), i), email="bench{}@mail.com".format(i))
+        for i in range(count)
+    ]
+    tokens = [ResetPasswordToken.objects.create(user=user).key for user in users]
+    url = reverse('password_reset:reset-password-confirm')
+
+    def confirm(key):
+        try:
+            response = APIClient().post(url, {'token': key, 'password': 'correct-horse-battery'}, format='json')
+            assert response.status_code == 200, response.content
+        finally:
+            connections.close_all()
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(confirm, tokens))
+    return count / (time.perf_counter() - started_at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20, help="Number of confirm requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=1, help="Number of threads sending requests")
+    parser.add_argument('--hashing-workers', type=int, default=2,
+                        help="DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS of the last scenario")
+    parser.add_argument('--fast-hasher', action='store_true',
+                        help="Use the (insecure) MD5 hasher, so the cost of validating the password is not hidden by the "
+                             "cost of hashing it")
+    options = parser.parse_args()
+
+    if options.fast_hasher:
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    scenarios = [
+        ("validators instantiated per request", patch(
+            'django.contrib.auth.password_validation.get_default_password_validators', uncached_validators
+        )),
+        ("cached validators", override_settings()),
+        ("cached validators, {} hashing workers".format(options.hashing_workers), override_settings(
+            DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS=options.hashing_workers
+        )),
+    ]
+
+    with benchmark_database():
+        # warm up (imports, url resolver, cached validators)
+        run_confirms(1, 1)
+
+        print("{} confirm requests, {} concurrent, hasher {}".format(
+            options.requests, options.concurrency, settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1]
+        ))
+        for name, context in scenarios:
+            with context:
+                requests_per_second = run_confirms(options.requests, options.concurrency)
+            print("{:<45} {:8.2f} requests/s".format(name, requests_per_second))
+
+
+if __name__ == '__main__':
+    main()
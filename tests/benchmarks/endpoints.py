@@ -0,0 +1,245 @@
+"""
+Benchmarks the request-token, validate-token and confirm endpoints against a user table of realistic size, and
+clear_expired at several sizes of the token table
+
+    python tests/benchmarks/endpoints.py [--users 10000] [--requests 200] [--clear-expired-sizes 10000 100000]
+        [--fast-hasher] [--json results.json]
+
+    # on PostgreSQL (see tests/settings_postgres.py)
+    DJANGO_SETTINGS_MODULE=settings_postgres python tests/benchmarks/endpoints.py
+
+Reported per endpoint: latency percentiles, queries per request and the peak memory allocated per request (measured
+with tracemalloc in a separate pass, as tracing slows down the requests). clear_expired is measured with a token table
+of which half of the tokens are expired, once with a single DELETE and once in batches.
+
+With --json, the results are written as JSON, so runs of two commits can be compared with compare.py.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+from common import benchmark_database, get_environment, seed_users, setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from django_rest_passwordreset.backends import get_token_backend  # noqa: E402
+from django_rest_passwordreset.models import ResetPasswordToken, clear_expired  # noqa: E402
+
+User = get_user_model()
+
+ENDPOINTS = ['reset-password-request', 'reset-password-validate', 'reset-password-confirm']
+
+
+def percentile(values, percent):
+    """ nearest-rank percentile """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(values, digits=3):
+    return {
+        'p50': round(percentile(values, 50), digits),
+        'p90': round(percentile(values, 90), digits),
+        'p99': round(percentile(values, 99), digits),
+        'mean': round(sum(values) / len(values), digits),
+        'max': round(max(values), digits),
+    }
+
+
+def create_tokens(emails):
+    """ creates a token for each of the users with the given email addresses (in bulk) and returns the keys """
+    users = list(User.objects.filter(email__in=emails))
+    return [token.key for token in get_token_backend().create_tokens(users)]
+
+
+def prepare_requests(endpoint, emails):
+    """ returns the request data of one request per email address """
+    if endpoint == 'reset-password-request':
+        return [{'email': email} for email in emails]
+    if endpoint == 'reset-password-validate':
+        return [{'token': key} for key in create_tokens(emails)]
+    return [{'token': key, 'password': 'correct-horse-battery-staple'} for key in create_tokens(emails)]
+
+
+def send(client, url, data, index):
+    # every request comes from another client, like the requests of different users
+    response = client.post(url, data, format='json', REMOTE_ADDR='10.{}.{}.{}'.format(
+        index // 65536 % 256, index // 256 % 256, index % 256,
+    ))
+    assert response.status_code == 200, response.content
+
+
+def measure_latency_and_queries(url, requests):
+    client = APIClient()
+    latencies = []
+    queries = []
+
+    for index, data in enumerate(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started_at = time.perf_counter()
+            send(client, url, data, index)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+        queries.append(len(captured))
+
+    return {'latency_ms': summarize(latencies), 'queries': summarize(queries, digits=2)}
+
+
+def measure_allocations(url, requests):
+    client = APIClient()
+    peaks = []
+
+    tracemalloc.start()
+    try:
+        for index, data in enumerate(requests):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            send(client, url, data, index)
+            peaks.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {'peak_alloc_kib': summarize(peaks, digits=1)}
+
+
+def benchmark_endpoint(endpoint, emails, requests, allocation_requests):
+    url = reverse('password_reset:' + endpoint)
+    sample = random.Random(endpoint).sample(emails, requests + allocation_requests + 1)
+
+    # warm up (imports, url resolver, cached validators)
+    measure_latency_and_queries(url, prepare_requests(endpoint, sample[:1]))
+
+    result = {'requests': requests}
+    result.update(measure_latency_and_queries(url, prepare_requests(endpoint, sample[1:requests + 1])))
+    if allocation_requests:
+        result.update(measure_allocations(url, prepare_requests(endpoint, sample[requests + 1:])))
+    return result
+
+
+def fill_token_table(size, batch_size=10000):
+    """ creates size tokens, the first half of them expired, and returns the expiry time """
+    ResetPasswordToken.objects.all().delete()
+    users = list(User.objects.only('pk').order_by('pk')[:size])
+    backend = get_token_backend()
+
+    for start in range(0, size, batch_size):
+        # users get several tokens if there are less users than tokens
+        backend.create_tokens([users[i % len(users)] for i in range(start, min(size, start + batch_size))])
+
+    expiry_time = timezone.now() - timedelta(hours=1)
+    middle_pk = ResetPasswordToken.objects.order_by('pk').values_list('pk', flat=True)[size // 2]
+    ResetPasswordToken.objects.filter(pk__lt=middle_pk).update(
+        created_at=expiry_time - timedelta(hours=1), expires_at=timezone.now() - timedelta(hours=1)
+    )
+    return expiry_time
+
+
+def benchmark_clear_expired(size, batch_size):
+    results = []
+    for mode, kwargs in (('single', {}), ('batched', {'batch_size': batch_size})):
+        expiry_time = fill_token_table(size)
+        started_at = time.perf_counter()
+        deleted = clear_expired(expiry_time, **kwargs)
+        elapsed = time.perf_counter() - started_at
+        results.append({
+            'tokens': size,
+            'mode': mode,
+            'batch_size': kwargs.get('batch_size'),
+            'deleted': deleted,
+            'seconds': round(elapsed, 4),
+            'rows_per_second': round(deleted / elapsed) if elapsed else None,
+        })
+    ResetPasswordToken.objects.all().delete()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000, help="Number of users to seed")
+    parser.add_argument('--requests', type=int, default=200, help="Number of measured requests per endpoint")
+    parser.add_argument('--allocation-requests', type=int, default=50,
+                        help="Number of requests per endpoint traced with tracemalloc (0 to skip)")
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--clear-expired-sizes', type=int, nargs='*', default=[10000, 100000],
+                        help="Sizes of the token table to benchmark clear_expired with")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Batch size of the batched clear_expired")
+    parser.add_argument('--fast-hasher', action='store_true',
+                        help="Use the (insecure) MD5 hasher, so the confirm endpoint is not dominated by hashing")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON to PATH ('-' for stdout)")
+    options = parser.parse_args()
+
+    needed_users = len(options.endpoints) * (options.requests + options.allocation_requests + 1)
+    if options.users < needed_users:
+        parser.error("--users must be at least {} for the requested number of requests".format(needed_users))
+
+    if options.fast_hasher:
+        settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    with benchmark_database():
+        environment = get_environment()
+        log = sys.stderr if options.json == '-' else sys.stdout
+
+        started_at = time.perf_counter()
+        emails = seed_users(options.users)
+        print("Seeded {} users in {:.1f}s ({}, hasher {})".format(
+            options.users, time.perf_counter() - started_at, environment['database'],
+            settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1],
+        ), file=log)
+
+        # every endpoint gets its own users, so the request-token endpoint does not re-use the tokens of the others
+        random.Random(0).shuffle(emails)
+        users_per_endpoint = options.requests + options.allocation_requests + 1
+
+        results = {
+            'environment': environment,
+            'options': {
+                'users': options.users,
+                'requests': options.requests,
+                'allocation_requests': options.allocation_requests,
+                'hasher': settings.PASSWORD_HASHERS[0],
+            },
+            'endpoints': {},
+            'clear_expired': [],
+        }
+
+        for index, endpoint in enumerate(options.endpoints):
+            endpoint_emails = emails[index * users_per_endpoint:(index + 1) * users_per_endpoint]
+            result = benchmark_endpoint(endpoint, endpoint_emails, options.requests, options.allocation_requests)
+            results['endpoints'][endpoint] = result
+            print("{:<25} p50 {p50:8.2f}ms  p90 {p90:8.2f}ms  p99 {p99:8.2f}ms  queries {queries:5.2f}{alloc}".format(
+                endpoint,
+                queries=result['queries']['mean'],
+                alloc="  peak alloc {:8.1f}KiB".format(result['peak_alloc_kib']['mean'])
+                if 'peak_alloc_kib' in result else "",
+                **result['latency_ms']
+            ), file=log)
+
+        for size in options.clear_expired_sizes:
+            for result in benchmark_clear_expired(size, options.batch_size):
+                results['clear_expired'].append(result)
+                print("clear_expired {tokens:>9} tokens {mode:<8} {deleted:>9} deleted in {seconds:8.3f}s".format(
+                    **result
+                ), file=log)
+
+    if options.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        with open(options.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
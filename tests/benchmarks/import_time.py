@@ -0,0 +1,104 @@
+"""
+Measures how long importing django_rest_passwordreset.views takes, in fresh interpreters
+
+    python tests/benchmarks/import_time.py [--runs 10] [--top 10] [--json results.json]
+
+Every run starts a new python process (with the settings of the test suite, see common.py) that calls django.setup()
+(which imports the models of the installed apps) and then imports django_rest_passwordreset.views. Reported are the
+medians of both steps and the modules of the package (and the modules they import) with the largest self time, as
+measured by python -X importtime.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from common import TESTS_DIR, get_environment, setup_django
+
+SCRIPT = """
+import sys, time
+sys.path.insert(0, {tests_dir!r})
+import django
+started_at = time.perf_counter()
+django.setup()
+setup_done_at = time.perf_counter()
+import django_rest_passwordreset.views
+views_done_at = time.perf_counter()
+print((setup_done_at - started_at) * 1000, (views_done_at - setup_done_at) * 1000)
+"""
+
+
+def run_once():
+    """
+    :return: tuple (milliseconds of django.setup(), milliseconds of the import of the views, {module: self time in us})
+    """
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT.format(tests_dir=TESTS_DIR)],
+        capture_output=True, text=True, check=True, env=env,
+    )
+
+    self_times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        self_times[module.strip()] = int(self_us)
+
+    setup_ms, views_ms = (float(value) for value in result.stdout.split())
+    return setup_ms, views_ms, self_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help="Number of interpreters started")
+    parser.add_argument('--top', type=int, default=10, help="Number of modules with the largest self time reported")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON to PATH ('-' for stdout)")
+    options = parser.parse_args()
+
+    setup_django()
+    log = sys.stderr if options.json == '-' else sys.stdout
+
+    setup_times, views_times = [], []
+    self_times = defaultdict(list)
+    for _ in range(options.runs):
+        setup_ms, views_ms, module_times = run_once()
+        setup_times.append(setup_ms)
+        views_times.append(views_ms)
+        for module, self_us in module_times.items():
+            self_times[module].append(self_us)
+
+    results = {
+        'environment': get_environment(),
+        'options': {'runs': options.runs},
+        'django_setup_ms': round(statistics.median(setup_times), 2),
+        'views_import_ms': round(statistics.median(views_times), 2),
+        'modules_self_us': {
+            module: statistics.median(times)
+            for module, times in sorted(self_times.items(), key=lambda item: -statistics.median(item[1]))
+            if module.startswith('django_rest_passwordreset')
+        },
+    }
+
+    print("django.setup()                    {:8.2f}ms (median of {} runs)".format(
+        results['django_setup_ms'], options.runs
+    ), file=log)
+    print("import django_rest_passwordreset.views {:8.2f}ms".format(results['views_import_ms']), file=log)
+    for module, self_us in list(results['modules_self_us'].items())[:options.top]:
+        print("  {:<60} {:>8.0f}us self".format(module, self_us), file=log)
+
+    if options.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        with open(options.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmarks whether the latency of the request-token endpoint tells known and unknown email addresses apart
+
+    python tests/benchmarks/response_time.py [--requests 100] [--budget 0.05] [--receiver-delay 0.02] [--check]
+        [--json results.json]
+
+Sends interleaved requests for an email address of an existing user and for an unknown one to the real view (with the
+real thread pool and a reset_password_token_created receiver that takes --receiver-delay seconds, like sending an
+e-mail), once without and once with DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET. Reported per scenario: the latency
+percentiles of both kinds of requests, the difference of their medians, how much their ranges overlap and the accuracy
+of the best latency threshold at telling them apart (0.5: indistinguishable, 1.0: always right).
+
+With --check, the exit status is 1 if the medians of the budgeted scenario differ by more than --tolerance times the
+budget. The benchmark uses a temporary test database (see common.py), so the thread pool can write tokens.
+"""
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+
+from common import benchmark_database, get_environment, seed_users, setup_django
+
+setup_django()
+
+from django.test.utils import override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from django_rest_passwordreset.signals import reset_password_token_created  # noqa: E402
+
+
+def percentile(values, percent):
+    """ nearest-rank percentile """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class SlowReceiver:
+    """ a receiver of reset_password_token_created that takes delay seconds, like sending an e-mail """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, sender, instance, reset_password_token, **kwargs):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls += 1
+
+    def wait_for(self, calls, timeout=30):
+        """ waits until the receiver was called calls times (the tokens are created in the background) """
+        deadline = time.monotonic() + timeout
+        while self.calls < calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.calls
+
+
+def best_threshold_accuracy(known, unknown):
+    """
+    Returns the share of requests classified correctly by the best latency threshold (known above and unknown below
+    it, or the other way round)
+    """
+    samples = sorted([(latency, True) for latency in known] + [(latency, False) for latency in unknown])
+    best = 0.5
+    known_below = unknown_below = 0
+
+    for _latency, is_known in samples:
+        if is_known:
+            known_below += 1
+        else:
+            unknown_below += 1
+        known_above = len(known) - known_below
+        unknown_above = len(unknown) - unknown_below
+        best = max(best, (unknown_below + known_above) / len(samples), (known_below + unknown_above) / len(samples))
+
+    return best
+
+
+def range_overlap(known, unknown):
+    """ returns the length of the intersection of both latency ranges divided by the length of their union """
+    low, high = max(min(known), min(unknown)), min(max(known), max(unknown))
+    union = max(max(known), max(unknown)) - min(min(known), min(unknown))
+    if high < low:
+        return 0.0
+    return (high - low) / union if union else 1.0
+
+
+def summarize(values):
+    return {
+        'min': round(min(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p90': round(percentile(values, 90), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def run_scenario(known_email, requests, receiver):
+    """
+    Sends requests pairs of interleaved requests for the known and for an unknown email address
+    :return: dict with the latencies (in ms) of both kinds of requests and how well they can be told apart
+    """
+    client = APIClient()
+    url = reverse('password_reset:reset-password-request')
+    latencies = {'known': [], 'unknown': []}
+    calls_before = receiver.calls
+
+    for index in range(requests):
+        for kind, email in (('known', known_email), ('unknown', 'unknown{}@mail.com'.format(index))):
+            started_at = time.perf_counter()
+            response = client.post(url, {'email': email}, format='json', REMOTE_ADDR='10.0.{}.{}'.format(
+                index // 256 % 256, index % 256,
+            ))
+            latencies[kind].append((time.perf_counter() - started_at) * 1000)
+            assert response.status_code == 200, response.content
+
+    delivered = receiver.wait_for(calls_before + requests) - calls_before
+    known, unknown = latencies['known'], latencies['unknown']
+    return {
+        'requests': requests,
+        'delivered': delivered,
+        'known_ms': summarize(known),
+        'unknown_ms': summarize(unknown),
+        'median_difference_ms': round(abs(percentile(known, 50) - percentile(unknown, 50)), 3),
+        'range_overlap': round(range_overlap(known, unknown), 3),
+        'best_threshold_accuracy': round(best_threshold_accuracy(known, unknown), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help="Number of requests per kind of email address")
+    parser.add_argument('--users', type=int, default=1000, help="Number of users to seed")
+    parser.add_argument('--budget', type=float, default=0.05,
+                        help="DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET of the second scenario (seconds)")
+    parser.add_argument('--receiver-delay', type=float, default=0.02,
+                        help="Seconds the reset_password_token_created receiver takes")
+    parser.add_argument('--check', action='store_true',
+                        help="Exit with status 1 if the medians of the budgeted scenario differ by more than "
+                             "--tolerance times the budget")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Share of the budget the medians may differ by with --check")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON to PATH ('-' for stdout)")
+    options = parser.parse_args()
+
+    receiver = SlowReceiver(options.receiver_delay)
+    reset_password_token_created.connect(receiver, weak=False, dispatch_uid='benchmark-response-time')
+
+    scenarios = [
+        ("without budget", None),
+        ("budget {}s".format(options.budget), options.budget),
+    ]
+
+    with benchmark_database():
+        log = sys.stderr if options.json == '-' else sys.stdout
+        known_email = seed_users(options.users)[options.users // 2]
+
+        results = {
+            'environment': get_environment(),
+            'options': {
+                'requests': options.requests,
+                'users': options.users,
+                'budget': options.budget,
+                'receiver_delay': options.receiver_delay,
+            },
+            'scenarios': {},
+        }
+
+        for name, budget in scenarios:
+            with override_settings(
+                DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE=True,
+                DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET=budget,
+            ):
+                # warm up (imports, url resolver, thread pool)
+                run_scenario(known_email, 2, receiver)
+                result = run_scenario(known_email, options.requests, receiver)
+            results['scenarios'][name] = result
+
+            print("{name:<16} known p50 {known[p50]:8.2f}ms p99 {known[p99]:8.2f}ms  unknown p50 {unknown[p50]:8.2f}ms "
+                  "p99 {unknown[p99]:8.2f}ms  median diff {median_difference_ms:7.2f}ms  range overlap "
+                  "{range_overlap:5.2f}  threshold accuracy {best_threshold_accuracy:5.2f}".format(
+                      name=name, known=result['known_ms'], unknown=result['unknown_ms'], **result
+                  ), file=log)
+            if result['delivered'] != result['requests']:
+                print("  only {delivered} of {requests} signals were delivered".format(**result), file=log)
+
+    reset_password_token_created.disconnect(dispatch_uid='benchmark-response-time')
+
+    if options.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        with open(options.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+
+    if options.check:
+        budgeted = results['scenarios'][scenarios[-1][0]]
+        if budgeted['median_difference_ms'] > options.tolerance * options.budget * 1000:
+            print("The medians differ by {}ms, more than {} times the budget".format(
+                budgeted['median_difference_ms'], options.tolerance
+            ), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
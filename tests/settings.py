@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.10/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -84,6 +85,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # concurrent writers wait for each other instead of failing with "database is locked"
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 60,
+        },
+        # a database file instead of the shared in-memory database, so tests can send requests from several threads
+        # (like tests/benchmarks/common.py)
+        'TEST': {
+            'NAME': os.path.join(tempfile.gettempdir(), 'django-rest-passwordreset-test.sqlite3'),
+        },
     }
 }
 
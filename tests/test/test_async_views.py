@@ -0,0 +1,291 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from django_rest_passwordreset.async_views import AsyncResetPasswordConfirm, AsyncResetPasswordRequestToken, \
+    AsyncResetPasswordValidateToken
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.signals import post_password_reset, pre_password_reset, reset_password_token_created
+from django_rest_passwordreset.throttling import AsyncResetPasswordRequestTokenThrottle, AsyncScopedRateThrottle, \
+    SlidingWindowIPRateThrottle, SlidingWindowRateThrottle, SlidingWindowTokenPrefixRateThrottle
+
+User = get_user_model()
+
+
+class AsyncViewsTestCase(TestCase):
+    """
+    Tests the async views (included via django_rest_passwordreset.async_urls)
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.request_url = reverse('async_password_reset:reset-password-request')
+        self.validate_url = reverse('async_password_reset:reset-password-validate')
+        self.confirm_url = reverse('async_password_reset:reset-password-confirm')
+
+        self.created_tokens = []
+        self.signals = []
+
+        async def token_created(sender, instance, reset_password_token, **kwargs):
+            self.created_tokens.append(reset_password_token)
+
+        def password_reset(signal, sender, user, reset_password_token, **kwargs):
+            self.signals.append(signal)
+
+        reset_password_token_created.connect(token_created, weak=False, dispatch_uid='test-async-created')
+        pre_password_reset.connect(password_reset, weak=False, dispatch_uid='test-async-pre')
+        post_password_reset.connect(password_reset, weak=False, dispatch_uid='test-async-post')
+
+    def tearDown(self):
+        reset_password_token_created.disconnect(dispatch_uid='test-async-created')
+        pre_password_reset.disconnect(dispatch_uid='test-async-pre')
+        post_password_reset.disconnect(dispatch_uid='test-async-post')
+        cache.clear()
+
+    async def _post(self, url, data, **extra):
+        return await self.async_client.post(url, data, content_type='application/json', **extra)
+
+    async def test_request_validate_and_confirm(self):
+        response = await self._post(self.request_url, {'email': 'user1@mail.com'}, headers={'user-agent': 'test'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'OK'})
+
+        self.assertEqual(len(self.created_tokens), 1)
+        token = await ResetPasswordToken.objects.aget(user=self.user)
+        self.assertEqual(token.key, self.created_tokens[0].key)
+        self.assertEqual(token.user_agent, 'test')
+
+        # a second request re-uses the token
+        await self._post(self.request_url, {'email': 'USER1@mail.com'})
+        self.assertEqual(self.created_tokens[1].key, token.key)
+
+        response = await self._post(self.validate_url, {'token': token.key})
+        self.assertEqual(response.status_code, 200)
+
+        response = await self._post(self.confirm_url, {'token': token.key, 'password': 'new_secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.signals, [pre_password_reset, post_password_reset])
+
+        user = await User.objects.aget(pk=self.user.pk)
+        self.assertTrue(await sync_to_async(user.check_password)('new_secret'))
+        self.assertFalse(await ResetPasswordToken.objects.filter(user=self.user).aexists())
+
+    async def test_form_encoded_request(self):
+        response = await self.async_client.post(self.request_url, {'email': 'user1@mail.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.created_tokens), 1)
+
+    async def test_unknown_email(self):
+        response = await self._post(self.request_url, {'email': 'doesnotexist@mail.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.created_tokens, [])
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE=False)
+    async def test_unknown_email_with_information_leakage(self):
+        response = await self._post(self.request_url, {'email': 'doesnotexist@mail.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+
+    async def test_invalid_data(self):
+        response = await self._post(self.request_url, {'email': 'not-an-email'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+
+        response = await self.async_client.post(self.request_url, '{', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+        response = await self._post(self.confirm_url, {'token': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+
+    async def test_invalid_and_expired_tokens(self):
+        response = await self._post(self.validate_url, {'token': 'not_a_valid_token'})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+        token = await ResetPasswordToken.objects.acreate(user=self.user)
+        await ResetPasswordToken.objects.filter(pk=token.pk).aupdate(
+            created_at=timezone.now() - timedelta(days=2), expires_at=timezone.now() - timedelta(days=1)
+        )
+
+        response = await self._post(self.confirm_url, {'token': token.key, 'password': 'new_secret'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(await ResetPasswordToken.objects.filter(pk=token.pk).aexists())
+
+    async def test_confirm_rejects_invalid_password(self):
+        token = await ResetPasswordToken.objects.acreate(user=self.user)
+
+        response = await self._post(self.confirm_url, {'token': token.key, 'password': 'user1'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+        self.assertTrue(await ResetPasswordToken.objects.filter(pk=token.pk).aexists())
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION=True)
+    async def test_validate_with_user_details(self):
+        token = await ResetPasswordToken.objects.acreate(user=self.user)
+
+        response = await self._post(self.validate_url, {'token': token.key})
+
+        self.assertEqual(response.json(), {'status': 'OK', 'username': 'user1', 'email': 'user1@mail.com'})
+
+    async def test_only_post_is_allowed(self):
+        response = await self.async_client.get(self.request_url)
+        self.assertEqual(response.status_code, 405)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+        "CLASS": "django_rest_passwordreset.backends.CacheTokenBackend",
+    })
+    async def test_flow_with_a_backend_without_native_async_methods(self):
+        await self._post(self.request_url, {'email': 'user1@mail.com'})
+        key = self.created_tokens[0].key
+
+        response = await self._post(self.confirm_url, {'token': key, 'password': 'new_secret'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await ResetPasswordToken.objects.aexists())
+
+
+class AsyncThrottleTestCase(TestCase):
+    """
+    Tests the throttles of the async views
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.request_url = reverse('async_password_reset:reset-password-request')
+        self.validate_url = reverse('async_password_reset:reset-password-validate')
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_request_token_view_uses_async_throttle_by_default(self):
+        throttles = AsyncResetPasswordRequestToken().get_throttles()
+        self.assertEqual(len(throttles), 1)
+        self.assertIsInstance(throttles[0], AsyncResetPasswordRequestTokenThrottle)
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_ASYNC_THROTTLE_CLASSES=[
+            "django_rest_passwordreset.throttling.AsyncScopedRateThrottle",
+        ]):
+            throttles = AsyncResetPasswordRequestToken().get_throttles()
+            self.assertIsInstance(throttles[0], AsyncScopedRateThrottle)
+
+    async def test_request_token_is_throttled_by_ip_address(self):
+        with mock.patch.object(AsyncResetPasswordRequestTokenThrottle, 'THROTTLE_RATES', {
+            AsyncResetPasswordRequestTokenThrottle.scope: '2/day',
+        }):
+            for _ in range(2):
+                response = await self.async_client.post(self.request_url, {'email': 'user1@mail.com'})
+                self.assertEqual(response.status_code, 200)
+
+            response = await self.async_client.post(self.request_url, {'email': 'user1@mail.com'})
+            self.assertEqual(response.status_code, 429)
+            self.assertIn('detail', response.json())
+            self.assertIn('Retry-After', response.headers)
+
+            # clients are identified by their IP address
+            key = AsyncResetPasswordRequestTokenThrottle.cache_format % {
+                'scope': AsyncResetPasswordRequestTokenThrottle.scope,
+                'ident': '127.0.0.1',
+            }
+            self.assertEqual(len(await cache.aget(key)), 2)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_ASYNC_THROTTLE_CLASSES=[
+        "django_rest_passwordreset.throttling.SlidingWindowEmailRateThrottle",
+    ])
+    async def test_request_token_is_throttled_by_email(self):
+        with mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', {
+            'django-rest-passwordreset-request-token.email': '1/day',
+        }):
+            response = await self.async_client.post(
+                self.request_url, {'email': 'user1@mail.com'}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+            # the body of the plain Django request is parsed by the throttle, JSON as well as form data
+            response = await self.async_client.post(
+                self.request_url, {'email': 'USER1@mail.com'}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 429)
+            response = await self.async_client.post(self.request_url, {'email': 'user1@mail.com'})
+            self.assertEqual(response.status_code, 429)
+
+            response = await self.async_client.post(
+                self.request_url, {'email': 'other@mail.com'}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_validate_and_confirm_views_use_the_configured_throttle_classes(self):
+        for view_class in (AsyncResetPasswordValidateToken, AsyncResetPasswordConfirm):
+            throttles = view_class().get_throttles()
+            self.assertEqual([type(throttle) for throttle in throttles], [AsyncScopedRateThrottle])
+
+        with override_settings(
+            DJANGO_REST_PASSWORDRESET_VALIDATE_TOKEN_THROTTLE_CLASSES=[
+                "django_rest_passwordreset.throttling.SlidingWindowTokenPrefixRateThrottle",
+            ],
+            DJANGO_REST_PASSWORDRESET_CONFIRM_THROTTLE_CLASSES=[
+                "django_rest_passwordreset.throttling.SlidingWindowIPRateThrottle",
+                "django_rest_passwordreset.throttling.SlidingWindowTokenPrefixRateThrottle",
+            ],
+        ):
+            throttles = AsyncResetPasswordValidateToken().get_throttles()
+            self.assertEqual([type(throttle) for throttle in throttles], [SlidingWindowTokenPrefixRateThrottle])
+            throttles = AsyncResetPasswordConfirm().get_throttles()
+            self.assertEqual(
+                [type(throttle) for throttle in throttles],
+                [SlidingWindowIPRateThrottle, SlidingWindowTokenPrefixRateThrottle],
+            )
+
+    @override_settings(
+        DJANGO_REST_PASSWORDRESET_VALIDATE_TOKEN_THROTTLE_CLASSES=[
+            "django_rest_passwordreset.throttling.SlidingWindowTokenPrefixRateThrottle",
+        ],
+        DJANGO_REST_PASSWORDRESET_CONFIRM_THROTTLE_CLASSES=[
+            "django_rest_passwordreset.throttling.SlidingWindowTokenPrefixRateThrottle",
+        ],
+    )
+    async def test_validate_and_confirm_are_throttled_by_token_prefix(self):
+        confirm_url = reverse('async_password_reset:reset-password-confirm')
+
+        with mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', {
+            'django-rest-passwordreset-validate-token.token': '1/day',
+            'django-rest-passwordreset-confirm.token': '1/day',
+        }):
+            for url, data in (
+                (self.validate_url, {'token': 'abcdefgh-1'}),
+                (confirm_url, {'token': 'abcdefgh-1', 'password': 'new_secret'}),
+            ):
+                response = await self.async_client.post(url, data, content_type='application/json')
+                self.assertEqual(response.status_code, 404)
+
+                # the same prefix is throttled, another one is not
+                response = await self.async_client.post(
+                    url, dict(data, token='abcdefgh-2'), content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 429)
+                response = await self.async_client.post(
+                    url, dict(data, token='zyxwvuts-1'), content_type='application/json'
+                )
+                self.assertEqual(response.status_code, 404)
+
+    async def test_validate_is_throttled_only_with_a_configured_rate(self):
+        for _ in range(3):
+            response = await self.async_client.post(self.validate_url, {'token': 'abc'})
+            self.assertEqual(response.status_code, 404)
+
+        with mock.patch.object(AsyncScopedRateThrottle, 'THROTTLE_RATES', {
+            'django-rest-passwordreset-validate-token': '1/day',
+        }):
+            response = await self.async_client.post(self.validate_url, {'token': 'abc'})
+            self.assertEqual(response.status_code, 404)
+            response = await self.async_client.post(self.validate_url, {'token': 'abc'})
+            self.assertEqual(response.status_code, 429)
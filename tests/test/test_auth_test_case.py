@@ -457,6 +457,7 @@ class AuthTestCase(APITestCase, HelperMixin):
         # let the token expire
         token = ResetPasswordToken.objects.all().first()
         token.created_at = timezone.now() - timedelta(hours=password_reset_token_validation_time)
+        token.expires_at = timezone.now()
         token.save()
 
         # clear expired tokens
@@ -508,6 +509,7 @@ class ResponseIndistinguishabilityTestCase(APITestCase, HelperMixin):
 
     def _expire_token(self, token):
         token.created_at = timezone.now() - timedelta(hours=get_password_reset_token_expiry_time() + 1)
+        token.expires_at = timezone.now() - timedelta(hours=1)
         token.save()
 
     @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
@@ -582,3 +584,55 @@ class ResponseIndistinguishabilityTestCase(APITestCase, HelperMixin):
         )
         body = json.loads(weak_response.content.decode())
         self.assertIn("password", body)
+
+
+class GenerateTokenForEmailQueryCountTestCase(APITestCase):
+    """ Locks in the number of queries generate_token_for_email issues """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_unknown_email_uses_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(generate_token_for_email(email="foobar@doesnotexist.com"))
+
+    def test_new_token_uses_two_queries(self):
+        # one SELECT for user and existing token, one INSERT
+        with self.assertNumQueries(2):
+            token = generate_token_for_email(email="user1@mail.com")
+
+        self.assertEqual(token.user, self.user)
+
+    def test_existing_token_uses_two_queries(self):
+        existing_token = ResetPasswordToken.objects.create(user=self.user)
+
+        # one SELECT for user and existing token id, one SELECT for the token
+        with self.assertNumQueries(2):
+            token = generate_token_for_email(email="user1@mail.com")
+
+        self.assertEqual(token, existing_token)
+
+        # the user is already attached to the token
+        with self.assertNumQueries(0):
+            self.assertEqual(token.user.username, "user1")
+
+    def test_inactive_and_unusable_password_users_are_filtered_in_sql(self):
+        User.objects.create_user("user2", "USER1@mail.com")
+        inactive_user = User.objects.create_user("user3", "User1@Mail.com", "secret3")
+        inactive_user.is_active = False
+        inactive_user.save()
+
+        with self.assertNumQueries(2):
+            token = generate_token_for_email(email="user1@mail.com")
+
+        self.assertEqual(token.user, self.user)
+
+    def test_several_accounts_sharing_an_email_use_one_lookup_query(self):
+        User.objects.create_user("user2", "USER1@mail.com", "secret2")
+        User.objects.create_user("user3", "User1@Mail.com", "secret3")
+
+        with self.assertNumQueries(2):
+            token = generate_token_for_email(email="user1@mail.com")
+
+        self.assertEqual(token.user.email.lower(), "user1@mail.com")
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
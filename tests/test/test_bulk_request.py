@@ -0,0 +1,229 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import NoReverseMatch, reverse
+from rest_framework import status
+from rest_framework.routers import SimpleRouter
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset import urls as password_reset_urls
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.signals import reset_password_tokens_created
+from django_rest_passwordreset.urls import add_reset_password_urls_to_router
+from django_rest_passwordreset.views import ResetPasswordBulkRequestTokenViewSet, generate_tokens_for_emails
+from tests.test.helpers import patch
+
+User = get_user_model()
+
+
+def create_users(count, password=make_password("secret")):
+    # hash the password only once, the tests create many users
+    return [
+        User.objects.create(username="user{}".format(i), email="user{}@mail.com".format(i), password=password)
+        for i in range(count)
+    ]
+
+
+class GenerateTokensForEmailsTestCase(TestCase):
+    """
+    Tests issuing tokens for a list of email addresses
+    """
+
+    def setUp(self):
+        self.users = create_users(3)
+        self.inactive_user = User.objects.create(
+            username="inactive", email="inactive@mail.com", password=self.users[0].password, is_active=False
+        )
+
+    def test_tokens_are_created_in_bulk(self):
+        emails = ["user0@mail.com", "USER1@mail.com", "user2@mail.com"]
+
+        # one SELECT for the users (and their existing tokens), one INSERT for all tokens
+        with self.assertNumQueries(2):
+            tokens = generate_tokens_for_emails(emails, user_agent="agent", ip_address="10.0.0.1, 10.0.0.2")
+
+        self.assertEqual(list(tokens), emails)
+        self.assertEqual(ResetPasswordToken.objects.count(), 3)
+        for email, user in zip(emails, self.users):
+            token = ResetPasswordToken.objects.get(user=user)
+            self.assertEqual(tokens[email].key, token.key)
+            self.assertEqual(tokens[email].user, user)
+            self.assertEqual(token.ip_address, "10.0.0.1")
+            self.assertEqual(token.user_agent, "agent")
+
+    def test_existing_tokens_are_reused(self):
+        existing = ResetPasswordToken.objects.create(user=self.users[0])
+
+        # one SELECT for the users, one for the existing tokens, one INSERT for the missing tokens
+        with self.assertNumQueries(3):
+            tokens = generate_tokens_for_emails(["user0@mail.com", "user1@mail.com"])
+
+        self.assertEqual(tokens["user0@mail.com"].key, existing.key)
+        self.assertEqual(ResetPasswordToken.objects.count(), 2)
+
+    def test_unknown_inactive_and_duplicate_emails(self):
+        tokens = generate_tokens_for_emails([
+            "user0@mail.com", "doesnotexist@mail.com", "inactive@mail.com", "user0@mail.com", "User0@mail.com",
+        ])
+
+        self.assertEqual(list(tokens), ["user0@mail.com", "User0@mail.com"])
+        self.assertEqual(tokens["user0@mail.com"].key, tokens["User0@mail.com"].key)
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
+
+    def test_no_emails(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(generate_tokens_for_emails([]), {})
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+        "CLASS": "django_rest_passwordreset.backends.CacheTokenBackend",
+    })
+    def test_backend_without_bulk_methods(self):
+        tokens = generate_tokens_for_emails(["user0@mail.com", "user1@mail.com"])
+
+        self.assertEqual(len({token.key for token in tokens.values()}), 2)
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+
+
+class BulkRequestTokenTestCase(APITestCase):
+    """
+    Tests the bulk request-token endpoint
+    """
+
+    def setUp(self):
+        self.url = reverse('password_reset_bulk:reset-password-bulk-request')
+        self.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        self.users = create_users(3)
+
+    def _post(self, emails):
+        return self.client.post(self.url, {'emails': emails}, format='json')
+
+    def test_only_staff_users_can_request_tokens(self):
+        response = self._post(["user0@mail.com"])
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+        self.client.force_authenticate(self.users[0])
+        response = self._post(["user0@mail.com"])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_signal_is_sent_for_each_token(self, mock_signal):
+        self.client.force_authenticate(self.admin)
+
+        response = self._post(["user0@mail.com", "user1@mail.com", "doesnotexist@mail.com"])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'status': 'OK', 'count': 2, 'not_found': ["doesnotexist@mail.com"]})
+        self.assertEqual(mock_signal.call_count, 2)
+        self.assertEqual(
+            {call[1]['reset_password_token'].user for call in mock_signal.call_args_list},
+            {self.users[0], self.users[1]},
+        )
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_batch_signal_is_sent_once_if_connected(self, mock_signal):
+        batches = []
+
+        def receiver(sender, instance, reset_password_tokens, **kwargs):
+            batches.append(reset_password_tokens)
+
+        reset_password_tokens_created.connect(receiver)
+        self.addCleanup(reset_password_tokens_created.disconnect, receiver)
+        self.client.force_authenticate(self.admin)
+
+        response = self._post(["user0@mail.com", "user1@mail.com", "user2@mail.com"])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual({token.user for token in batches[0]}, set(self.users))
+        self.assertEqual(mock_signal.call_count, 0)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_BULK_REQUEST_MAX_EMAILS=2)
+    def test_number_of_emails_is_limited(self):
+        self.client.force_authenticate(self.admin)
+
+        response = self._post(["user0@mail.com", "user1@mail.com", "user2@mail.com"])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('emails', response.data)
+
+        response = self._post([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkRequestTokenUrlsTestCase(TestCase):
+    """
+    Tests that the bulk request-token endpoint is only exposed if it is included explicitly
+    """
+
+    def test_not_part_of_the_default_urls(self):
+        self.assertNotIn(
+            'reset-password-bulk-request', [pattern.name for pattern in password_reset_urls.urlpatterns]
+        )
+        with self.assertRaises(NoReverseMatch):
+            reverse('password_reset:reset-password-bulk-request')
+
+    def test_router(self):
+        router = SimpleRouter()
+        add_reset_password_urls_to_router(router, base_path='api/auth/passwordreset')
+        self.assertNotIn('reset-password-bulk-request', [basename for _, _, basename in router.registry])
+
+        router = SimpleRouter()
+        add_reset_password_urls_to_router(router, base_path='api/auth/passwordreset', bulk=True)
+        self.assertIn(
+            ('api/auth/passwordreset/bulk', ResetPasswordBulkRequestTokenViewSet, 'reset-password-bulk-request'),
+            router.registry
+        )
+
+
+@patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+class BulkRequestTokenCommandTestCase(TestCase):
+    """
+    Tests the bulkrequestresetpasswordtokens management command
+    """
+
+    def setUp(self):
+        self.users = create_users(5)
+
+    def _write_file(self, lines):
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(fd, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_command_issues_tokens_in_batches(self, mock_signal):
+        path = self._write_file(
+            ["user{}@mail.com".format(i) for i in range(5)] + ["", "doesnotexist@mail.com", "not-an-email"]
+        )
+        out, err = StringIO(), StringIO()
+
+        with patch(
+            'django_rest_passwordreset.management.commands.bulkrequestresetpasswordtokens.generate_tokens_for_emails',
+            side_effect=generate_tokens_for_emails,
+        ) as mock_generate:
+            call_command('bulkrequestresetpasswordtokens', path, '--batch-size=2', stdout=out, stderr=err)
+
+        self.assertEqual(mock_generate.call_count, 3)
+        self.assertIn("Issued 5 tokens, 1 e-mail addresses not found, 1 invalid", out.getvalue())
+        self.assertIn("not-an-email", err.getvalue())
+        self.assertEqual(ResetPasswordToken.objects.count(), 5)
+        self.assertEqual(mock_signal.call_count, 5)
+        self.assertIsNone(mock_signal.call_args[1]['instance'])
+
+    def test_command_reports_missing_emails_verbosely(self, mock_signal):
+        path = self._write_file(["doesnotexist@mail.com"])
+        out = StringIO()
+
+        call_command('bulkrequestresetpasswordtokens', path, verbosity=2, stdout=out)
+
+        self.assertIn("No user found for doesnotexist@mail.com", out.getvalue())
+
+    def test_command_rejects_missing_file(self, mock_signal):
+        with self.assertRaises(CommandError):
+            call_command('bulkrequestresetpasswordtokens', '/does/not/exist.txt', stdout=StringIO())
@@ -0,0 +1,278 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.backends import ModelTokenBackend
+from django_rest_passwordreset.cleanup import (
+    DisabledCleanupStrategy,
+    InlineCleanupStrategy,
+    IntervalCleanupStrategy,
+    ProbabilisticCleanupStrategy,
+    get_cleanup_strategy,
+)
+from django_rest_passwordreset.models import ResetPasswordToken, clear_expired, get_password_reset_token_expiry_time
+from django_rest_passwordreset.views import generate_tokens_for_emails
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+
+def _count_deletes(queries):
+    return len([query for query in queries if query['sql'].upper().startswith('DELETE')])
+
+
+class CleanupStrategyTestCase(TestCase):
+    """
+    Tests the expired-token cleanup strategies
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def test_default_strategy_is_inline(self):
+        self.assertIsInstance(get_cleanup_strategy(), InlineCleanupStrategy)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+        "CLASS": "django_rest_passwordreset.cleanup.ProbabilisticCleanupStrategy",
+        "OPTIONS": {"one_in": 10},
+    })
+    def test_strategy_from_settings(self):
+        strategy = get_cleanup_strategy()
+        self.assertIsInstance(strategy, ProbabilisticCleanupStrategy)
+        self.assertEqual(strategy.one_in, 10)
+
+    def test_disabled_strategy_never_clears(self):
+        strategy = DisabledCleanupStrategy()
+        self.assertFalse(any(strategy.should_clear() for _ in range(100)))
+
+    def test_probabilistic_strategy_one_in_one_always_clears(self):
+        strategy = ProbabilisticCleanupStrategy(one_in=1)
+        self.assertTrue(all(strategy.should_clear() for _ in range(100)))
+
+    def test_probabilistic_strategy_rejects_invalid_ratio(self):
+        with self.assertRaises(ValueError):
+            ProbabilisticCleanupStrategy(one_in=0)
+
+    def test_interval_strategy_grants_a_single_lease_per_interval(self):
+        strategy = IntervalCleanupStrategy(interval=60)
+        self.assertTrue(strategy.should_clear())
+        self.assertFalse(strategy.should_clear())
+
+        cache.delete(strategy.key)
+        self.assertTrue(strategy.should_clear())
+
+    def test_interval_strategy_grants_a_single_lease_under_concurrency(self):
+        strategy = IntervalCleanupStrategy(interval=60)
+        barrier = threading.Barrier(20)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(strategy.should_clear())
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results.count(True), 1)
+
+    def test_maybe_clear_only_calls_clear_func_when_due(self):
+        calls = []
+        self.assertTrue(InlineCleanupStrategy().maybe_clear(lambda: calls.append(1)))
+        self.assertFalse(DisabledCleanupStrategy().maybe_clear(lambda: calls.append(1)))
+        self.assertEqual(calls, [1])
+
+
+@patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+class RequestTokenCleanupTestCase(APITestCase, HelperMixin):
+    """
+    Counts the DELETE statements the request-token endpoint issues for a burst of requests
+    """
+    burst_size = 10
+
+    def setUp(self):
+        cache.clear()
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def _deletes_for_burst(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(self.burst_size):
+                self.rest_do_request_reset_token(email="doesnotexist@mail.com")
+        return _count_deletes(queries.captured_queries)
+
+    def test_inline_strategy_deletes_on_every_request(self, mock_signal):
+        self.assertEqual(self._deletes_for_burst(), self.burst_size)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+        "CLASS": "django_rest_passwordreset.cleanup.DisabledCleanupStrategy",
+    })
+    def test_disabled_strategy_issues_no_delete(self, mock_signal):
+        self.assertEqual(self._deletes_for_burst(), 0)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+        "CLASS": "django_rest_passwordreset.cleanup.IntervalCleanupStrategy",
+        "OPTIONS": {"interval": 60},
+    })
+    def test_interval_strategy_issues_one_delete_per_interval(self, mock_signal):
+        self.assertEqual(self._deletes_for_burst(), 1)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+        "CLASS": "django_rest_passwordreset.cleanup.ProbabilisticCleanupStrategy",
+        "OPTIONS": {"one_in": 5},
+    })
+    def test_probabilistic_strategy_deletes_when_drawn(self, mock_signal):
+        with patch('random.SystemRandom.randrange', side_effect=[0, 1, 2, 3, 4] * 2):
+            self.assertEqual(self._deletes_for_burst(), 2)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+        "CLASS": "django_rest_passwordreset.cleanup.IntervalCleanupStrategy",
+        "OPTIONS": {"interval": 60},
+    })
+    def test_interval_strategy_still_removes_expired_tokens(self, mock_signal):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        token.created_at = timezone.now() - timedelta(hours=get_password_reset_token_expiry_time())
+        token.expires_at = timezone.now()
+        token.save()
+
+        self.rest_do_request_reset_token(email="doesnotexist@mail.com")
+
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=token.pk).exists())
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+    "CLASS": "django_rest_passwordreset.cleanup.DisabledCleanupStrategy",
+})
+@patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+class ExpiredTokenIsNotReusedTestCase(APITestCase, HelperMixin):
+    """
+    Tests that an expired token which was not removed by the cleanup strategy is not sent again
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.expired_token = ResetPasswordToken.objects.create(
+            user=self.user, expires_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def _assert_new_token_is_sent(self, mock_signal):
+        response = self.rest_do_request_reset_token(email="user1@mail.com")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        key = mock_signal.call_args[1]['reset_password_token'].key
+        self.assertNotEqual(key, self.expired_token.key)
+        self.assertEqual(self.rest_do_validate_token(key).status_code, status.HTTP_200_OK)
+
+    def test_expired_token_is_not_reused(self, mock_signal):
+        self._assert_new_token_is_sent(mock_signal)
+        self.assertTrue(ResetPasswordToken.objects.filter(pk=self.expired_token.pk).exists())
+
+    def test_used_up_token_is_not_reused(self, mock_signal):
+        ResetPasswordToken.objects.filter(pk=self.expired_token.pk).update(
+            expires_at=timezone.now() + timedelta(hours=1), remaining_uses=0
+        )
+        self._assert_new_token_is_sent(mock_signal)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER=True)
+    def test_expired_token_is_replaced_with_one_token_per_user(self, mock_signal):
+        ResetPasswordToken.objects.filter(pk=self.expired_token.pk).update(unique_user=self.user)
+
+        self._assert_new_token_is_sent(mock_signal)
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=self.expired_token.pk).exists())
+
+    def test_bulk(self, mock_signal):
+        tokens = generate_tokens_for_emails(["user1@mail.com"])
+        self.assertNotEqual(tokens["user1@mail.com"].key, self.expired_token.key)
+
+    async def test_async(self, mock_signal):
+        token = await ModelTokenBackend().aget_token_for_user(self.user)
+        self.assertIsNone(token)
+
+
+class ClearExpiredBatchTestCase(TestCase):
+    """
+    Tests the batched deletion of expired tokens
+    """
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user("user{}".format(i), "user{}@mail.com".format(i))
+            for i in range(10)
+        ]
+        self.expiry_time = timezone.now() - timedelta(hours=get_password_reset_token_expiry_time())
+
+        # 7 expired tokens, 3 valid tokens
+        tokens = [ResetPasswordToken.objects.create(user=user) for user in self.users]
+        ResetPasswordToken.objects.filter(pk__in=[token.pk for token in tokens[:7]]).update(
+            created_at=self.expiry_time - timedelta(minutes=1),
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+
+    def test_unbatched_clear_expired_returns_deleted_count(self):
+        self.assertEqual(clear_expired(self.expiry_time), 7)
+        self.assertEqual(ResetPasswordToken.objects.count(), 3)
+
+    def test_batched_clear_expired_deletes_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            deleted = clear_expired(self.expiry_time, batch_size=3)
+
+        self.assertEqual(deleted, 7)
+        self.assertEqual(ResetPasswordToken.objects.count(), 3)
+        # 3 + 3 + 1 rows
+        self.assertEqual(_count_deletes(queries.captured_queries), 3)
+
+    def test_batched_clear_expired_stops_after_max_runtime(self):
+        self.assertEqual(clear_expired(self.expiry_time, batch_size=3, max_runtime=0), 3)
+        self.assertEqual(ResetPasswordToken.objects.count(), 7)
+
+        # a second run continues where the first one stopped
+        self.assertEqual(clear_expired(self.expiry_time, batch_size=10), 4)
+        self.assertEqual(ResetPasswordToken.objects.count(), 3)
+
+    def test_batched_clear_expired_sends_delete_signals_when_connected(self):
+        deleted_pks = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted_pks.append(instance.pk)
+
+        post_delete.connect(receiver, sender=ResetPasswordToken)
+        try:
+            self.assertEqual(clear_expired(self.expiry_time, batch_size=3), 7)
+        finally:
+            post_delete.disconnect(receiver, sender=ResetPasswordToken)
+
+        self.assertEqual(len(deleted_pks), 7)
+
+    def test_command_reports_deleted_rows(self):
+        out = StringIO()
+        call_command('clearresetpasswodtokens', '--batch-size=2', stdout=out)
+
+        self.assertIn("Deleted 7 expired tokens", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertEqual(ResetPasswordToken.objects.count(), 3)
+
+    def test_command_dry_run_does_not_delete(self):
+        out = StringIO()
+        call_command('clearresetpasswodtokens', '--dry-run', stdout=out)
+
+        self.assertIn("7 expired tokens would be deleted", out.getvalue())
+        self.assertEqual(ResetPasswordToken.objects.count(), 10)
+
+    def test_command_rejects_max_runtime_without_batch_size(self):
+        with self.assertRaises(CommandError):
+            call_command('clearresetpasswodtokens', '--max-runtime=10', stdout=StringIO())
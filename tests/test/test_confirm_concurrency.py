@@ -0,0 +1,153 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TransactionTestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from django_rest_passwordreset.backends import CacheTokenBackend, ModelTokenBackend, SignedTokenBackend, \
+    get_token_backend
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.signals import post_password_reset
+from tests.test.helpers import HelperMixin, patch, reverse
+
+User = get_user_model()
+
+
+class ConfirmRaceTestMixin(HelperMixin):
+    """
+    Simulates a concurrent confirm with the same token that wins the race after this request validated the token, but
+    before it claimed the token
+    """
+    backend_class = None
+
+    def setUp(self):
+        cache.clear()
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.token = get_token_backend().create_token(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def use_token_concurrently(self):
+        """ uses the token the way a concurrent confirm would """
+        raise NotImplementedError
+
+    def test_losing_confirm_fails_without_changing_the_password(self):
+        claim_token = self.backend_class.claim_token
+        post_password_reset_receiver = []
+
+        def use_token_and_claim(backend, token):
+            self.use_token_concurrently()
+            return claim_token(backend, token)
+
+        def receiver(**kwargs):
+            post_password_reset_receiver.append(kwargs)
+
+        post_password_reset.connect(receiver)
+        self.addCleanup(post_password_reset.disconnect, receiver)
+
+        with patch.object(self.backend_class, 'claim_token', autospec=True, side_effect=use_token_and_claim), \
+                patch.object(User, 'save', autospec=True) as mock_save:
+            response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        mock_save.assert_not_called()
+        self.assertEqual(post_password_reset_receiver, [])
+        self.assertFalse(self.django_check_login("user1", "new_secret"))
+
+
+class ModelTokenBackendConfirmRaceTestCase(ConfirmRaceTestMixin, APITestCase):
+    backend_class = ModelTokenBackend
+
+    def use_token_concurrently(self):
+        ResetPasswordToken.objects.filter(key=self.token.key).delete()
+
+    def test_failed_password_change_releases_the_token(self):
+        with patch.object(User, 'save', side_effect=DatabaseError("connection lost")):
+            with self.assertRaises(DatabaseError):
+                self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+
+        # the claim was rolled back, so the token can be used again
+        self.assertTrue(ResetPasswordToken.objects.filter(key=self.token.key).exists())
+        response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+    "CLASS": "django_rest_passwordreset.backends.CacheTokenBackend",
+})
+class CacheTokenBackendConfirmRaceTestCase(ConfirmRaceTestMixin, APITestCase):
+    backend_class = CacheTokenBackend
+
+    def use_token_concurrently(self):
+        get_token_backend().delete_token(self.token)
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+    "CLASS": "django_rest_passwordreset.backends.SignedTokenBackend",
+})
+class SignedTokenBackendConfirmRaceTestCase(ConfirmRaceTestMixin, APITestCase):
+    backend_class = SignedTokenBackend
+
+    def use_token_concurrently(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password("other_secret"))
+
+
+# runs on SQLite with the database file of tests/settings.py, whose IMMEDIATE transactions wait for each other, and on
+# databases with row locking (e.g., with tests/settings_postgres.py)
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConcurrentConfirmTestCase(TransactionTestCase):
+    """
+    Sends the same token to the confirm endpoint from several threads at once; exactly one of them may succeed
+    """
+    threads = 4
+
+    def setUp(self):
+        self.url = reverse('password_reset:reset-password-confirm')
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.token = ResetPasswordToken.objects.create(user=self.user)
+
+    def test_only_one_concurrent_confirm_succeeds(self):
+        # let all threads validate the token and hash their password before any of them claims the token (an IMMEDIATE
+        # transaction of SQLite already waits for the other transactions when it begins)
+        barrier = threading.Barrier(self.threads, timeout=10)
+        saved_passwords = []
+        save = User.save
+        status_codes = []
+
+        def wait_and_hash(password):
+            barrier.wait()
+            return make_password(password)
+
+        def counting_save(user, *args, **kwargs):
+            saved_passwords.append(user._password)
+            save(user, *args, **kwargs)
+
+        def confirm(password):
+            try:
+                response = APIClient().post(self.url, {'token': self.token.key, 'password': password}, format='json')
+                status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        with patch('django_rest_passwordreset.views.hash_password', side_effect=wait_and_hash), \
+                patch.object(User, 'save', autospec=True, side_effect=counting_save):
+            threads = [
+                threading.Thread(target=confirm, args=("new_secret_{}".format(i),)) for i in range(self.threads)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(status_codes), [status.HTTP_200_OK] + [status.HTTP_404_NOT_FOUND] * (self.threads - 1))
+        self.assertEqual(len(saved_passwords), 1)
+        self.assertFalse(ResetPasswordToken.objects.exists())
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.check_password(saved_passwords[0]))
@@ -0,0 +1,379 @@
+import os
+import queue
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset import dispatch
+from django_rest_passwordreset.dispatch import DatabaseDeliveryQueue, InProcessDeliveryQueue, OnCommitDispatcher, \
+    SynchronousDispatcher, ThreadPoolDispatcher, get_dispatcher
+from django_rest_passwordreset.models import ResetPasswordToken, ResetPasswordTokenDelivery
+from django_rest_passwordreset.signals import reset_password_token_created
+from django_rest_passwordreset.views import ResetPasswordRequestToken
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+# DatabaseDeliveryQueue requires a cache that is shared with the process delivering the queue
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'django-rest-passwordreset-test-deliveries'),
+    },
+}
+
+
+def _drain_in_process_queue():
+    while True:
+        try:
+            dispatch._in_process_queue.get_nowait()
+        except queue.Empty:
+            break
+        dispatch._in_process_queue.task_done()
+    InProcessDeliveryQueue.dead_letters.clear()
+
+
+class DispatchTestMixin(HelperMixin):
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.calls = []
+        self.failures_left = 0
+        self.delivered = threading.Event()
+        reset_password_token_created.connect(self._receiver, weak=False, dispatch_uid='test-dispatch-receiver')
+        _drain_in_process_queue()
+
+    def tearDown(self):
+        reset_password_token_created.disconnect(dispatch_uid='test-dispatch-receiver')
+        _drain_in_process_queue()
+
+    def _receiver(self, sender, instance, reset_password_token, **kwargs):
+        if self.failures_left:
+            self.failures_left -= 1
+            raise RuntimeError("SMTP server not reachable")
+        self.calls.append({
+            'sender': sender,
+            'instance': instance,
+            'reset_password_token': reset_password_token,
+            'thread': threading.current_thread(),
+        })
+        self.delivered.set()
+
+    def _request_token(self):
+        response = self.rest_do_request_reset_token(email="user1@mail.com")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class DispatcherTestCase(DispatchTestMixin, APITestCase):
+    """
+    Tests the dispatchers of the reset_password_token_created signal
+    """
+
+    def test_default_dispatcher_is_synchronous(self):
+        self.assertIsInstance(get_dispatcher(), SynchronousDispatcher)
+
+        self._request_token()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertIs(self.calls[0]['sender'], ResetPasswordRequestToken)
+        self.assertIsInstance(self.calls[0]['instance'], ResetPasswordRequestToken)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_DISPATCHER={
+        "CLASS": "django_rest_passwordreset.dispatch.OnCommitDispatcher",
+        "OPTIONS": {"retry_delay": 0},
+    })
+    def test_on_commit_dispatcher_sends_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self._request_token()
+            self.assertEqual(self.calls, [])
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0]['reset_password_token'].user, self.user)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_DISPATCHER={
+        "CLASS": "django_rest_passwordreset.dispatch.OnCommitDispatcher",
+        "OPTIONS": {"max_retries": 2},
+    })
+    def test_on_commit_dispatcher_retries_failing_receivers(self):
+        self.failures_left = 2
+
+        # the retries do not sleep in the request thread
+        with patch('django_rest_passwordreset.dispatch.time.sleep') as sleep:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._request_token()
+
+        self.assertEqual(len(self.calls), 1)
+        sleep.assert_not_called()
+
+    def test_thread_pool_dispatcher_waits_between_retries(self):
+        self.failures_left = 1
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        with patch('django_rest_passwordreset.dispatch.time.sleep') as sleep:
+            ThreadPoolDispatcher(retry_delay=2).deliver(ResetPasswordRequestToken, None, token)
+
+        self.assertEqual(len(self.calls), 1)
+        sleep.assert_called_once_with(2)
+
+    def test_on_commit_dispatcher_logs_dead_letters(self):
+        self.failures_left = 10
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        with self.assertLogs('django_rest_passwordreset.dispatch', level='ERROR') as logs:
+            failures = OnCommitDispatcher(max_retries=2).deliver(
+                ResetPasswordRequestToken, None, token
+            )
+
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(self.failures_left, 7)
+        self.assertIn("SMTP server not reachable", logs.output[0])
+        self.assertNotIn(token.key, logs.output[0])
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_DISPATCHER={
+        "CLASS": "django_rest_passwordreset.dispatch.ThreadPoolDispatcher",
+        "OPTIONS": {"retry_delay": 0},
+    })
+    def test_thread_pool_dispatcher_sends_in_a_worker_thread(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request_token()
+
+        self.assertTrue(self.delivered.wait(5))
+        self.assertEqual(len(self.calls), 1)
+        self.assertIsNot(self.calls[0]['thread'], threading.current_thread())
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_DISPATCHER={
+        "CLASS": "django_rest_passwordreset.dispatch.QueueDispatcher",
+        "OPTIONS": {
+            "queue": {
+                "CLASS": "django_rest_passwordreset.dispatch.InProcessDeliveryQueue",
+                "OPTIONS": {"autostart": False, "retry_delay": 0, "max_retries": 1},
+            },
+        },
+    })
+    def test_in_process_queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request_token()
+        self.assertEqual(self.calls, [])
+
+        self.failures_left = 1
+        delivery_queue = get_dispatcher().queue
+        # first attempt fails, the retry succeeds
+        self.assertEqual(delivery_queue.process(), (1, 1))
+        self.assertEqual(len(self.calls), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request_token()
+        self.failures_left = 2
+        with self.assertLogs('django_rest_passwordreset.dispatch', level='ERROR'):
+            self.assertEqual(delivery_queue.process(), (0, 2))
+        self.assertEqual(len(InProcessDeliveryQueue.dead_letters), 1)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_DISPATCHER={
+        "CLASS": "django_rest_passwordreset.dispatch.QueueDispatcher",
+        "OPTIONS": {
+            "queue": {"CLASS": "django_rest_passwordreset.dispatch.InProcessDeliveryQueue"},
+        },
+    })
+    def test_in_process_queue_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request_token()
+
+        self.assertTrue(self.delivered.wait(5))
+        self.assertIsNot(self.calls[0]['thread'], threading.current_thread())
+
+
+@override_settings(CACHES=SHARED_CACHES, DJANGO_REST_PASSWORDRESET_DISPATCHER={
+    "CLASS": "django_rest_passwordreset.dispatch.QueueDispatcher",
+    "OPTIONS": {
+        "queue": {
+            "CLASS": "django_rest_passwordreset.dispatch.DatabaseDeliveryQueue",
+            "OPTIONS": {"max_attempts": 2, "retry_delay": 60},
+        },
+    },
+})
+class DatabaseDeliveryQueueTestCase(DispatchTestMixin, APITestCase):
+    """
+    Tests the database-table backed delivery queue
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def _queue_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._request_token()
+        self.assertEqual(self.calls, [])
+        return ResetPasswordTokenDelivery.objects.get()
+
+    def _process(self):
+        out = StringIO()
+        call_command('processresetpasswordtokendeliveries', stdout=out)
+        return out.getvalue()
+
+    def test_delivery(self):
+        delivery = self._queue_token()
+        self.assertEqual(delivery.sender, 'django_rest_passwordreset.views.ResetPasswordRequestToken')
+
+        # the key of the token is not stored in the table
+        token = ResetPasswordToken.objects.get()
+        self.assertEqual(delivery.token_digest, ResetPasswordToken.get_key_digest(token.key))
+        self.assertNotIn(token.key, [value for value in ResetPasswordTokenDelivery.objects.values().get().values()])
+
+        self.assertIn("Delivered 1, failed 0", self._process())
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertIs(self.calls[0]['sender'], ResetPasswordRequestToken)
+        self.assertIsNone(self.calls[0]['instance'])
+        self.assertEqual(self.calls[0]['reset_password_token'], token)
+        self.assertEqual(self.calls[0]['reset_password_token'].key, token.key)
+        self.assertFalse(ResetPasswordTokenDelivery.objects.exists())
+        self.assertIsNone(cache.get(DatabaseDeliveryQueue()._key_cache_key(delivery.token_digest)))
+
+    def _fail_for_good(self):
+        delivery = self._queue_token()
+        self.failures_left = 10
+
+        self.assertIn("Delivered 0, failed 1", self._process())
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.attempts, 1)
+        self.assertIn("SMTP server not reachable", delivery.last_error)
+        self.assertGreater(delivery.next_attempt_at, timezone.now())
+
+        # not due yet
+        self.assertIn("Delivered 0, failed 0", self._process())
+
+        ResetPasswordTokenDelivery.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('django_rest_passwordreset.dispatch', level='ERROR'):
+            self.assertIn("Delivered 0, failed 1", self._process())
+        delivery.refresh_from_db()
+        return delivery
+
+    def test_failed_delivery_is_retried_and_kept_as_dead_letter(self):
+        delivery = self._fail_for_good()
+
+        self.assertEqual(delivery.status, ResetPasswordTokenDelivery.STATUS_FAILED)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertIn("SMTP server not reachable", delivery.last_error)
+        self.assertEqual(len(self.calls), 0)
+
+        # dead letters are not delivered again
+        ResetPasswordTokenDelivery.objects.update(next_attempt_at=timezone.now() - timedelta(days=1))
+        self.assertIn("Delivered 0, failed 0", self._process())
+        self.assertEqual(len(self.calls), 0)
+
+    def test_dead_letters_can_be_replayed(self):
+        self._fail_for_good()
+        self.failures_left = 0
+
+        self.assertEqual(DatabaseDeliveryQueue.replay(ResetPasswordTokenDelivery.objects.none()), 0)
+
+        out = StringIO()
+        call_command('processresetpasswordtokendeliveries', '--replay-failed', stdout=out)
+        self.assertIn("Replaying 1 failed deliveries", out.getvalue())
+        self.assertIn("Delivered 1, failed 0", out.getvalue())
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.calls[0]['reset_password_token'], ResetPasswordToken.objects.get())
+        self.assertFalse(ResetPasswordTokenDelivery.objects.exists())
+
+    def test_dead_letters_can_be_replayed_in_the_admin(self):
+        delivery = self._fail_for_good()
+        self.failures_left = 0
+        admin_user = User.objects.create_superuser("admin", "admin@mail.com", "secret-admin")
+        self.client.force_login(admin_user)
+
+        response = self.client.post(
+            reverse('admin:django_rest_passwordreset_resetpasswordtokendelivery_changelist'),
+            {'action': 'replay_deliveries', ACTION_CHECKBOX_NAME: [delivery.pk]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, ResetPasswordTokenDelivery.STATUS_PENDING)
+        self.assertEqual(delivery.attempts, 0)
+        self.assertEqual(DatabaseDeliveryQueue().process(), (1, 0))
+        self.assertEqual(len(self.calls), 1)
+
+    def test_admin_is_read_only(self):
+        delivery = self._queue_token()
+        admin_user = User.objects.create_superuser("admin", "admin@mail.com", "secret-admin")
+        self.client.force_login(admin_user)
+
+        response = self.client.get(reverse('admin:django_rest_passwordreset_resetpasswordtokendelivery_add'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        url = reverse('admin:django_rest_passwordreset_resetpasswordtokendelivery_change', args=[delivery.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, delivery.token_digest)
+
+        response = self.client.post(url, {'sender': 'tests.Sender'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.sender, 'django_rest_passwordreset.views.ResetPasswordRequestToken')
+
+    def test_delivery_of_used_token_is_dropped(self):
+        self._queue_token()
+        ResetPasswordToken.objects.all().delete()
+
+        self.assertEqual(DatabaseDeliveryQueue().process(), (1, 0))
+
+        self.assertEqual(self.calls, [])
+        self.assertFalse(ResetPasswordTokenDelivery.objects.exists())
+
+    def test_delivery_of_expired_token_is_dropped(self):
+        self._queue_token()
+        ResetPasswordToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(DatabaseDeliveryQueue().process(), (1, 0))
+
+        self.assertEqual(self.calls, [])
+        self.assertFalse(ResetPasswordTokenDelivery.objects.exists())
+
+    def test_delivery_without_cached_key_fails(self):
+        delivery = self._queue_token()
+        cache.clear()
+
+        self.assertEqual(DatabaseDeliveryQueue().process(), (0, 1))
+
+        self.assertEqual(self.calls, [])
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.status, ResetPasswordTokenDelivery.STATUS_PENDING)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertIn("missing in the cache 'default'", delivery.last_error)
+
+    def test_delivery_of_expired_token_without_cached_key_is_dropped(self):
+        delivery = self._queue_token()
+        self.assertEqual(delivery.expires_at, ResetPasswordToken.objects.get().expires_at)
+        cache.clear()
+        ResetPasswordTokenDelivery.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(DatabaseDeliveryQueue().process(), (1, 0))
+
+        self.assertEqual(self.calls, [])
+        self.assertFalse(ResetPasswordTokenDelivery.objects.exists())
+
+    def test_process_local_caches_are_rejected(self):
+        for backend in ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache'):
+            with self.subTest(backend=backend), override_settings(CACHES={'default': {'BACKEND': backend}}):
+                with self.assertRaises(ImproperlyConfigured):
+                    DatabaseDeliveryQueue()
+                with self.assertRaises(ImproperlyConfigured):
+                    call_command('processresetpasswordtokendeliveries', stdout=StringIO())
@@ -0,0 +1,201 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.guess_budget import GuessBudget, get_guess_budget
+from django_rest_passwordreset.models import ResetPasswordToken
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+GUESS_BUDGET = {
+    "OPTIONS": {
+        "max_failures": 3,
+        "lockout": 60,
+        "max_lockout": 600,
+        "token_max_failures": 10,
+    },
+}
+
+
+class GuessBudgetDisabledTestCase(TestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_guess_budget())
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_GUESS_BUDGET=GUESS_BUDGET)
+class GuessBudgetTestCase(APITestCase, HelperMixin):
+    """
+    Tests limiting the number of failed token guesses
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+        self.now = time.time()
+        timer = patch.object(GuessBudget, 'timer', side_effect=lambda: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def guess(self, count=1, url=None, ip='192.0.2.1'):
+        url = url or self.reset_password_validate_token_url
+        for i in range(count):
+            response = self.client.post(url, {'token': 'guess{}'.format(i), 'password': 'new_secret'},
+                                        format='json', REMOTE_ADDR=ip)
+        return response
+
+    def test_client_is_locked_out_without_a_lookup(self):
+        response = self.guess(3)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.assertNumQueries(0):
+            response = self.guess()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+
+        # also with a valid token
+        token = ResetPasswordToken.objects.create(user=self.user)
+        response = self.client.post(self.reset_password_validate_token_url, {'token': token.key}, format='json',
+                                    REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # other clients are not affected
+        self.assertEqual(self.guess(ip='192.0.2.2').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_budget_is_shared_between_validate_and_confirm(self):
+        self.guess(2)
+        self.guess(1, url=self.reset_password_confirm_url)
+
+        self.assertEqual(self.guess(url=self.reset_password_confirm_url).status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.guess().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_lockout_doubles(self):
+        self.guess(3)
+
+        self.now += 61
+        self.assertEqual(self.guess(3).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.guess()['Retry-After'], '120')
+
+        self.now += 121
+        self.guess(3)
+        self.assertEqual(self.guess()['Retry-After'], '240')
+
+        self.now += 241
+        self.guess(3)
+        self.now += 481
+        self.guess(3)
+        # capped at max_lockout
+        self.assertEqual(self.guess()['Retry-After'], '600')
+
+    def test_valid_tokens_do_not_reset_the_budget(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        self.guess(2)
+
+        response = self.client.post(self.reset_password_validate_token_url, {'token': token.key}, format='json',
+                                    REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.guess()
+        self.assertEqual(self.guess().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def guess_across_lockouts(self, count, ip='192.0.2.1'):
+        # waits for the end of each lockout (at most max_lockout seconds)
+        for _ in range(count // 3):
+            self.assertEqual(self.guess(3, ip=ip).status_code, status.HTTP_404_NOT_FOUND)
+            self.now += 601
+
+    def validate(self, token, ip='192.0.2.1'):
+        return self.client.post(self.reset_password_validate_token_url, {'token': token.key}, format='json',
+                                REMOTE_ADDR=ip)
+
+    def test_token_is_deleted_after_too_many_failed_guesses_of_the_client(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        # 9 failed guesses are within the budget of the token
+        self.guess_across_lockouts(9)
+        self.assertEqual(self.validate(token).status_code, status.HTTP_200_OK)
+
+        self.guess_across_lockouts(3)
+        self.assertEqual(self.validate(token).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=token.pk).exists())
+
+    def test_failed_guesses_of_other_clients_do_not_count(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        # many clients fail, but each of them stays within the budget of the token
+        for i in range(10):
+            self.guess(2, ip='192.0.2.{}'.format(i))
+
+        self.assertEqual(self.validate(token, ip='198.51.100.1').status_code, status.HTTP_200_OK)
+        response = self.client.post(self.reset_password_confirm_url, {'token': token.key, 'password': 'new_secret'},
+                                    format='json', REMOTE_ADDR='198.51.100.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_failed_guesses_before_the_token_was_created_do_not_count(self):
+        self.guess_across_lockouts(12)
+
+        # the token is created one hour later
+        self.now += 60 * 60
+        token = ResetPasswordToken.objects.create(user=self.user)
+        ResetPasswordToken.objects.filter(pk=token.pk).update(
+            created_at=timezone.now() + timedelta(seconds=self.now - time.time())
+        )
+
+        self.assertEqual(self.validate(token).status_code, status.HTTP_200_OK)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE={
+        "CLASS": "django_rest_passwordreset.validation_cache.TokenValidationCache",
+    })
+    def test_cached_token_is_checked(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        self.assertEqual(self.validate(token).status_code, status.HTTP_200_OK)
+
+        self.guess_across_lockouts(12)
+        self.assertEqual(self.validate(token).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=token.pk).exists())
+
+    def test_request_token_endpoint_is_not_affected(self):
+        self.guess(3)
+
+        with patch('django_rest_passwordreset.signals.reset_password_token_created.send'):
+            response = self.client.post(self.reset_password_request_url, {'email': 'user1@mail.com'}, format='json',
+                                        REMOTE_ADDR='192.0.2.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_GUESS_BUDGET=GUESS_BUDGET)
+class AsyncGuessBudgetTestCase(TestCase):
+    """
+    Tests the guess budget of the async views
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    async def test_client_is_locked_out(self):
+        url = reverse('async_password_reset:reset-password-validate')
+
+        for i in range(3):
+            response = await self.async_client.post(url, {'token': 'guess{}'.format(i)},
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = await self.async_client.post(url, {'token': 'guess'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
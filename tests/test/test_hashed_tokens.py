@@ -0,0 +1,109 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.backends import ModelTokenBackend
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.views import generate_tokens_for_emails
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+
+class KeyDigestTestCase(TestCase):
+    """
+    Tests looking up tokens by the digest of their key
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_digest_is_stored(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        stored = ResetPasswordToken.objects.get(pk=token.pk)
+        self.assertEqual(stored.key, token.key)
+        self.assertEqual(len(stored.key_digest), 64)
+        self.assertEqual(stored.key_digest, ResetPasswordToken.get_key_digest(token.key))
+
+    def test_lookup_by_digest(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        with self.assertNumQueries(1) as queries:
+            self.assertEqual(ModelTokenBackend().get_token(token.key).pk, token.pk)
+        self.assertIn('key_digest', queries.captured_queries[0]['sql'])
+        self.assertIsNone(ModelTokenBackend().get_token(token.key + 'x'))
+
+    def test_migration_populates_digests(self):
+        migration = import_module('django_rest_passwordreset.migrations.0007_resetpasswordtoken_key_digest')
+        token = ResetPasswordToken.objects.create(user=self.user)
+        ResetPasswordToken.objects.filter(pk=token.pk).update(key_digest='')
+
+        migration.populate_key_digest(apps, None)
+
+        self.assertEqual(ResetPasswordToken.objects.get(pk=token.pk).key_digest,
+                         ResetPasswordToken.get_key_digest(token.key))
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_HASHED_TOKENS=True)
+class HashedTokensTestCase(APITestCase, HelperMixin):
+    """
+    Tests storing only the digest of the tokens
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_key_is_not_stored(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        # the key is still available on the instance
+        self.assertTrue(token.key)
+        stored = ResetPasswordToken.objects.get(pk=token.pk)
+        self.assertIsNone(stored.key)
+        self.assertEqual(stored.key_digest, ResetPasswordToken.get_key_digest(token.key))
+
+        # saving the token again keeps the digest
+        stored.user_agent = 'changed'
+        stored.save()
+        self.assertEqual(ModelTokenBackend().get_token(token.key).pk, token.pk)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_reset_password(self, mock_reset_password_token_created):
+        response = self.rest_do_request_reset_token(email="user1@mail.com")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        key = mock_reset_password_token_created.call_args[1]['reset_password_token'].key
+        self.assertFalse(ResetPasswordToken.objects.filter(key__isnull=False).exists())
+
+        self.assertEqual(self.rest_do_validate_token(key).status_code, status.HTTP_200_OK)
+        response = self.rest_do_reset_password_with_token(key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_every_request_creates_a_new_token(self, mock_reset_password_token_created):
+        self.rest_do_request_reset_token(email="user1@mail.com")
+        self.rest_do_request_reset_token(email="user1@mail.com")
+
+        first, second = [
+            call[1]['reset_password_token'].key for call in mock_reset_password_token_created.call_args_list
+        ]
+        self.assertNotEqual(first, second)
+        self.assertEqual(ResetPasswordToken.objects.count(), 2)
+
+    def test_bulk_created_tokens(self):
+        User.objects.create_user("user2", "user2@mail.com", "secret2")
+
+        tokens = generate_tokens_for_emails(["user1@mail.com", "user2@mail.com"])
+
+        self.assertFalse(ResetPasswordToken.objects.filter(key__isnull=False).exists())
+        for token in tokens.values():
+            self.assertTrue(token.key)
+            self.assertEqual(ModelTokenBackend().get_token(token.key).user, token.user)
@@ -0,0 +1,112 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.password_validation import CommonPasswordValidator, get_default_password_validators
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.hashing import get_password_hashing_executor, hash_password
+from django_rest_passwordreset.backends import ModelTokenBackend
+from django_rest_passwordreset.models import ResetPasswordToken
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+
+class PasswordHashingTestCase(APITestCase, HelperMixin):
+    """
+    Tests validating and hashing the new password of the confirm endpoint
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def _record_hashing_threads(self):
+        threads = []
+
+        def record_thread(password):
+            threads.append(threading.current_thread().name)
+            return make_password(password)
+
+        return threads, patch('django_rest_passwordreset.hashing.make_password', side_effect=record_thread)
+
+    def test_password_is_hashed_in_the_request_thread_by_default(self):
+        self.assertIsNone(get_password_hashing_executor())
+
+        threads, mock_make_password = self._record_hashing_threads()
+        with mock_make_password:
+            encoded_password = hash_password("new_secret")
+
+        self.assertEqual(threads, [threading.current_thread().name])
+        self.assertTrue(check_password("new_secret", encoded_password))
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS=2)
+    def test_password_is_hashed_in_the_thread_pool(self):
+        self.assertIsNotNone(get_password_hashing_executor())
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        threads, mock_make_password = self._record_hashing_threads()
+        with mock_make_password:
+            response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('django-rest-passwordreset-hashing'))
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+
+    def test_password_is_hashed_before_the_token_is_claimed(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        calls = []
+        claim_token = ModelTokenBackend.claim_token
+
+        def record_hashing(password):
+            calls.append('hash_password')
+            return make_password(password)
+
+        def record_claim(backend, reset_password_token):
+            calls.append('claim_token')
+            return claim_token(backend, reset_password_token)
+
+        with patch('django_rest_passwordreset.hashing.make_password', side_effect=record_hashing), \
+                patch.object(ModelTokenBackend, 'claim_token', autospec=True, side_effect=record_claim):
+            response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(calls, ['hash_password', 'claim_token'])
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+
+    def test_password_changed_is_called(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        with patch('django.contrib.auth.password_validation.password_changed') as mock_password_changed:
+            response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_password_changed.assert_called_once()
+        self.assertEqual(mock_password_changed.call_args[0][0], "new_secret")
+
+    def test_validators_are_instantiated_once(self):
+        get_default_password_validators.cache_clear()
+        self.addCleanup(get_default_password_validators.cache_clear)
+
+        with patch.object(CommonPasswordValidator, '__init__', autospec=True,
+                          side_effect=CommonPasswordValidator.__init__) as mock_init:
+            for password in ("new_secret_1", "new_secret_2"):
+                token = ResetPasswordToken.objects.create(user=self.user)
+                response = self.rest_do_reset_password_with_token(token.key, password)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(mock_init.call_count, 1)
+
+    def test_invalid_password_is_not_hashed(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        with patch('django_rest_passwordreset.hashing.make_password') as mock_make_password:
+            response = self.rest_do_reset_password_with_token(token.key, "password")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_make_password.assert_not_called()
+        self.assertTrue(ResetPasswordToken.objects.filter(pk=token.pk).exists())
@@ -0,0 +1,264 @@
+import gc
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.dispatch import send_reset_password_token_created
+from django_rest_passwordreset.instrumentation import InMemoryMetricsSink, LoggingMetricsSink, _get_receiver_name, \
+    get_metrics_sink, measure
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.signals import post_password_reset, reset_password_token_created
+from django_rest_passwordreset.views import ResetPasswordRequestToken
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+IN_MEMORY_SINK = {"CLASS": "django_rest_passwordreset.instrumentation.InMemoryMetricsSink"}
+
+
+def send_email(sender, instance, reset_password_token, *args, **kwargs):
+    User.objects.filter(pk=reset_password_token.user_id).exists()
+
+
+def failing_receiver(sender, **kwargs):
+    raise RuntimeError("SMTP server not reachable")
+
+
+class MetricsSinkTestCase(TestCase):
+    """
+    Tests the metrics sinks and measure()
+    """
+
+    def setUp(self):
+        self.sink = InMemoryMetricsSink()
+        self.sink.reset()
+
+    def test_no_sink_by_default(self):
+        self.assertIsNone(get_metrics_sink())
+
+        with measure('request_token', 'lookup_user'):
+            User.objects.exists()
+        self.assertEqual(self.sink.get('request_token', 'lookup_user'), (0, 0.0, 0))
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_METRICS_SINK=IN_MEMORY_SINK)
+    def test_in_memory_sink(self):
+        for _ in range(2):
+            with measure('request_token', 'lookup_user'):
+                User.objects.exists()
+                User.objects.count()
+
+        calls, seconds, queries = self.sink.get('request_token', 'lookup_user')
+        self.assertEqual((calls, queries), (2, 4))
+        self.assertGreater(seconds, 0)
+
+        metrics = self.sink.render()
+        self.assertIn('# TYPE django_rest_passwordreset_phase_calls_total counter', metrics)
+        self.assertIn('django_rest_passwordreset_phase_calls_total{operation="request_token",phase="lookup_user"} 2',
+                      metrics)
+        self.assertIn('django_rest_passwordreset_phase_queries_total{operation="request_token",phase="lookup_user"} 4',
+                      metrics)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_METRICS_SINK=IN_MEMORY_SINK)
+    def test_measured_on_error(self):
+        with self.assertRaises(ValueError), measure('confirm', 'validate_password'):
+            raise ValueError()
+        self.assertEqual(self.sink.get('confirm', 'validate_password')[0], 1)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_METRICS_SINK=IN_MEMORY_SINK)
+    def test_nested_phases_are_not_counted_twice(self):
+        with patch('django_rest_passwordreset.instrumentation.time.perf_counter', side_effect=[0.0, 1.0, 4.0, 5.0]):
+            with measure('confirm', 'reset_password'):
+                User.objects.exists()
+                with measure('confirm', 'hash_password'):
+                    User.objects.exists()
+                    User.objects.count()
+
+        self.assertEqual(self.sink.get('confirm', 'reset_password'), (1, 2.0, 1))
+        self.assertEqual(self.sink.get('confirm', 'hash_password'), (1, 3.0, 2))
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_METRICS_SINK=IN_MEMORY_SINK)
+    def test_sink_is_created_once(self):
+        with patch('django_rest_passwordreset.instrumentation.get_metrics_sink', return_value=self.sink) as mock:
+            for _ in range(3):
+                with measure('request_token', 'lookup_user'):
+                    pass
+
+        self.assertLessEqual(mock.call_count, 1)
+
+    def test_escape_labels(self):
+        self.sink.record('signal', 'post_password_reset', 0.5, 1, receiver='say "hi"')
+        self.assertIn(
+            'django_rest_passwordreset_phase_seconds_total'
+            '{operation="signal",phase="post_password_reset",receiver="say \\"hi\\""} 0.5',
+            self.sink.render()
+        )
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_METRICS_SINK={
+        "CLASS": "django_rest_passwordreset.instrumentation.LoggingMetricsSink",
+        "OPTIONS": {"level": 20},
+    })
+    def test_logging_sink(self):
+        self.assertIsInstance(get_metrics_sink(), LoggingMetricsSink)
+
+        with self.assertLogs('django_rest_passwordreset.metrics', level='INFO') as logs:
+            with measure('request_token', 'create_token', backend='model'):
+                User.objects.exists()
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertRegex(logs.output[0], r'request_token create_token took \d+\.\d\dms and 1 queries backend=model')
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_METRICS_SINK=IN_MEMORY_SINK)
+class InstrumentedEndpointsTestCase(APITestCase, HelperMixin):
+    """
+    Tests that the phases of the reset operations and the signal receivers are measured
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.sink = InMemoryMetricsSink()
+        self.sink.reset()
+        reset_password_token_created.connect(send_email, dispatch_uid='test-instrumentation')
+
+    def tearDown(self):
+        reset_password_token_created.disconnect(dispatch_uid='test-instrumentation')
+        self.sink.reset()
+
+    def test_request_token(self):
+        response = self.rest_do_request_reset_token(email="user1@mail.com")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for phase in ('clear_expired', 'lookup_user', 'get_existing_token', 'create_token', 'dispatch'):
+            self.assertEqual(self.sink.get('request_token', phase)[0], 1, phase)
+        self.assertEqual(self.sink.get('request_token', 'lookup_user')[2], 1)
+        self.assertEqual(self.sink.get('request_token', 'create_token')[2], 1)
+
+        calls, _, queries = self.sink.get(
+            'signal', 'reset_password_token_created', receiver='tests.test.test_instrumentation.send_email'
+        )
+        self.assertEqual((calls, queries), (1, 1))
+
+    def test_unknown_email(self):
+        response = self.rest_do_request_reset_token(email="unknown@mail.com")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.sink.get('request_token', 'lookup_user')[0], 1)
+        self.assertEqual(self.sink.get('request_token', 'create_token')[0], 0)
+
+    def test_validate_and_confirm(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.sink.get('validate_token', 'get_valid_token')[0], 1)
+
+        response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.sink.get('validate_token', 'get_valid_token')[0], 2)
+        for phase in ('validate_token', 'check_eligibility', 'pre_password_reset', 'validate_password',
+                      'reset_password', 'hash_password', 'invalidate_validation_cache', 'post_password_reset'):
+            self.assertEqual(self.sink.get('confirm', phase)[0], 1, phase)
+        self.assertEqual(self.sink.get('confirm', 'hash_password')[2], 0)
+
+    def test_receivers_are_reported_unwrapped(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        post_password_reset.connect(failing_receiver, dispatch_uid='test-instrumentation')
+        try:
+            responses = post_password_reset.send_robust(sender=None, user=self.user, reset_password_token=token)
+        finally:
+            post_password_reset.disconnect(dispatch_uid='test-instrumentation')
+
+        self.assertEqual([receiver for receiver, _ in responses], [failing_receiver])
+        self.assertEqual(self.sink.get(
+            'signal', 'post_password_reset', receiver='tests.test.test_instrumentation.failing_receiver'
+        )[0], 1)
+
+    def test_disconnect_receiver(self):
+        calls = []
+
+        def receiver(sender, **kwargs):
+            calls.append(sender)
+
+        post_password_reset.connect(receiver)
+        post_password_reset.send(sender='first', user=self.user, reset_password_token=None)
+        self.assertTrue(post_password_reset.disconnect(receiver))
+        post_password_reset.send(sender='second', user=self.user, reset_password_token=None)
+
+        self.assertEqual(calls, ['first'])
+        self.assertEqual(self.sink.get(
+            'signal', 'post_password_reset', receiver=_get_receiver_name(receiver)
+        )[0], 1)
+
+    def test_weak_receivers_are_disconnected(self):
+        calls = []
+
+        class Receiver:
+            def receive(self, sender, **kwargs):
+                calls.append(sender)
+
+        def receiver(sender, **kwargs):
+            calls.append(sender)
+
+        instance = Receiver()
+        post_password_reset.connect(receiver)
+        post_password_reset.connect(instance.receive)
+        del receiver, instance
+        gc.collect()
+
+        self.assertFalse(post_password_reset.has_listeners())
+        self.assertEqual(post_password_reset.send(sender=None, user=self.user, reset_password_token=None), [])
+        self.assertEqual(calls, [])
+
+    def test_weak_receivers_of_unhashable_and_equal_instances(self):
+        calls = []
+
+        @dataclass
+        class Receiver:
+            name: str
+
+            def receive(self, sender, **kwargs):
+                calls.append(self.name)
+
+        # dataclasses with eq=True are unhashable, and both instances compare equal
+        first, second = Receiver('receiver'), Receiver('receiver')
+        post_password_reset.connect(first.receive)
+        post_password_reset.connect(second.receive)
+
+        del first
+        gc.collect()
+        post_password_reset.send(sender=None, user=self.user, reset_password_token=None)
+
+        self.assertEqual(calls, ['receiver'])
+        post_password_reset.disconnect(second.receive)
+
+    async def test_async_receivers(self):
+        async def receiver(sender, **kwargs):
+            return 'sent'
+
+        post_password_reset.connect(receiver, dispatch_uid='test-instrumentation')
+        try:
+            responses = await post_password_reset.asend(sender=None, user=self.user, reset_password_token=None)
+        finally:
+            post_password_reset.disconnect(dispatch_uid='test-instrumentation')
+
+        self.assertEqual(responses, [(receiver, 'sent')])
+        self.assertEqual(self.sink.get(
+            'signal', 'post_password_reset', receiver=_get_receiver_name(receiver)
+        )[0], 1)
+
+    def test_explicit_receivers(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+
+        failures = send_reset_password_token_created(
+            ResetPasswordRequestToken, None, token, receivers=[send_email, failing_receiver]
+        )
+
+        self.assertEqual([receiver for receiver, _ in failures], [failing_receiver])
+        self.assertEqual(self.sink.get(
+            'signal', 'reset_password_token_created', receiver='tests.test.test_instrumentation.send_email'
+        )[0], 1)
@@ -0,0 +1,149 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from django_rest_passwordreset.backends import ModelTokenBackend, PartitionedModelTokenBackend
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.views import generate_tokens_for_emails
+from tests.test.helpers import HelperMixin, patch, reverse
+
+User = get_user_model()
+
+
+class MultipleTokensPerUserTestCase(TestCase):
+    """
+    Tests that users can have several tokens by default
+    """
+
+    def test_several_tokens(self):
+        user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+        ResetPasswordToken.objects.create(user=user)
+        ModelTokenBackend().create_token(user)
+
+        self.assertEqual(ResetPasswordToken.objects.filter(user=user).count(), 2)
+        self.assertFalse(ResetPasswordToken.objects.filter(unique_user__isnull=False).exists())
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER=True)
+class OneTokenPerUserTestCase(APITestCase, HelperMixin):
+    """
+    Tests allowing only one token per user in the database
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_constraint(self):
+        ResetPasswordToken.objects.create(user=self.user)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResetPasswordToken.objects.create(user=self.user)
+
+    def test_create_token_reuses_the_existing_token(self):
+        backend = ModelTokenBackend()
+        token = backend.create_token(self.user)
+
+        # INSERT ... ON CONFLICT DO NOTHING and SELECT
+        with self.assertNumQueries(2):
+            other_token = backend.create_token(self.user, user_agent='other')
+
+        self.assertEqual((other_token.pk, other_token.key, other_token.user), (token.pk, token.key, self.user))
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_concurrent_requests_send_the_same_token(self, mock_reset_password_token_created):
+        # both requests look for an existing token before either of them created one
+        with patch.object(ModelTokenBackend, 'get_token_for_user', return_value=None):
+            for _ in range(2):
+                response = self.rest_do_request_reset_token(email="user1@mail.com")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        keys = {call[1]['reset_password_token'].key for call in mock_reset_password_token_created.call_args_list}
+        self.assertEqual(keys, {ResetPasswordToken.objects.get().key})
+
+    def test_bulk(self):
+        user2 = User.objects.create_user("user2", "user2@mail.com", "secret2")
+        token = ResetPasswordToken.objects.create(user=user2)
+
+        with patch.object(ModelTokenBackend, 'get_tokens_for_users', return_value={}):
+            tokens = generate_tokens_for_emails(["user1@mail.com", "user2@mail.com"])
+
+        self.assertEqual(tokens["user2@mail.com"].key, token.key)
+        self.assertEqual(tokens["user1@mail.com"].user, self.user)
+        self.assertEqual(ResetPasswordToken.objects.count(), 2)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_HASHED_TOKENS=True)
+    def test_hashed_tokens_are_replaced(self):
+        backend = ModelTokenBackend()
+        token = backend.create_token(self.user)
+        new_token = backend.create_token(self.user)
+
+        self.assertNotEqual(new_token.key, token.key)
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
+        self.assertIsNone(backend.get_token(token.key))
+        self.assertEqual(backend.get_token(new_token.key).user, self.user)
+
+    async def test_async(self):
+        backend = ModelTokenBackend()
+        token = await backend.acreate_token(self.user)
+        other_token = await backend.acreate_token(self.user)
+
+        self.assertEqual(other_token.key, token.key)
+        self.assertEqual(await ResetPasswordToken.objects.acount(), 1)
+
+    def test_partitioned_backend_is_not_supported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            PartitionedModelTokenBackend()
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER=True)
+class ConcurrentRequestTokenTestCase(TransactionTestCase):
+    """
+    Requests a token for the same email address from several threads at once; all of them get the same token
+    """
+    threads = 4
+
+    def setUp(self):
+        self.url = reverse('password_reset:reset-password-request')
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    # SQLite's shared in-memory test database does not support concurrent writers
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_requests(self):
+        get_token_for_user = ModelTokenBackend.get_token_for_user
+        # let all threads look for an existing token before any of them creates one
+        barrier = threading.Barrier(self.threads, timeout=10)
+        keys = []
+
+        def wait_and_get(backend, user):
+            token = get_token_for_user(backend, user)
+            barrier.wait()
+            return token
+
+        def record_key(sender, instance, reset_password_token, *args, **kwargs):
+            keys.append(reset_password_token.key)
+
+        def request_token():
+            try:
+                APIClient().post(self.url, {'email': 'user1@mail.com'}, format='json')
+            finally:
+                connection.close()
+
+        with patch.object(ModelTokenBackend, 'get_token_for_user', autospec=True, side_effect=wait_and_get), \
+                patch('django_rest_passwordreset.signals.reset_password_token_created.send', side_effect=record_key):
+            threads = [threading.Thread(target=request_token) for _ in range(self.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
+        self.assertEqual(set(keys), {ResetPasswordToken.objects.get().key})
+        self.assertEqual(len(keys), self.threads)
@@ -0,0 +1,247 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.backends import PartitionedModelTokenBackend
+from django_rest_passwordreset.models import ResetPasswordToken, get_password_reset_token_expiry
+from django_rest_passwordreset.partitioning import (
+    convert_to_partitioned_table,
+    create_partitions,
+    get_partition_name,
+    get_partitions,
+    is_partitioned,
+    parse_partition_name,
+    truncate,
+)
+from django_rest_passwordreset.views import clear_expired_tokens
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+TABLE = ResetPasswordToken._meta.db_table
+
+PARTITIONED_BACKEND = {
+    "CLASS": "django_rest_passwordreset.backends.PartitionedModelTokenBackend",
+    "OPTIONS": {"interval": "day", "ahead": 7},
+}
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+class PartitionNameTestCase(TestCase):
+    """
+    Tests naming the partitions of the token table
+    """
+
+    def test_day(self):
+        start = truncate(datetime(2024, 2, 29, 13, 45, tzinfo=dt_timezone.utc), 'day')
+        self.assertEqual(start, datetime(2024, 2, 29, tzinfo=dt_timezone.utc))
+
+        name = get_partition_name(start, 'day')
+        self.assertEqual(name, TABLE + '_p20240229')
+        self.assertEqual(parse_partition_name(name, 'day'), start)
+
+    def test_hour(self):
+        # converted to UTC
+        moment = datetime(2024, 2, 29, 13, 45, tzinfo=dt_timezone(timedelta(hours=2)))
+        start = truncate(moment, 'hour')
+        self.assertEqual(start, datetime(2024, 2, 29, 11, tzinfo=dt_timezone.utc))
+
+        name = get_partition_name(start, 'hour')
+        self.assertEqual(name, TABLE + '_p2024022911')
+        self.assertEqual(parse_partition_name(name, 'hour'), start)
+
+    def test_other_tables_are_not_partitions_of_the_interval(self):
+        self.assertIsNone(parse_partition_name(TABLE + '_default', 'day'))
+        self.assertIsNone(parse_partition_name(TABLE + '_p2024022911', 'day'))
+        self.assertIsNone(parse_partition_name(TABLE + '_p20240229', 'hour'))
+        self.assertIsNone(parse_partition_name('other_p20240229', 'day'))
+
+    def test_unknown_interval(self):
+        with self.assertRaises(ImproperlyConfigured):
+            PartitionedModelTokenBackend(interval='week')
+
+
+class PartitionedBackendWithoutPartitionsTestCase(TestCase):
+    """
+    Tests the PartitionedModelTokenBackend on a token table that is not partitioned (e.g., not on PostgreSQL)
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_clear_expired_deletes_rows(self):
+        if is_postgresql():
+            self.skipTest("the token table can be partitioned")
+
+        expired = ResetPasswordToken.objects.create(user=self.user)
+        ResetPasswordToken.objects.filter(pk=expired.pk).update(
+            created_at=timezone.now() - timedelta(days=2), expires_at=timezone.now() - timedelta(days=1)
+        )
+        ResetPasswordToken.objects.create(user=self.user)
+
+        self.assertFalse(is_partitioned())
+        self.assertEqual(get_partitions(), [])
+        self.assertEqual(PartitionedModelTokenBackend().clear_expired(timezone.now() - timedelta(days=1)), 1)
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
+
+    def test_command_requires_the_backend(self):
+        with self.assertRaisesMessage(CommandError, "PartitionedModelTokenBackend"):
+            call_command('partitionresetpasswordtokens', stdout=StringIO())
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND=PARTITIONED_BACKEND)
+    def test_command_requires_a_partitioned_table(self):
+        if is_postgresql():
+            self.skipTest("the token table can be partitioned")
+
+        with self.assertRaisesMessage(CommandError, "--convert"):
+            call_command('partitionresetpasswordtokens', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, "requires PostgreSQL"):
+            call_command('partitionresetpasswordtokens', '--convert', stdout=StringIO())
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND=PARTITIONED_BACKEND)
+    def test_request_token_cleanup_does_not_drop_partitions(self):
+        with patch.object(PartitionedModelTokenBackend, 'drop_expired_partitions') as mock_drop_expired_partitions:
+            clear_expired_tokens()
+            call_command('clearresetpasswodtokens', stdout=StringIO())
+
+        mock_drop_expired_partitions.assert_called_once()
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND=PARTITIONED_BACKEND)
+    def test_clear_command(self):
+        out = StringIO()
+        call_command('clearresetpasswodtokens', stdout=out)
+        self.assertIn("Dropped 0 expired partitions", out.getvalue())
+        self.assertIn("Deleted 0 expired tokens", out.getvalue())
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND=PARTITIONED_BACKEND)
+class PartitionedTokenTableTestCase(APITestCase, HelperMixin):
+    """
+    Tests partitioning the token table (run with settings_postgres); the conversion is rolled back after each test
+    """
+
+    def setUp(self):
+        if not is_postgresql():
+            self.skipTest("partitioning the token table requires PostgreSQL")
+
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.now = timezone.now()
+
+    def get_partition_of(self, token):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text FROM {table} WHERE id = %s".format(table=TABLE), [token.pk])
+            return cursor.fetchone()[0]
+
+    def create_token(self, created_at=None):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        if created_at is not None:
+            ResetPasswordToken.objects.filter(pk=token.pk).update(
+                created_at=created_at, expires_at=created_at + get_password_reset_token_expiry()
+            )
+        return token
+
+    def test_convert(self):
+        old_token = self.create_token(self.now - timedelta(days=3))
+        token = self.create_token()
+
+        created = convert_to_partitioned_table(interval='day', ahead=7, now=self.now)
+
+        self.assertTrue(is_partitioned())
+        # from the oldest token that is not expired up to 7 days ahead
+        self.assertEqual(created[0], get_partition_name(truncate(self.now - timedelta(days=1), 'day'), 'day'))
+        self.assertEqual(created[-1], get_partition_name(truncate(self.now + timedelta(days=7), 'day'), 'day'))
+        self.assertEqual(sorted(get_partitions()), sorted(created + [TABLE + '_default']))
+
+        # the tokens were copied
+        backend = PartitionedModelTokenBackend()
+        self.assertEqual(backend.get_token(token.key).pk, token.pk)
+        self.assertEqual(self.get_partition_of(token), get_partition_name(truncate(self.now, 'day'), 'day'))
+        self.assertEqual(self.get_partition_of(old_token), TABLE + '_default')
+
+        # new tokens get new ids
+        new_token = self.create_token()
+        self.assertGreater(new_token.pk, token.pk)
+        self.assertEqual(self.get_partition_of(new_token), get_partition_name(truncate(self.now, 'day'), 'day'))
+
+        with self.assertRaises(ImproperlyConfigured):
+            convert_to_partitioned_table(now=self.now)
+
+    def test_create_partitions(self):
+        convert_to_partitioned_table(interval='day', ahead=1, now=self.now)
+
+        created = create_partitions(interval='day', ahead=3, now=self.now)
+        self.assertEqual(created, [
+            get_partition_name(truncate(self.now + timedelta(days=days), 'day'), 'day') for days in (2, 3)
+        ])
+        self.assertEqual(create_partitions(interval='day', ahead=3, now=self.now), [])
+
+    def test_clear_expired_only_deletes_rows(self):
+        convert_to_partitioned_table(interval='day', ahead=7, now=self.now - timedelta(days=3))
+        self.create_token(self.now - timedelta(days=2))
+        token = self.create_token()
+        partitions = get_partitions()
+
+        deleted = PartitionedModelTokenBackend().clear_expired(self.now - timedelta(days=1))
+
+        self.assertEqual(deleted, 1)
+        self.assertEqual(list(ResetPasswordToken.objects.values_list('pk', flat=True)), [token.pk])
+        self.assertEqual(get_partitions(), partitions)
+
+    def test_clear_command_drops_partitions(self):
+        convert_to_partitioned_table(interval='day', ahead=7, now=self.now - timedelta(days=3))
+        in_expired_partition = self.create_token(self.now - timedelta(days=2))
+        in_default_partition = self.create_token(self.now - timedelta(days=10))
+        token = self.create_token()
+
+        expired_partitions = [
+            get_partition_name(truncate(self.now - timedelta(days=days), 'day'), 'day') for days in (4, 3, 2)
+        ]
+        self.assertEqual(self.get_partition_of(in_expired_partition), expired_partitions[-1])
+
+        out = StringIO()
+        call_command('clearresetpasswodtokens', stdout=out)
+
+        # the tokens of the dropped partitions are not counted
+        self.assertIn("Deleted 1 expired tokens", out.getvalue())
+        self.assertEqual(list(ResetPasswordToken.objects.values_list('pk', flat=True)), [token.pk])
+        self.assertFalse(set(expired_partitions) & set(get_partitions()))
+        self.assertNotIn(in_default_partition.pk, ResetPasswordToken.objects.values_list('pk', flat=True))
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('partitionresetpasswordtokens', '--convert', stdout=out)
+        self.assertIn("Converted the token table", out.getvalue())
+        self.assertTrue(is_partitioned())
+
+        out = StringIO()
+        call_command('partitionresetpasswordtokens', '--ahead', '9', stdout=out)
+        self.assertIn("Created 2 partitions", out.getvalue())
+
+        out = StringIO()
+        call_command('clearresetpasswodtokens', stdout=out)
+        self.assertIn("Dropped 0 expired partitions", out.getvalue())
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_reset_password(self, mock_reset_password_token_created):
+        convert_to_partitioned_table(now=self.now)
+
+        response = self.rest_do_request_reset_token(email="user1@mail.com")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        key = mock_reset_password_token_created.call_args[1]['reset_password_token'].key
+
+        response = self.rest_do_reset_password_with_token(key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
@@ -0,0 +1,155 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.dispatch import run_in_background
+from django_rest_passwordreset.models import ResetPasswordToken
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+RESPONSE_TIME_BUDGET = 0.05
+
+
+class DeferredBackgroundTasks:
+    """
+    Replaces run_in_background in the views: the tasks are collected and only run once the response was sent, like
+    they would in the thread pool (which does not see the data of the test transaction)
+    """
+
+    def __init__(self):
+        self.tasks = []
+
+    def __call__(self, func, *args, **kwargs):
+        self.tasks.append((func, args, kwargs))
+
+    def run(self):
+        tasks, self.tasks = self.tasks, []
+        for func, args, kwargs in tasks:
+            func(*args, **kwargs)
+
+
+class FakeClock:
+    """
+    Replaces the time module in the views: every call of monotonic() advances the clock by ``tick`` seconds (the time
+    the view spends working), and sleep() only records the padding and advances the clock by it
+    """
+
+    def __init__(self, tick=0.0):
+        self.now = 1000.0
+        self.tick = tick
+        self.sleeps = []
+
+    def monotonic(self):
+        now = self.now
+        self.now += self.tick
+        return now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET=RESPONSE_TIME_BUDGET)
+@patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+class ResponseTimeBudgetTestCase(APITestCase, HelperMixin):
+    """
+    Tests the constant-time mode of the request-token endpoint; the latency distributions of the real view are
+    measured by tests/benchmarks/response_time.py
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.background_tasks = DeferredBackgroundTasks()
+        patcher = patch('django_rest_passwordreset.views.run_in_background', self.background_tasks)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = FakeClock(tick=0.01)
+        patcher = patch('django_rest_passwordreset.views.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _request(self, email):
+        """
+        Requests a token and returns the padding the view slept for
+        """
+        self.clock.sleeps = []
+        response = self.rest_do_request_reset_token(email=email)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'status': 'OK'})
+        self.assertLessEqual(len(self.clock.sleeps), 1)
+        return sum(self.clock.sleeps)
+
+    def test_token_is_created_after_the_response(self, mock_signal):
+        padding = self._request("user1@mail.com")
+
+        self.assertAlmostEqual(padding, RESPONSE_TIME_BUDGET - self.clock.tick)
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+        self.assertEqual(mock_signal.call_count, 0)
+
+        self.background_tasks.run()
+
+        self.assertEqual(ResetPasswordToken.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(mock_signal.call_count, 1)
+
+    def test_unknown_email_does_not_create_a_token(self, mock_signal):
+        self._request("doesnotexist@mail.com")
+        self.background_tasks.run()
+
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+        self.assertEqual(mock_signal.call_count, 0)
+
+    def test_known_and_unknown_emails_are_padded_to_the_budget(self, mock_signal):
+        for tick in (0.0, 0.01, 0.049):
+            self.clock.tick = tick
+            known = self._request("user1@mail.com")
+            unknown = self._request("doesnotexist@mail.com")
+
+            # the padding only depends on the time spent before handing the work to the background
+            self.assertAlmostEqual(known, RESPONSE_TIME_BUDGET - tick)
+            self.assertAlmostEqual(unknown, RESPONSE_TIME_BUDGET - tick)
+
+        self.assertEqual(mock_signal.call_count, 0)
+        self.assertEqual(len(self.background_tasks.tasks), 6)
+
+    def test_requests_exceeding_the_budget_are_not_padded(self, mock_signal):
+        self.clock.tick = RESPONSE_TIME_BUDGET * 2
+
+        self.assertEqual(self._request("user1@mail.com"), 0)
+        self.assertEqual(self.clock.sleeps, [])
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_NO_INFORMATION_LEAKAGE=False)
+    def test_budget_requires_no_information_leakage(self, mock_signal):
+        with self.assertRaises(ImproperlyConfigured):
+            self.rest_do_request_reset_token(email="user1@mail.com")
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET=None)
+    def test_without_budget_the_token_is_created_within_the_request(self, mock_signal):
+        self.assertEqual(self._request("user1@mail.com"), 0)
+
+        self.assertEqual(self.background_tasks.tasks, [])
+        self.assertEqual(ResetPasswordToken.objects.count(), 1)
+        self.assertEqual(mock_signal.call_count, 1)
+
+
+class RunInBackgroundTestCase(TestCase):
+    """
+    Tests running tasks in the shared thread pool
+    """
+
+    def test_result(self):
+        self.assertEqual(run_in_background(sum, [1, 2, 3]).result(timeout=5), 6)
+
+    def test_exceptions_are_logged(self):
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertLogs('django_rest_passwordreset.dispatch', level='ERROR') as logs:
+            future = run_in_background(fail)
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+        self.assertIn("boom", "\n".join(logs.output))
@@ -0,0 +1,200 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+from django_rest_passwordreset import models, views
+from django_rest_passwordreset.backends import ModelTokenBackend
+from django_rest_passwordreset.cleanup import DisabledCleanupStrategy, InlineCleanupStrategy
+from django_rest_passwordreset.dispatch import OnCommitDispatcher, SynchronousDispatcher, get_executor
+from django_rest_passwordreset.guess_budget import GuessBudget
+from django_rest_passwordreset.hashing import get_password_hashing_executor
+from django_rest_passwordreset.instrumentation import LoggingMetricsSink
+from django_rest_passwordreset.models import ResetPasswordToken, get_password_reset_token_expiry_time
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.throttling import ResetPasswordRequestTokenThrottle, \
+    get_password_reset_confirm_throttle_classes, get_password_reset_request_token_throttle_classes
+from django_rest_passwordreset.tokens import RandomNumberTokenGenerator, RandomStringTokenGenerator
+from django_rest_passwordreset.validation_cache import TokenValidationCache
+from tests.test.helpers import patch
+
+User = get_user_model()
+
+NUMBER_TOKEN_CONFIG = {
+    "CLASS": "django_rest_passwordreset.tokens.RandomNumberTokenGenerator",
+    "OPTIONS": {"min_number": 1000, "max_number": 9999},
+}
+
+
+class PasswordResetSettingsTestCase(TestCase):
+    """
+    Tests the cached package settings
+    """
+
+    def test_defaults(self):
+        self.assertEqual(password_reset_settings.TOKEN_EXPIRY_TIME, 24)
+        self.assertEqual(password_reset_settings.LOOKUP_FIELD, 'email')
+        self.assertIs(password_reset_settings.NO_INFORMATION_LEAKAGE, True)
+
+    def test_invalid_setting(self):
+        with self.assertRaises(AttributeError):
+            password_reset_settings.UNKNOWN
+
+    def test_values_are_cached(self):
+        password_reset_settings.TOKEN_EXPIRY_TIME
+        self.assertIn('TOKEN_EXPIRY_TIME', vars(password_reset_settings))
+
+    def test_reloaded_on_setting_changed(self):
+        self.assertEqual(get_password_reset_token_expiry_time(), 24)
+
+        with override_settings(DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME=2):
+            self.assertEqual(get_password_reset_token_expiry_time(), 2)
+
+        self.assertEqual(get_password_reset_token_expiry_time(), 24)
+
+    def test_other_settings_keep_the_cache(self):
+        generator = password_reset_settings.TOKEN_GENERATOR
+
+        with override_settings(LANGUAGE_CODE='de'):
+            self.assertIs(password_reset_settings.TOKEN_GENERATOR, generator)
+
+    def test_derived_values(self):
+        self.assertEqual(password_reset_settings.TOKEN_EXPIRY, timedelta(hours=24))
+        self.assertEqual(password_reset_settings.LOOKUP_FIELD_IEXACT, 'email__iexact')
+
+        with override_settings(DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME=0.5,
+                               DJANGO_REST_LOOKUP_FIELD='username'):
+            self.assertEqual(password_reset_settings.TOKEN_EXPIRY, timedelta(minutes=30))
+            self.assertEqual(password_reset_settings.LOOKUP_FIELD_IEXACT, 'username__iexact')
+
+    def test_validation(self):
+        for setting_name, value, attr in (
+            ('DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME', '24', 'TOKEN_EXPIRY'),
+            ('DJANGO_REST_LOOKUP_FIELD', '', 'LOOKUP_FIELD_IEXACT'),
+            ('DJANGO_REST_PASSWORDRESET_RESPONSE_TIME_BUDGET', -1, 'RESPONSE_TIME_BUDGET'),
+            ('DJANGO_REST_PASSWORDRESET_BULK_REQUEST_MAX_EMAILS', 0, 'BULK_REQUEST_MAX_EMAILS'),
+            ('DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES', {}, 'REQUEST_TOKEN_THROTTLES'),
+            ('DJANGO_REST_PASSWORDRESET_EXECUTOR_MAX_WORKERS', 0, 'EXECUTOR'),
+            ('DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS', '4', 'PASSWORD_HASHING_EXECUTOR'),
+            ('DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND', 'ModelTokenBackend', 'TOKEN_BACKEND'),
+        ):
+            with self.subTest(setting_name), override_settings(**{setting_name: value}):
+                with self.assertRaisesMessage(ImproperlyConfigured, setting_name):
+                    getattr(password_reset_settings, attr)
+
+    def test_throttle_classes_are_resolved_once(self):
+        with patch('django_rest_passwordreset.throttling.import_string', return_value=AnonRateThrottle) as mock, \
+                override_settings(DJANGO_REST_PASSWORDRESET_CONFIRM_THROTTLE_CLASSES=[
+                    'rest_framework.throttling.AnonRateThrottle'
+                ]):
+            for _ in range(3):
+                self.assertEqual(get_password_reset_confirm_throttle_classes(), (AnonRateThrottle,))
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertIsNone(get_password_reset_confirm_throttle_classes())
+
+    def test_throttle_classes_follow_rest_framework_settings(self):
+        self.assertEqual(get_password_reset_request_token_throttle_classes(), (ResetPasswordRequestTokenThrottle,))
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES=[]):
+            with override_settings(REST_FRAMEWORK={
+                "DEFAULT_THROTTLE_CLASSES": ["rest_framework.throttling.UserRateThrottle"],
+            }):
+                self.assertEqual(get_password_reset_request_token_throttle_classes(), (UserRateThrottle,))
+            self.assertEqual(get_password_reset_request_token_throttle_classes(), ())
+
+    def test_configured_instances_are_created_once(self):
+        with patch('django_rest_passwordreset.backends.import_string', return_value=ModelTokenBackend) as mock, \
+                override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+                    "CLASS": "django_rest_passwordreset.backends.ModelTokenBackend",
+                }):
+            backend = password_reset_settings.TOKEN_BACKEND
+            for _ in range(3):
+                self.assertIs(password_reset_settings.TOKEN_BACKEND, backend)
+
+        self.assertEqual(mock.call_count, 1)
+        self.assertIsNot(password_reset_settings.TOKEN_BACKEND, backend)
+
+    def test_instances_follow_the_settings(self):
+        self.assertIsInstance(password_reset_settings.CLEANUP_STRATEGY, InlineCleanupStrategy)
+        self.assertIsInstance(password_reset_settings.DISPATCHER, SynchronousDispatcher)
+        self.assertIsNone(password_reset_settings.VALIDATION_CACHE)
+        self.assertIsNone(password_reset_settings.GUESS_BUDGET)
+        self.assertIsNone(password_reset_settings.METRICS_SINK)
+
+        with override_settings(
+            DJANGO_REST_PASSWORDRESET_CLEANUP_STRATEGY={
+                "CLASS": "django_rest_passwordreset.cleanup.DisabledCleanupStrategy",
+            },
+            DJANGO_REST_PASSWORDRESET_DISPATCHER={
+                "CLASS": "django_rest_passwordreset.dispatch.OnCommitDispatcher",
+            },
+            DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE={},
+            DJANGO_REST_PASSWORDRESET_GUESS_BUDGET={},
+            DJANGO_REST_PASSWORDRESET_METRICS_SINK={},
+        ):
+            self.assertIsInstance(password_reset_settings.CLEANUP_STRATEGY, DisabledCleanupStrategy)
+            self.assertIsInstance(password_reset_settings.DISPATCHER, OnCommitDispatcher)
+            self.assertIsInstance(password_reset_settings.VALIDATION_CACHE, TokenValidationCache)
+            self.assertIsInstance(password_reset_settings.GUESS_BUDGET, GuessBudget)
+            self.assertIsInstance(password_reset_settings.METRICS_SINK, LoggingMetricsSink)
+
+    def test_executors_follow_the_settings(self):
+        executor = get_executor()
+        self.assertIs(get_executor(), executor)
+        self.assertIsNone(get_password_hashing_executor())
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_EXECUTOR_MAX_WORKERS=2,
+                               DJANGO_REST_PASSWORDRESET_PASSWORD_HASHING_MAX_WORKERS=1):
+            self.assertIsNot(get_executor(), executor)
+            self.assertEqual(get_executor()._max_workers, 2)
+            self.assertEqual(get_password_hashing_executor()._max_workers, 1)
+
+        self.assertEqual(get_executor()._max_workers, 4)
+        self.assertIsNone(get_password_hashing_executor())
+
+
+class HeaderSettingsTestCase(TestCase):
+    """
+    Tests the backwards compatible header constants of django_rest_passwordreset.views
+    """
+
+    def test_defaults(self):
+        self.assertEqual(views.HTTP_USER_AGENT_HEADER, 'HTTP_USER_AGENT')
+        self.assertEqual(views.HTTP_IP_ADDRESS_HEADER, 'REMOTE_ADDR')
+
+    @override_settings(
+        DJANGO_REST_PASSWORDRESET_HTTP_USER_AGENT_HEADER='HTTP_X_USER_AGENT',
+        DJANGO_REST_PASSWORDRESET_IP_ADDRESS_HEADER='HTTP_X_FORWARDED_FOR',
+    )
+    def test_constants_follow_the_settings(self):
+        self.assertEqual(views.HTTP_USER_AGENT_HEADER, 'HTTP_X_USER_AGENT')
+        self.assertEqual(views.HTTP_IP_ADDRESS_HEADER, 'HTTP_X_FORWARDED_FOR')
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            views.HTTP_HEADER
+
+
+class TokenGeneratorSettingTestCase(TestCase):
+    """
+    Tests that the token generator is constructed lazily and follows changes of DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG
+    """
+
+    def test_generator_is_memoized(self):
+        self.assertIs(password_reset_settings.TOKEN_GENERATOR, password_reset_settings.TOKEN_GENERATOR)
+        self.assertIsInstance(password_reset_settings.TOKEN_GENERATOR, RandomStringTokenGenerator)
+        # backwards compatible module attribute
+        self.assertIs(models.TOKEN_GENERATOR_CLASS, password_reset_settings.TOKEN_GENERATOR)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG=NUMBER_TOKEN_CONFIG)
+    def test_override_settings(self):
+        self.assertIsInstance(password_reset_settings.TOKEN_GENERATOR, RandomNumberTokenGenerator)
+
+        user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        token = ResetPasswordToken.objects.create(user=user)
+        self.assertTrue(token.key.isdigit())
+        self.assertEqual(len(token.key), 4)
+        self.assertTrue(all(key.isdigit() for key in ResetPasswordToken.generate_keys(3)))
@@ -0,0 +1,238 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.throttling import (
+    SlidingWindowEmailRateThrottle,
+    SlidingWindowIPRateThrottle,
+    SlidingWindowRateThrottle,
+    SlidingWindowTokenPrefixRateThrottle,
+    get_password_reset_confirm_throttle_classes,
+    get_password_reset_validate_token_throttle_classes,
+)
+from django_rest_passwordreset.views import ResetPasswordConfirm, ResetPasswordValidateToken
+
+User = get_user_model()
+
+CONFIRM_SCOPE = 'django-rest-passwordreset-confirm'
+REQUEST_TOKEN_SCOPE = 'django-rest-passwordreset-request-token'
+
+# the start of a window of one minute
+NOW = 60 * 1000000
+
+
+def make_request(ip='192.0.2.1', **data):
+    return SimpleNamespace(META={'REMOTE_ADDR': ip}, data=data)
+
+
+def make_view(throttle_scope=CONFIRM_SCOPE):
+    return SimpleNamespace(throttle_scope=throttle_scope)
+
+
+class SlidingWindowRateThrottleTestCase(APITestCase):
+    """
+    Tests the sliding-window throttles on their own
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.now = NOW
+        timer = mock.patch.object(SlidingWindowRateThrottle, 'timer', side_effect=lambda: self.now)
+        timer.start()
+        self.addCleanup(timer.stop)
+
+    def tearDown(self):
+        cache.clear()
+
+    def set_rates(self, rates):
+        rates = mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', rates)
+        rates.start()
+        self.addCleanup(rates.stop)
+
+    def allowed(self, throttle_class, request, view=None, count=1):
+        return sum(throttle_class().allow_request(request, view or make_view()) for _ in range(count))
+
+    def test_not_throttled_without_rate(self):
+        self.set_rates({})
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, make_request(), count=100), 100)
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, make_request(), view=make_view(None)), 1)
+
+    def test_concurrent_requests_never_exceed_the_limit(self):
+        self.set_rates({CONFIRM_SCOPE + '.ip': '50/min'})
+        request = make_request()
+
+        def hammer(_):
+            return self.allowed(SlidingWindowIPRateThrottle, request, count=20)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            allowed = sum(executor.map(hammer, range(16)))
+
+        self.assertEqual(allowed, 50)
+        # throttled requests are not counted, so the counter is the number of allowed requests
+        throttle = SlidingWindowIPRateThrottle()
+        throttle.scope, throttle.ident = CONFIRM_SCOPE + '.ip', '192.0.2.1'
+        self.assertEqual(cache.get(throttle.get_window_cache_key(NOW // 60)), 50)
+
+    def test_previous_window_is_weighted(self):
+        self.set_rates({CONFIRM_SCOPE + '.ip': '10/min'})
+        request = make_request()
+
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, request, count=15), 10)
+
+        # half of the previous window is still within the sliding window
+        self.now = NOW + 90
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, request, count=10), 5)
+
+        # the previous window has left the sliding window, but the current one has 5 requests
+        self.now = NOW + 120
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, request, count=10), 5)
+
+    def test_wait(self):
+        self.set_rates({CONFIRM_SCOPE + '.ip': '10/min'})
+        request = make_request()
+        self.allowed(SlidingWindowIPRateThrottle, request, count=10)
+
+        self.now = NOW + 15
+        throttle = SlidingWindowIPRateThrottle()
+        self.assertFalse(throttle.allow_request(request, make_view()))
+        # the current window is full
+        self.assertEqual(throttle.wait(), 45)
+
+        self.now = NOW + 75
+        throttle = SlidingWindowIPRateThrottle()
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, request, count=2), 2)
+        self.assertFalse(throttle.allow_request(request, make_view()))
+        # 10 * (60 - elapsed) / 60 + 2 + 1 <= 10 once 18 seconds of the window elapsed, i.e. after 3 more seconds
+        self.assertAlmostEqual(throttle.wait(), 3)
+
+    def test_clients_are_counted_separately(self):
+        self.set_rates({CONFIRM_SCOPE + '.ip': '1/min'})
+
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, make_request('192.0.2.1'), count=2), 1)
+        self.assertEqual(self.allowed(SlidingWindowIPRateThrottle, make_request('192.0.2.2'), count=2), 1)
+
+    def test_email_throttle(self):
+        self.set_rates({REQUEST_TOKEN_SCOPE + '.email': '2/hour'})
+        view = make_view(REQUEST_TOKEN_SCOPE)
+
+        self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, make_request(email='user@mail.com'), view), 1)
+        # email addresses are compared case-insensitive, also from other clients
+        request = make_request('192.0.2.2', email=' USER@mail.com')
+        self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, request, view, count=3), 1)
+
+        self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, make_request(email='other@mail.com'), view), 1)
+        # requests without an email address are left to the validation of the view
+        self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, make_request(), view, count=3), 3)
+
+        throttle = SlidingWindowEmailRateThrottle()
+        throttle.allow_request(make_request(email='user@mail.com'), view)
+        self.assertNotIn('user@mail.com', throttle.get_window_cache_key(0))
+
+    def test_token_prefix_throttle(self):
+        self.set_rates({CONFIRM_SCOPE + '.token': '2/min'})
+
+        throttle_class = SlidingWindowTokenPrefixRateThrottle
+
+        self.assertEqual(self.allowed(throttle_class, make_request(token='abcdefgh1')), 1)
+        # tokens with the same prefix share the limit
+        self.assertEqual(self.allowed(throttle_class, make_request(token='abcdefgh2'), count=2), 1)
+        self.assertEqual(self.allowed(throttle_class, make_request(token='zbcdefgh1')), 1)
+
+    def test_plain_django_requests_are_parsed(self):
+        self.set_rates({REQUEST_TOKEN_SCOPE + '.email': '1/hour'})
+        view = make_view(REQUEST_TOKEN_SCOPE)
+        factory = RequestFactory()
+
+        request = factory.post('/', {'email': 'user@mail.com'}, content_type='application/json')
+        self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, request, view, count=2), 1)
+        request = factory.post('/', {'email': 'user@mail.com'})
+        self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, request, view), 0)
+
+        # invalid bodies are left to the validation of the view
+        for request in (
+            factory.post('/', 'not json', content_type='application/json'),
+            factory.post('/', ['user@mail.com'], content_type='application/json'),
+        ):
+            self.assertEqual(self.allowed(SlidingWindowEmailRateThrottle, request, view, count=2), 2)
+
+
+class SlidingWindowRateThrottleEndpointTestCase(APITestCase):
+    """
+    Tests configuring the sliding-window throttles for the endpoints
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_validate_and_confirm_use_drf_defaults_if_not_configured(self):
+        self.assertIsNone(get_password_reset_validate_token_throttle_classes())
+        self.assertIsNone(get_password_reset_confirm_throttle_classes())
+        self.assertEqual(
+            [type(throttle) for throttle in ResetPasswordConfirm().get_throttles()],
+            list(ResetPasswordConfirm.throttle_classes),
+        )
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_VALIDATE_TOKEN_THROTTLE_CLASSES=[
+        "django_rest_passwordreset.throttling.SlidingWindowIPRateThrottle",
+        "django_rest_passwordreset.throttling.SlidingWindowTokenPrefixRateThrottle",
+    ])
+    def test_validate_endpoint(self):
+        self.assertEqual(
+            [type(throttle) for throttle in ResetPasswordValidateToken().get_throttles()],
+            [SlidingWindowIPRateThrottle, SlidingWindowTokenPrefixRateThrottle],
+        )
+        token = ResetPasswordToken.objects.create(user=self.user)
+        url = reverse('password_reset:reset-password-validate')
+
+        with mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', {
+            'django-rest-passwordreset-validate-token.token': '2/hour',
+        }):
+            for _ in range(2):
+                response = self.client.post(url, {'token': token.key}, format='json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = self.client.post(url, {'token': token.key}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertIn('Retry-After', response)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_CONFIRM_THROTTLE_CLASSES=(
+        "django_rest_passwordreset.throttling.SlidingWindowIPRateThrottle"
+    ))
+    def test_confirm_endpoint(self):
+        url = reverse('password_reset:reset-password-confirm')
+
+        with mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', {CONFIRM_SCOPE + '.ip': '1/hour'}):
+            response = self.client.post(url, {'token': 'unknown', 'password': 'new_secret'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+            response = self.client.post(url, {'token': 'unknown', 'password': 'new_secret'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_THROTTLE_CLASSES=[
+        "django_rest_passwordreset.throttling.SlidingWindowEmailRateThrottle",
+    ])
+    @mock.patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_request_token_endpoint(self, mock_signal):
+        url = reverse('password_reset:reset-password-request')
+
+        with mock.patch.object(SlidingWindowRateThrottle, 'THROTTLE_RATES', {REQUEST_TOKEN_SCOPE + '.email': '1/day'}):
+            response = self.client.post(url, {'email': 'user1@mail.com'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            response = self.client.post(url, {'email': 'user1@mail.com'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            response = self.client.post(url, {'email': 'other@mail.com'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
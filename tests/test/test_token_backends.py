@@ -0,0 +1,307 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.backends import CacheTokenBackend, ModelTokenBackend, SignedTokenBackend, \
+    get_token_backend
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.views import clear_expired_tokens
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+
+class TokenBackendFlowTestMixin(HelperMixin):
+    """
+    Backend-agnostic tests of the request/validate/confirm flow; subclasses select the backend via settings
+    """
+    backend_class = None
+    # expected number of queries of the validate-token endpoint (without / with user details) and the confirm endpoint
+    validate_queries = 1
+    validate_with_user_details_queries = 1
+    confirm_queries = 2
+
+    def setUp(self):
+        cache.clear()
+        self.setUpUrls()
+        self.user1 = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.user2 = User.objects.create_user("user2", "user2@mail.com", "secret2")
+
+    def tearDown(self):
+        cache.clear()
+
+    def _request_token(self, email, mock_signal):
+        response = self.rest_do_request_reset_token(email=email)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return mock_signal.call_args[1]['reset_password_token']
+
+    def test_configured_backend_is_used(self):
+        self.assertIsInstance(get_token_backend(), self.backend_class)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_request_validate_and_confirm(self, mock_signal):
+        token = self._request_token("user1@mail.com", mock_signal)
+        self.assertNotEqual(token.key, "")
+        self.assertEqual(token.user, self.user1)
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+
+        # the token can not be used twice
+        self.assertIsNone(get_token_backend().get_token(token.key))
+        response = self.rest_do_reset_password_with_token(token.key, "other_secret")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_token_is_reused_for_the_same_user(self, mock_signal):
+        token1 = self._request_token("user1@mail.com", mock_signal)
+        token2 = self._request_token("user1@mail.com", mock_signal)
+        self.assertEqual(token1.key, token2.key)
+
+        token3 = self._request_token("user2@mail.com", mock_signal)
+        self.assertNotEqual(token1.key, token3.key)
+        self.assertEqual(token3.user, self.user2)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    @override_settings(DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION=True)
+    def test_validate_with_user_details(self, mock_signal):
+        token = self._request_token("user1@mail.com", mock_signal)
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get("username"), "user1")
+        self.assertEqual(response.data.get("email"), "user1@mail.com")
+
+    def test_validate_and_confirm_unknown_token(self):
+        response = self.rest_do_validate_token("not_a_valid_token")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.rest_do_reset_password_with_token("not_a_valid_token", "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    @override_settings(DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME=-1)
+    def test_expired_token_is_rejected(self, mock_signal):
+        token = self._request_token("user1@mail.com", mock_signal)
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(get_token_backend().get_token(token.key))
+
+    def test_confirm_invalidates_all_tokens_of_the_user(self):
+        backend = get_token_backend()
+        token1 = backend.create_token(self.user1)
+        token2 = backend.create_token(self.user1)
+        other_token = backend.create_token(self.user2)
+
+        response = self.rest_do_reset_password_with_token(token1.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertIsNone(backend.get_token(token1.key))
+        self.assertIsNone(backend.get_token(token2.key))
+        self.assertIsNotNone(backend.get_token(other_token.key))
+
+    def test_validate_query_count(self):
+        token = get_token_backend().create_token(User.objects.get(pk=self.user1.pk))
+
+        with self.assertNumQueries(self.validate_queries):
+            response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION=True):
+            with self.assertNumQueries(self.validate_with_user_details_queries):
+                response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get("username"), "user1")
+
+    def test_confirm_query_count(self):
+        token = get_token_backend().create_token(User.objects.get(pk=self.user1.pk))
+
+        # the token and its user are looked up once, by the serializer; the transaction of the password change adds a
+        # SAVEPOINT and a RELEASE SAVEPOINT query within the test case
+        with self.assertNumQueries(self.confirm_queries + 2):
+            response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_token(self):
+        backend = get_token_backend()
+        token = backend.create_token(self.user1)
+        self.assertEqual(backend.get_token_for_user(self.user1).key, token.key)
+
+        backend.delete_token(token)
+
+        self.assertIsNone(backend.get_token(token.key))
+        self.assertIsNone(backend.get_token_for_user(self.user1))
+
+
+class ModelTokenBackendTestCase(TokenBackendFlowTestMixin, APITestCase):
+    backend_class = ModelTokenBackend
+    # SELECT of the token joined with its user, DELETE of the token (claim), UPDATE of the user, DELETE of the user's
+    # tokens
+    confirm_queries = 4
+
+    def test_clear_expired(self):
+        token = get_token_backend().create_token(self.user1)
+        ResetPasswordToken.objects.filter(pk=token.pk).update(
+            created_at=timezone.now() - timedelta(days=2), expires_at=timezone.now() - timedelta(days=1)
+        )
+
+        clear_expired_tokens()
+
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=token.pk).exists())
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+    "CLASS": "django_rest_passwordreset.backends.CacheTokenBackend",
+})
+class CacheTokenBackendTestCase(TokenBackendFlowTestMixin, APITestCase):
+    backend_class = CacheTokenBackend
+    # the user is only loaded if its details are returned
+    validate_queries = 0
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_flow_does_not_touch_the_token_table(self, mock_signal):
+        with CaptureQueriesContext(connection) as queries:
+            token = self._request_token("user1@mail.com", mock_signal)
+            self.rest_do_validate_token(token.key)
+            self.rest_do_reset_password_with_token(token.key, "new_secret")
+
+        token_table = ResetPasswordToken._meta.db_table
+        self.assertFalse([query for query in queries.captured_queries if token_table in query['sql']])
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+
+    def test_token_expires_with_the_cache_timeout(self):
+        backend = get_token_backend()
+        self.assertEqual(backend.get_timeout(), 24 * 60 * 60)
+
+        with override_settings(DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME=2):
+            self.assertEqual(backend.get_timeout(), 2 * 60 * 60)
+
+    def test_cache_keys_do_not_contain_the_token(self):
+        backend = get_token_backend()
+        token = backend.create_token(self.user1)
+        self.assertNotIn(token.key, backend._token_cache_key(token.key))
+
+    def test_clear_expired_is_a_noop(self):
+        self.assertEqual(get_token_backend().clear_expired(timezone.now()), 0)
+
+    def test_concurrent_tokens_are_invalidated(self):
+        """ a token created while another request of the same user creates one must not escape the reset """
+        other_backend = CacheTokenBackend()
+
+        for position in range(1, 10):
+            cache.clear()
+            concurrent_tokens = []
+            backend = InterleavingCacheTokenBackend(
+                position, lambda: concurrent_tokens.append(other_backend.create_token(self.user1))
+            )
+            token = backend.create_token(self.user1)
+            if not concurrent_tokens:
+                # create_token made fewer cache calls, every position was covered
+                break
+
+            concurrent_token, = concurrent_tokens
+            self.assertIsNotNone(other_backend.get_token(token.key))
+            self.assertIsNotNone(other_backend.get_token(concurrent_token.key))
+            self.assertIn(other_backend.get_token_for_user(self.user1).key, [token.key, concurrent_token.key])
+
+            other_backend.delete_tokens_for_user(self.user1)
+            self.assertIsNone(other_backend.get_token(token.key))
+            self.assertIsNone(other_backend.get_token(concurrent_token.key))
+            self.assertIsNone(other_backend.get_token_for_user(self.user1))
+        else:
+            self.fail("create_token made more cache calls than expected")
+
+    def test_tokens_created_after_the_reset_are_valid(self):
+        backend = get_token_backend()
+        old_token = backend.create_token(self.user1)
+        backend.delete_tokens_for_user(self.user1)
+
+        token = backend.create_token(self.user1)
+        self.assertIsNone(backend.get_token(old_token.key))
+        self.assertEqual(backend.get_token(token.key).user_id, self.user1.pk)
+        self.assertEqual(backend.get_token_for_user(self.user1).key, token.key)
+
+
+class InterleavingCache:
+    """ Proxies a cache and runs the callback before the n-th call, like a concurrent request would """
+
+    def __init__(self, cache, position, callback):
+        self._cache = cache
+        self.position = position
+        self.callback = callback
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self._cache, name)
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            if self.calls == self.position:
+                self.callback()
+            return method(*args, **kwargs)
+        return call
+
+
+class InterleavingCacheTokenBackend(CacheTokenBackend):
+    def __init__(self, position, callback, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interleaving_cache = InterleavingCache(super().cache, position, callback)
+
+    @property
+    def cache(self):
+        return self.interleaving_cache
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={
+    "CLASS": "django_rest_passwordreset.backends.SignedTokenBackend",
+})
+class SignedTokenBackendTestCase(TokenBackendFlowTestMixin, APITestCase):
+    backend_class = SignedTokenBackend
+    # SELECT of the user, SELECT ... FOR UPDATE of the user (claim), UPDATE of the user
+    confirm_queries = 3
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_token_is_reused_for_the_same_user(self, mock_signal):
+        # stateless tokens are signed again for every request, all of them are valid
+        token1 = self._request_token("user1@mail.com", mock_signal)
+        token2 = self._request_token("user1@mail.com", mock_signal)
+
+        self.assertEqual(get_token_backend().get_token(token1.key).user, self.user1)
+        self.assertEqual(get_token_backend().get_token(token2.key).user, self.user1)
+
+    def test_delete_token(self):
+        # stateless tokens can not be revoked individually, only by changing the password
+        backend = get_token_backend()
+        token = backend.create_token(self.user1)
+        backend.delete_token(token)
+        self.assertIsNone(backend.get_token_for_user(self.user1))
+        self.assertIsNotNone(backend.get_token(token.key))
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_validate_only_queries_the_user_table(self, mock_signal):
+        token = self._request_token("user1@mail.com", mock_signal)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.rest_do_validate_token(token.key)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(ResetPasswordToken.objects.count(), 0)
+
+    def test_malformed_tokens_are_rejected(self):
+        backend = get_token_backend()
+        self.assertIsNone(backend.get_token("not-a-token"))
+        self.assertIsNone(backend.get_token("bm90LWEtdXVpZA-1-abc"))
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.backends import get_token_backend
+from django_rest_passwordreset.models import ResetPasswordToken, clear_expired
+from tests.test.helpers import HelperMixin
+
+User = get_user_model()
+
+
+class ExpiresAtTestCase(TestCase):
+    """
+    Tests the stored expiry date of the tokens and the valid() / expired() querysets
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_expires_at_is_set_on_create(self):
+        token = ResetPasswordToken.objects.create(user=self.user)
+        self.assertAlmostEqual(
+            (token.expires_at - token.created_at).total_seconds(), timedelta(hours=24).total_seconds(), delta=1
+        )
+
+    @override_settings(DJANGO_REST_MULTITOKENAUTH_RESET_TOKEN_EXPIRY_TIME=0.5)
+    def test_expires_at_is_set_by_create_tokens(self):
+        token, = get_token_backend().create_tokens([self.user])
+
+        token = ResetPasswordToken.objects.get(pk=token.pk)
+        self.assertAlmostEqual(
+            (token.expires_at - token.created_at).total_seconds(), timedelta(minutes=30).total_seconds(), delta=1
+        )
+
+    def test_expires_at_is_kept(self):
+        expires_at = timezone.now() + timedelta(minutes=10)
+        token = ResetPasswordToken.objects.create(user=self.user, expires_at=expires_at)
+        self.assertEqual(ResetPasswordToken.objects.get(pk=token.pk).expires_at, expires_at)
+
+    def test_valid_and_expired(self):
+        now = timezone.now()
+        valid = ResetPasswordToken.objects.create(user=self.user, expires_at=now + timedelta(minutes=1))
+        expired = ResetPasswordToken.objects.create(user=self.user, expires_at=now)
+
+        self.assertEqual(list(ResetPasswordToken.objects.valid(now)), [valid])
+        self.assertEqual(list(ResetPasswordToken.objects.expired(now)), [expired])
+        self.assertEqual(list(ResetPasswordToken.objects.valid(now + timedelta(minutes=1))), [])
+        self.assertFalse(valid.is_expired(now))
+        self.assertTrue(expired.is_expired(now))
+
+    def test_clear_expired_uses_expires_at(self):
+        # a short-lived token expired although it was created recently, a long-lived one is kept
+        short_lived = ResetPasswordToken.objects.create(
+            user=self.user, expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        long_lived = ResetPasswordToken.objects.create(user=self.user, expires_at=timezone.now() + timedelta(days=7))
+        ResetPasswordToken.objects.filter(pk=long_lived.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(clear_expired(timezone.now() - timedelta(hours=24)), 1)
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=short_lived.pk).exists())
+        self.assertTrue(ResetPasswordToken.objects.filter(pk=long_lived.pk).exists())
+
+
+class ValidateExpiredTokenTestCase(APITestCase, HelperMixin):
+    """
+    Tests that the validate and confirm endpoints reject expired tokens without writing for unknown keys
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_expired_token_is_deleted(self):
+        token = ResetPasswordToken.objects.create(user=self.user, expires_at=timezone.now() - timedelta(minutes=1))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # the token is looked up by its key and deleted because it has expired
+        select, delete = queries.captured_queries
+        self.assertTrue(select['sql'].startswith('SELECT'))
+        self.assertTrue(delete['sql'].startswith('DELETE'))
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=token.pk).exists())
+
+    def test_unknown_token(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.rest_do_validate_token("not_a_valid_token")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # a guessed key costs a single SELECT, nothing is written
+        select, = queries.captured_queries
+        self.assertTrue(select['sql'].startswith('SELECT'))
+
+    async def test_async_unknown_token(self):
+        token = await ResetPasswordToken.objects.acreate(
+            user=self.user, expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        backend = get_token_backend()
+
+        self.assertIsNone(await backend.aget_valid_token("not_a_valid_token"))
+        self.assertTrue(await ResetPasswordToken.objects.filter(pk=token.pk).aexists())
+
+        self.assertIsNone(await backend.aget_valid_token(token.key))
+        self.assertFalse(await ResetPasswordToken.objects.filter(pk=token.pk).aexists())
+
+    def test_token_lifetime_is_not_derived_from_the_setting(self):
+        token = ResetPasswordToken.objects.create(user=self.user, expires_at=timezone.now() + timedelta(days=7))
+        ResetPasswordToken.objects.filter(pk=token.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
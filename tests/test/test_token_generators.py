@@ -1,7 +1,18 @@
-from django.conf import settings
-from django.test import TestCase
+import os
+import time
+import tracemalloc
+from datetime import timedelta
+from unittest import skipUnless
 
-from django_rest_passwordreset.tokens import RandomNumberTokenGenerator, RandomStringTokenGenerator, get_token_generator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from django_rest_passwordreset.backends import ModelTokenBackend
+from django_rest_passwordreset.tokens import BaseTokenGenerator, RandomNumberTokenGenerator, \
+    RandomStringTokenGenerator, SignedTokenGenerator, get_token_generator
+from tests.test.helpers import patch
+
+User = get_user_model()
 
 
 class TokenGeneratorTestCase(TestCase):
@@ -70,16 +81,63 @@ class TokenGeneratorTestCase(TestCase):
             self.assertLess(num, 9999999999,
                             msg="RandomNumberTokenGenerator must return a number less or equal to 9999999999")
 
+    def test_string_token_generator_batch(self):
+        token_generator = RandomStringTokenGenerator(min_length=9, max_length=12)
+
+        tokens = token_generator.generate_tokens(500)
+
+        self.assertEqual(len(tokens), 500)
+        self.assertEqual(len(set(tokens)), 500)
+        self.assertEqual({len(token) for token in tokens}, {9, 10, 11, 12})
+        for token in tokens:
+            int(token, 16)
+
+    def test_string_token_generator_fixed_length(self):
+        token_generator = RandomStringTokenGenerator(min_length=15, max_length=15)
+
+        self.assertEqual(len(token_generator.generate_token()), 15)
+        self.assertEqual({len(token) for token in token_generator.generate_tokens(20)}, {15})
+        self.assertEqual(token_generator.generate_tokens(0), [])
+
+    def test_number_token_generator_batch(self):
+        token_generator = RandomNumberTokenGenerator(min_number=5, max_number=9)
+
+        numbers = {int(token) for token in token_generator.generate_tokens(200)}
+
+        # every number of the (inclusive) range is drawn
+        self.assertEqual(numbers, {5, 6, 7, 8, 9})
+        self.assertEqual({int(token_generator.generate_token()) for _ in range(200)}, {5, 6, 7, 8, 9})
+
+    def test_base_token_generator_batch(self):
+        class CountingTokenGenerator(BaseTokenGenerator):
+            count = 0
+
+            def generate_token(self, *args, **kwargs):
+                self.count += 1
+                return str(self.count)
+
+        self.assertEqual(CountingTokenGenerator().generate_tokens(3), ['1', '2', '3'])
+
+    def test_bulk_creation_generates_keys_at_once(self):
+        users = [User.objects.create_user("user{}".format(i), "user{}@mail.com".format(i)) for i in range(3)]
+
+        with patch.object(RandomStringTokenGenerator, 'generate_tokens', autospec=True,
+                          side_effect=RandomStringTokenGenerator.generate_tokens) as generate_tokens, \
+                patch.object(RandomStringTokenGenerator, 'generate_token') as generate_token:
+            tokens = ModelTokenBackend().create_tokens(users)
+
+        self.assertEqual(generate_tokens.call_count, 1)
+        generate_token.assert_not_called()
+        self.assertEqual(len({token.key for token in tokens}), 3)
+
     def test_generate_token_generator_from_empty_settings(self):
         """
         If there is no setting for DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG, a RandomStringTokenGenerator should
         be created automatically by get_token_generator()
         :return:
         """
-        # patch settings
-        settings.DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG = None
-
-        token_generator = get_token_generator()
+        with override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG=None):
+            token_generator = get_token_generator()
 
         self.assertEqual(
             token_generator.__class__, RandomStringTokenGenerator,
@@ -92,12 +150,10 @@ class TokenGeneratorTestCase(TestCase):
         Checks if the get_token_generator() function uses the "CLASS" setting in DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG
         :return:
         """
-        # patch settings
-        settings.DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG = {
+        with override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG={
             "CLASS": "django_rest_passwordreset.tokens.RandomStringTokenGenerator"
-        }
-
-        token_generator = get_token_generator()
+        }):
+            token_generator = get_token_generator()
 
         self.assertEqual(
             token_generator.__class__, RandomStringTokenGenerator,
@@ -110,15 +166,113 @@ class TokenGeneratorTestCase(TestCase):
         Checks if the get_token_generator() function uses the "CLASS" setting in DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG
         :return:
         """
-        # patch settings
-        settings.DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG = {
+        with override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_CONFIG={
             "CLASS": "django_rest_passwordreset.tokens.RandomNumberTokenGenerator"
-        }
-
-        token_generator = get_token_generator()
+        }):
+            token_generator = get_token_generator()
 
         self.assertEqual(
             token_generator.__class__, RandomNumberTokenGenerator,
             msg="get_token_generator() should return an instance of RandomNumberTokenGenerator "
                 "if configured in settings"
         )
+
+
+class SignedTokenGeneratorTestCase(TestCase):
+    """
+    Tests the stateless, HMAC signed token generator
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@mail.com")
+        self.other_user = User.objects.create_user("user2", "user2@mail.com")
+        self.token_generator = SignedTokenGenerator()
+
+    def test_token_is_valid_for_its_user_only(self):
+        token = self.token_generator.generate_token(user=self.user)
+
+        self.assertTrue(self.token_generator.check_token(self.user, token))
+        self.assertFalse(self.token_generator.check_token(self.other_user, token))
+
+    def test_token_embeds_user_id_and_timestamp(self):
+        token = self.token_generator.make_token(self.user)
+
+        user_id, created_at = self.token_generator.parse_token(token)
+        self.assertEqual(user_id, str(self.user.pk))
+        self.assertLess(abs((self.token_generator._now() - created_at).total_seconds()), 2)
+
+    def test_token_is_invalidated_by_password_change(self):
+        token = self.token_generator.make_token(self.user)
+
+        self.user.set_unusable_password()
+
+        self.assertFalse(self.token_generator.check_token(self.user, token))
+
+    def test_tampered_tokens_are_rejected(self):
+        token = self.token_generator.make_token(self.user)
+
+        self.assertFalse(self.token_generator.check_token(self.user, token[:-1] + ("0" if token[-1] != "0" else "1")))
+        self.assertFalse(self.token_generator.check_token(self.user, "not-a-token"))
+        self.assertFalse(self.token_generator.check_token(self.user, ""))
+        self.assertIsNone(self.token_generator.parse_token("not_a_token"))
+
+    def test_token_expires_after_max_age(self):
+        token = self.token_generator.make_token(self.user)
+
+        self.assertTrue(self.token_generator.check_token(self.user, token, max_age=60))
+        with patch.object(SignedTokenGenerator, '_now', return_value=self.token_generator._now() + timedelta(hours=1)):
+            self.assertFalse(self.token_generator.check_token(self.user, token, max_age=60))
+
+    def test_token_signed_with_fallback_secret_is_accepted(self):
+        with override_settings(SECRET_KEY="old-secret"):
+            token = self.token_generator.make_token(self.user)
+
+        with override_settings(SECRET_KEY="new-secret", SECRET_KEY_FALLBACKS=["old-secret"]):
+            self.assertTrue(self.token_generator.check_token(self.user, token))
+
+        with override_settings(SECRET_KEY="new-secret", SECRET_KEY_FALLBACKS=[]):
+            self.assertFalse(self.token_generator.check_token(self.user, token))
+
+    def test_generate_token_requires_user(self):
+        with self.assertRaises(ValueError):
+            self.token_generator.generate_token()
+
+
+@skipUnless(os.environ.get('DJANGO_REST_PASSWORDRESET_BENCHMARK'), "set DJANGO_REST_PASSWORDRESET_BENCHMARK to run")
+class TokenGeneratorBenchmarkTestCase(SimpleTestCase):
+    """
+    Micro-benchmarks of the token generators: tokens per second and bytes allocated per token, one by one and in batches
+
+        cd tests && DJANGO_REST_PASSWORDRESET_BENCHMARK=1 python manage.py test test.test_token_generators
+    """
+    tokens = 20000
+
+    def measure(self, generate):
+        started_at = time.perf_counter()
+        generate(self.tokens)
+        tokens_per_second = self.tokens / (time.perf_counter() - started_at)
+
+        tracemalloc.start()
+        try:
+            generate(self.tokens)
+            bytes_per_token = tracemalloc.get_traced_memory()[1] / self.tokens
+        finally:
+            tracemalloc.stop()
+
+        return tokens_per_second, bytes_per_token
+
+    def report(self, name, token_generator):
+        for mode, generate in (
+            ('one by one', lambda n: [token_generator.generate_token() for _ in range(n)]),
+            ('batch', token_generator.generate_tokens),
+        ):
+            tokens_per_second, bytes_per_token = self.measure(generate)
+            print("\n{:<30} {:<10} {:>12,.0f} tokens/s {:>8.1f} bytes/token (peak)".format(
+                name, mode, tokens_per_second, bytes_per_token
+            ))
+
+    def test_string_token_generator(self):
+        self.report('RandomStringTokenGenerator', RandomStringTokenGenerator())
+
+    def test_number_token_generator(self):
+        self.report('RandomNumberTokenGenerator', RandomNumberTokenGenerator(1000000000, 9999999999))
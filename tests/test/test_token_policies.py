@@ -0,0 +1,261 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.backends import ModelTokenBackend, get_token_backend
+from django_rest_passwordreset.models import ResetPasswordToken
+from django_rest_passwordreset.policies import BaseTokenPolicy, TokenPolicy, get_token_policy
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.tokens import RandomNumberTokenGenerator
+from django_rest_passwordreset.views import clear_expired_tokens
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+NUMBER_TOKEN_CONFIG = {
+    "CLASS": "django_rest_passwordreset.tokens.RandomNumberTokenGenerator",
+    "OPTIONS": {"min_number": 100000, "max_number": 999999},
+}
+
+
+class StaffTokenPolicy(TokenPolicy):
+    """ short-lived numeric tokens that can be used three times for staff users, the defaults for all other users """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(token_config=NUMBER_TOKEN_CONFIG, lifetime=10 * 60, max_uses=3)
+
+    def get_token_generator(self, user, user_agent='', ip_address=''):
+        if user.is_staff:
+            return super().get_token_generator(user, user_agent, ip_address)
+        return BaseTokenPolicy.get_token_generator(self, user, user_agent, ip_address)
+
+    def get_lifetime(self, user, user_agent='', ip_address=''):
+        if user.is_staff:
+            return super().get_lifetime(user, user_agent, ip_address)
+        return BaseTokenPolicy.get_lifetime(self, user, user_agent, ip_address)
+
+    def get_max_uses(self, user, user_agent='', ip_address=''):
+        if user.is_staff:
+            return super().get_max_uses(user, user_agent, ip_address)
+        return None
+
+
+def get_lifetime(token):
+    return (token.expires_at - token.created_at).total_seconds()
+
+
+class TokenPolicyTestCase(TestCase):
+    """
+    Tests the token policies
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.staff = User.objects.create_user("staff", "staff@mail.com", "secret2", is_staff=True)
+
+    def test_default_policy(self):
+        policy = get_token_policy()
+        self.assertIs(type(policy), BaseTokenPolicy)
+        self.assertIs(password_reset_settings.TOKEN_POLICY, password_reset_settings.TOKEN_POLICY)
+
+        token = get_token_backend().create_token(self.user)
+        self.assertAlmostEqual(get_lifetime(token), 24 * 60 * 60, delta=1)
+        self.assertIsNone(token.remaining_uses)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={
+        "CLASS": "django_rest_passwordreset.policies.TokenPolicy",
+        "OPTIONS": {"token_config": NUMBER_TOKEN_CONFIG, "lifetime": 15 * 60, "max_uses": 5},
+    })
+    def test_token_policy(self):
+        policy = password_reset_settings.TOKEN_POLICY
+        self.assertIsInstance(policy.get_token_generator(self.user), RandomNumberTokenGenerator)
+
+        token = get_token_backend().create_token(self.user, user_agent='test', ip_address='127.0.0.1')
+        self.assertTrue(token.key.isdigit())
+
+        token = ResetPasswordToken.objects.get(pk=token.pk)
+        self.assertAlmostEqual(get_lifetime(token), 15 * 60, delta=1)
+        self.assertEqual(token.remaining_uses, 5)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={"CLASS": StaffTokenPolicy})
+    def test_policy_per_user(self):
+        user_token, staff_token = get_token_backend().create_tokens([self.user, self.staff])
+
+        self.assertFalse(user_token.key.isdigit())
+        self.assertAlmostEqual(get_lifetime(user_token), 24 * 60 * 60, delta=1)
+        self.assertIsNone(user_token.remaining_uses)
+
+        self.assertTrue(staff_token.key.isdigit())
+        self.assertAlmostEqual(get_lifetime(staff_token), 10 * 60, delta=1)
+        self.assertEqual(staff_token.remaining_uses, 3)
+
+    def test_generate_keys_per_generator(self):
+        users = [self.user, self.staff, self.user]
+        keys = StaffTokenPolicy().generate_keys(users)
+
+        self.assertEqual([key.isdigit() for key in keys], [False, True, False])
+        self.assertEqual(len(set(keys)), 3)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={
+        "CLASS": "django_rest_passwordreset.policies.TokenPolicy",
+        "OPTIONS": {"lifetime": 7 * 24 * 60 * 60},
+    })
+    def test_cleanup_honors_the_lifetime_of_each_token(self):
+        long_lived = get_token_backend().create_token(self.user)
+        ResetPasswordToken.objects.filter(pk=long_lived.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={
+            "CLASS": "django_rest_passwordreset.policies.TokenPolicy",
+            "OPTIONS": {"lifetime": -60},
+        }):
+            short_lived = get_token_backend().create_token(self.staff)
+
+        clear_expired_tokens()
+
+        self.assertTrue(ResetPasswordToken.objects.filter(pk=long_lived.pk).exists())
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=short_lived.pk).exists())
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={
+    "CLASS": "django_rest_passwordreset.policies.TokenPolicy",
+    "OPTIONS": {"max_uses": 2},
+})
+class MaxUsesTestCase(APITestCase, HelperMixin):
+    """
+    Tests that tokens with a maximum number of uses can only be presented to the confirm endpoint that often
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.token = get_token_backend().create_token(self.user)
+
+    def _remaining_uses(self):
+        return ResetPasswordToken.objects.get(pk=self.token.pk).remaining_uses
+
+    def test_validate_does_not_use_the_token(self):
+        for _ in range(3):
+            response = self.rest_do_validate_token(self.token.key)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._remaining_uses(), 2)
+
+    def test_rejected_password_does_not_use_the_token(self):
+        for _ in range(3):
+            # the password is rejected by the password validators
+            response = self.rest_do_reset_password_with_token(self.token.key, "user1")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(self._remaining_uses(), 2)
+
+        response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+
+    def test_confirm_uses_the_token(self):
+        # the token is kept, to see the use counted by the reset
+        with patch.object(ModelTokenBackend, 'claim_token', autospec=True, return_value=True), \
+                patch.object(ModelTokenBackend, 'delete_tokens_for_user', autospec=True):
+            response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._remaining_uses(), 1)
+
+    def test_failed_reset_does_not_use_the_token(self):
+        # the token was claimed by a concurrent confirm after it was looked up
+        with patch.object(ModelTokenBackend, 'claim_token', autospec=True, return_value=False):
+            response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._remaining_uses(), 2)
+        self.assertTrue(self.django_check_login("user1", "secret1"))
+
+    async def test_async_rejected_password_does_not_use_the_token(self):
+        response = await self.async_client.post(
+            reverse('async_password_reset:reset-password-confirm'),
+            {'token': self.token.key, 'password': "user1"},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual((await ResetPasswordToken.objects.aget(pk=self.token.pk)).remaining_uses, 2)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={
+        "CLASS": "django_rest_passwordreset.policies.TokenPolicy",
+        "OPTIONS": {"max_uses": 1},
+    })
+    def test_validate_and_confirm_a_single_use_token(self):
+        token = get_token_backend().create_token(self.user)
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ResetPasswordToken.objects.get(pk=token.pk).remaining_uses, 1)
+
+        response = self.rest_do_reset_password_with_token(token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.django_check_login("user1", "new_secret"))
+
+    def test_used_up_token_can_not_be_confirmed(self):
+        ResetPasswordToken.objects.filter(pk=self.token.pk).update(remaining_uses=0)
+
+        response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(self.django_check_login("user1", "secret1"))
+
+    def test_used_up_token_is_not_reused(self):
+        ResetPasswordToken.objects.filter(pk=self.token.pk).update(remaining_uses=0)
+        self.assertIsNone(get_token_backend().get_token_for_user(self.user))
+
+    def test_use_token_is_atomic(self):
+        backend = get_token_backend()
+        # another request used up the token after this one loaded it
+        ResetPasswordToken.objects.filter(pk=self.token.pk).update(remaining_uses=0)
+
+        self.assertFalse(backend.use_token(self.token))
+        self.assertEqual(self._remaining_uses(), 0)
+
+    async def test_async_use_token(self):
+        backend = get_token_backend()
+        self.assertTrue(await backend.ause_token(self.token))
+        self.assertEqual(self.token.remaining_uses, 1)
+        self.assertEqual((await ResetPasswordToken.objects.aget(pk=self.token.pk)).remaining_uses, 1)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE={
+        "CLASS": "django_rest_passwordreset.validation_cache.TokenValidationCache",
+    })
+    def test_used_up_token_is_not_served_from_the_validation_cache(self):
+        response = self.rest_do_validate_token(self.token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ResetPasswordToken.objects.filter(pk=self.token.pk).update(remaining_uses=0)
+
+        response = self.rest_do_validate_token(self.token.key)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={"CLASS": "django_rest_passwordreset.backends.CacheTokenBackend"},
+    DJANGO_REST_PASSWORDRESET_TOKEN_POLICY={
+        "CLASS": "django_rest_passwordreset.policies.TokenPolicy",
+        "OPTIONS": {"token_config": NUMBER_TOKEN_CONFIG, "lifetime": 10 * 60},
+    },
+)
+class CacheTokenBackendPolicyTestCase(APITestCase, HelperMixin):
+    """
+    Tests that the cache token backend applies the token policy
+    """
+
+    def setUp(self):
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+
+    def test_token_policy(self):
+        backend = get_token_backend()
+        token = backend.create_token(self.user)
+
+        self.assertTrue(token.key.isdigit())
+        self.assertAlmostEqual(get_lifetime(token), 10 * 60, delta=1)
+        self.assertEqual(backend.get_token(token.key).expires_at, token.expires_at)
+
+        response = self.rest_do_validate_token(token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,224 @@
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from django_rest_passwordreset.admin import ResetPasswordTokenAdmin
+from django_rest_passwordreset.backends import ModelTokenBackend
+from django_rest_passwordreset.guess_budget import GuessBudget
+from django_rest_passwordreset.models import ResetPasswordToken, clear_expired
+from django_rest_passwordreset.settings import password_reset_settings
+from django_rest_passwordreset.validation_cache import TokenValidationCache, get_validation_cache
+from tests.test.helpers import HelperMixin, patch
+
+User = get_user_model()
+
+
+class ValidationCacheDisabledTestCase(APITestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(get_validation_cache())
+
+    def test_delete_receiver_is_not_connected(self):
+        # deleting tokens (e.g., clear_expired) does not need to load them
+        self.assertFalse(post_delete.has_listeners(ResetPasswordToken))
+
+
+@override_settings(DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE={
+    "OPTIONS": {"timeout": 60, "negative_timeout": 10},
+})
+class ValidationCacheTestCase(APITestCase, HelperMixin):
+    """
+    Tests caching the results of the validate-token endpoint
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.setUpUrls()
+        self.user = User.objects.create_user("user1", "user1@mail.com", "secret1")
+        self.token = ResetPasswordToken.objects.create(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_configured_cache(self):
+        validation_cache = get_validation_cache()
+        self.assertIsInstance(validation_cache, TokenValidationCache)
+        self.assertEqual(validation_cache.timeout, 60)
+        self.assertEqual(validation_cache.negative_timeout, 10)
+
+    def test_valid_token_is_cached(self):
+        response = self.rest_do_validate_token(self.token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.rest_do_validate_token(self.token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'status': 'OK'})
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION=True)
+    def test_user_details_are_cached(self):
+        # one query for the token and its user
+        with self.assertNumQueries(1):
+            self.rest_do_validate_token(self.token.key)
+
+        with self.assertNumQueries(0):
+            response = self.rest_do_validate_token(self.token.key)
+        self.assertEqual(response.data, {'status': 'OK', 'username': 'user1', 'email': 'user1@mail.com'})
+
+    def test_user_details_are_fetched_if_not_cached(self):
+        self.rest_do_validate_token(self.token.key)
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_USER_DETAILS_ON_VALIDATION=True):
+            response = self.rest_do_validate_token(self.token.key)
+        self.assertEqual(response.data, {'status': 'OK', 'username': 'user1', 'email': 'user1@mail.com'})
+
+    def test_invalid_token_is_cached(self):
+        response = self.rest_do_validate_token("not_a_valid_token")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.assertNumQueries(0):
+            response = self.rest_do_validate_token("not_a_valid_token")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_keys_do_not_contain_the_token(self):
+        validation_cache = get_validation_cache()
+        self.assertNotIn(self.token.key, validation_cache._token_cache_key(self.token.key))
+
+    @patch('django_rest_passwordreset.signals.reset_password_token_created.send')
+    def test_confirm_invalidates_all_tokens_of_the_user(self, mock_signal):
+        other_token = ResetPasswordToken.objects.create(user=self.user)
+        self.rest_do_validate_token(self.token.key)
+        self.rest_do_validate_token(other_token.key)
+
+        response = self.rest_do_reset_password_with_token(self.token.key, "new_secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.rest_do_validate_token(other_token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_admin_delete_invalidates(self):
+        self.rest_do_validate_token(self.token.key)
+
+        ResetPasswordTokenAdmin(ResetPasswordToken, admin.site).delete_model(None, self.token)
+
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_admin_bulk_delete_invalidates(self):
+        self.rest_do_validate_token(self.token.key)
+
+        ResetPasswordTokenAdmin(ResetPasswordToken, admin.site).delete_queryset(
+            None, ResetPasswordToken.objects.all()
+        )
+
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleting_a_token_invalidates(self):
+        self.rest_do_validate_token(self.token.key)
+
+        ResetPasswordToken.objects.filter(pk=self.token.pk).delete()
+
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleting_the_user_invalidates(self):
+        self.rest_do_validate_token(self.token.key)
+
+        # the token is deleted by a CASCADE
+        self.user.delete()
+
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_GUESS_BUDGET={"OPTIONS": {"token_max_failures": 2}})
+    def test_guess_budget_invalidates(self):
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_200_OK)
+
+        # another client failed too many guesses, so the token is deleted once it presents it
+        with patch.object(GuessBudget, 'check_token', return_value=False):
+            self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(
+        DJANGO_REST_PASSWORDRESET_TOKEN_BACKEND={"CLASS": "django_rest_passwordreset.backends.CacheTokenBackend"},
+        DJANGO_REST_PASSWORDRESET_GUESS_BUDGET={"OPTIONS": {"token_max_failures": 2}},
+    )
+    def test_guess_budget_invalidates_without_token_model(self):
+        token = password_reset_settings.TOKEN_BACKEND.create_token(self.user)
+        self.assertEqual(self.rest_do_validate_token(token.key).status_code, status.HTTP_200_OK)
+
+        with patch.object(GuessBudget, 'check_token', return_value=False):
+            self.assertEqual(self.rest_do_validate_token(token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(self.rest_do_validate_token(token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(DJANGO_REST_PASSWORDRESET_HASHED_TOKENS=True, DJANGO_REST_PASSWORDRESET_ONE_TOKEN_PER_USER=True)
+    def test_replaced_hashed_token_is_invalidated(self):
+        backend = ModelTokenBackend()
+        old_token, = backend.create_tokens([self.user])
+        self.assertEqual(self.rest_do_validate_token(old_token.key).status_code, status.HTTP_200_OK)
+
+        # the token of the user is replaced by an upsert, not deleted
+        new_token, = backend.create_tokens([self.user])
+
+        self.assertEqual(self.rest_do_validate_token(old_token.key).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.rest_do_validate_token(new_token.key).status_code, status.HTTP_200_OK)
+
+    def test_clear_expired_does_not_serve_expired_entries(self):
+        self.rest_do_validate_token(self.token.key)
+
+        expired = timezone.now() + timedelta(hours=25)
+        with patch('django_rest_passwordreset.models.timezone.now', return_value=expired), \
+                patch('django_rest_passwordreset.validation_cache.timezone.now', return_value=expired), \
+                patch('django_rest_passwordreset.serializers.timezone.now', return_value=expired), \
+                patch.object(TokenValidationCache, 'invalidate_user') as mock_invalidate:
+            self.assertEqual(clear_expired(expired - timedelta(hours=24)), 1)
+            self.assertEqual(self.rest_do_validate_token(self.token.key).status_code, status.HTTP_404_NOT_FOUND)
+
+        # expired tokens are never served from the cache, so they are not invalidated one by one
+        mock_invalidate.assert_not_called()
+
+    def test_other_tokens_of_the_user_are_validated_again(self):
+        other_token = ResetPasswordToken.objects.create(user=self.user)
+        self.rest_do_validate_token(other_token.key)
+
+        self.token.delete()
+
+        with self.assertNumQueries(1):
+            response = self.rest_do_validate_token(other_token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_receiver_is_connected_while_enabled(self):
+        self.assertTrue(post_delete.has_listeners(ResetPasswordToken))
+
+        with override_settings(DJANGO_REST_PASSWORDRESET_VALIDATION_CACHE=None):
+            # tokens are deleted without loading them first
+            self.assertFalse(post_delete.has_listeners(ResetPasswordToken))
+
+        self.assertTrue(post_delete.has_listeners(ResetPasswordToken))
+
+    def test_cached_entry_does_not_outlive_the_token(self):
+        self.rest_do_validate_token(self.token.key)
+
+        expired = timezone.now() + timedelta(hours=25)
+        with patch('django_rest_passwordreset.validation_cache.timezone.now', return_value=expired), \
+                patch('django_rest_passwordreset.serializers.timezone.now', return_value=expired):
+            response = self.rest_do_validate_token(self.token.key)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ResetPasswordToken.objects.filter(pk=self.token.pk).exists())
+
+    def test_timeout_is_capped_at_the_remaining_lifetime(self):
+        validation_cache = get_validation_cache()
+        self.token.expires_at = timezone.now() + timedelta(seconds=5)
+
+        with patch.object(validation_cache.cache, 'set') as mock_set:
+            validation_cache.set_valid(self.token)
+
+        timeout = mock_set.call_args_list[0][0][2]
+        self.assertLessEqual(timeout, 5)
+        self.assertGreater(timeout, 0)
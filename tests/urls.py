@@ -5,5 +5,7 @@ from django.urls import path
 
 urlpatterns = [
     path("api/password_reset/", include('django_rest_passwordreset.urls', namespace='password_reset')),
+    path("api/password_reset/bulk/", include('django_rest_passwordreset.bulk_urls', namespace='password_reset_bulk')),
+    path("api/async_password_reset/", include('django_rest_passwordreset.async_urls', namespace='async_password_reset')),
     path("admin/", admin.site.urls),
 ]